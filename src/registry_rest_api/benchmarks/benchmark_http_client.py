@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+Benchmark of the HTTP client used between the sharing nodes and the registry.
+
+Start the registry with uvicorn on a local port, register a node and measure
+the latency of GET /nodes/{node_id} sent sequentially and from THREADS
+threads, with a new connection per request (requests.get, the previous
+implementation) and with the keep-alive connections of the pooled HttpClient.
+
+Usage (from src/registry_rest_api):
+    PYTHONPATH=./src python3 benchmarks/benchmark_http_client.py
+"""
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import requests
+import uvicorn
+
+from shared_code.app import app
+from shared_code.http_client import HttpClient
+from shared_code.models import ShareNode
+
+PORT = 8765
+URL = f"http://127.0.0.1:{PORT}"
+ITERATIONS = 2000
+THREADS = 16
+
+
+def percentile(samples: List[float], value: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * value / 100))]
+
+
+def measure(name: str, threads: int, get: Callable[..., requests.Response]):
+    def lookup(_: int) -> float:
+        start = time.perf_counter()
+        get(url=f"{URL}/nodes/testa").raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        samples = list(executor.map(lookup, range(ITERATIONS)))
+    duration = time.perf_counter() - start
+    print(
+        f"{name:<20} threads={threads:<3}"
+        f" throughput={ITERATIONS / duration:8.1f} req/s"
+        f" p50={statistics.median(samples):8.3f}ms"
+        f" p99={percentile(samples, 99):8.3f}ms"
+    )
+
+
+def start_registry() -> uvicorn.Server:
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    # the registry logs each request with the uvicorn.error logger
+    logging.getLogger("uvicorn.error").disabled = True
+    return server
+
+
+def main() -> None:
+    server = start_registry()
+    node = ShareNode(
+        node_id="testa",
+        url="http://127.0.0.1/",
+        name="testa",
+        tenant_id="00000000-0000-0000-0000-000000000000",
+        identity="00000000-0000-0000-0000-000000000000",
+    )
+    requests.post(url=f"{URL}/register", json=node.dict()).raise_for_status()
+    http_client = HttpClient(pool_size=THREADS)
+    for threads in [1, THREADS]:
+        measure("requests.get", threads, requests.get)
+        measure("pooled HttpClient", threads, http_client.get)
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
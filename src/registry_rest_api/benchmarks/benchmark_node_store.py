@@ -0,0 +1,130 @@
+# coding: utf-8
+"""
+Throughput benchmark of the registry node store backends.
+
+Each backend is loaded with NODE_COUNT nodes, then several workers run a
+mix of registrations (heartbeats) and node lookups. The SQLite backend is
+also measured with several processes sharing the same database file, the
+way gunicorn workers share it on a host.
+
+The Redis backend uses the server at NODE_STORE_URL when it is reachable,
+otherwise the fakeredis stand-in when it is installed.
+
+Usage (from src/registry_rest_api):
+    PYTHONPATH=./src python3 benchmarks/benchmark_node_store.py
+"""
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from shared_code.models import NodeStatus, ShareNodeInformation
+from shared_code.node_store import (
+    MemoryNodeStore,
+    NodeStore,
+    RedisNodeStore,
+    SqliteNodeStore,
+)
+
+NODE_COUNT = 10000
+OPERATIONS = 20000
+WORKERS = 4
+
+
+def create_node_information(index: int) -> ShareNodeInformation:
+    return ShareNodeInformation(
+        node_id=f"node{index}",
+        url=f"https://node{index}.azurewebsites.net",
+        name=f"node{index}",
+        tenant_id="00000000-0000-0000-0000-000000000000",
+        identity="00000000-0000-0000-0000-000000000000",
+        status=NodeStatus.ONLINE,
+        latest_registration=datetime.utcnow(),
+    )
+
+
+def run_operations(node_store: NodeStore, operations: int) -> None:
+    """Run a mix of 50% registrations and 50% node lookups"""
+    for operation in range(operations):
+        index = random.randrange(NODE_COUNT)
+        if operation % 2 == 0:
+            node_store.register(create_node_information(index))
+        else:
+            node_store.get_node(f"node{index}")
+
+
+def run_threads(name: str, node_store: NodeStore) -> None:
+    for index in range(NODE_COUNT):
+        node_store.register(create_node_information(index))
+    operations = OPERATIONS // WORKERS
+    threads = [
+        threading.Thread(target=run_operations, args=(node_store, operations))
+        for _ in range(WORKERS)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+    print(
+        f"{name:<32} workers={WORKERS} threads"
+        f" throughput={operations * WORKERS / duration:10.0f} ops/s"
+    )
+
+
+def run_process(path: str, operations: int) -> None:
+    run_operations(SqliteNodeStore(path), operations)
+
+
+def run_processes(name: str, path: str) -> None:
+    node_store = SqliteNodeStore(path)
+    for index in range(NODE_COUNT):
+        node_store.register(create_node_information(index))
+    operations = OPERATIONS // WORKERS
+    processes = [
+        multiprocessing.Process(target=run_process, args=(path, operations))
+        for _ in range(WORKERS)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    duration = time.perf_counter() - start
+    print(
+        f"{name:<32} workers={WORKERS} processes"
+        f" throughput={operations * WORKERS / duration:10.0f} ops/s"
+    )
+
+
+def create_redis_node_store() -> NodeStore:
+    url = os.getenv("NODE_STORE_URL", "redis://localhost:6379/0")
+    try:
+        node_store = RedisNodeStore(url)
+        node_store.client.ping()
+        return node_store
+    except Exception:
+        import fakeredis
+
+        return RedisNodeStore(url, client=fakeredis.FakeRedis())
+
+
+def main() -> None:
+    directory = tempfile.mkdtemp()
+    run_threads("memory", MemoryNodeStore())
+    run_threads("sqlite (WAL)", SqliteNodeStore(os.path.join(directory, "t.db")))
+    run_processes("sqlite (WAL)", os.path.join(directory, "p.db"))
+    try:
+        node_store = create_redis_node_store()
+    except ImportError:
+        print("redis: no Redis server and no fakeredis stand-in available")
+    else:
+        run_threads(f"redis ({type(node_store.client).__module__})", node_store)
+
+
+if __name__ == "__main__":
+    main()
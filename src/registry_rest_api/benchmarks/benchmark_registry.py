@@ -0,0 +1,180 @@
+# coding: utf-8
+"""
+Benchmark of the registry node table.
+
+Measure the latency of RegistryService.register and RegistryService.node
+with 10k and 100k registered nodes, and compare it with the previous
+implementation which stored the node list as JSON in the SHARE_NODE_LIST
+environment variable.
+Measure as well the duration of the status sweep when 1% of the nodes
+expired, using the expiry index and using the previous full sweep.
+
+Usage (from src/registry_rest_api):
+    PYTHONPATH=./src python3 benchmarks/benchmark_registry.py
+"""
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from shared_code.models import NodeStatus, ShareNode, ShareNodeInformation
+from shared_code.node_store import MemoryNodeStore
+from shared_code.registry_service import RegistryService
+
+NODE_COUNTS = [10000, 100000]
+ITERATIONS = 2000
+LEGACY_ITERATIONS = {10000: 200, 100000: 20}
+REFRESH_PERIOD = 60
+EXPIRED_RATIO = 0.01
+
+
+def create_share_node(index: int) -> ShareNode:
+    return ShareNode(
+        node_id=f"node{index}",
+        url=f"https://node{index}.azurewebsites.net",
+        name=f"node{index}",
+        tenant_id="00000000-0000-0000-0000-000000000000",
+        identity="00000000-0000-0000-0000-000000000000",
+    )
+
+
+def percentile(samples: List[float], value: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * value / 100))]
+
+
+def measure(name: str, count: int, iterations: int, func: Callable[[int], None]):
+    samples = []
+    for _ in range(iterations):
+        index = random.randrange(count)
+        start = time.perf_counter()
+        func(index)
+        samples.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{name:<28} nodes={count:<7} p50={statistics.median(samples):9.4f}ms"
+        f" p99={percentile(samples, 99):9.4f}ms"
+    )
+
+
+def legacy_register(node: ShareNode) -> None:
+    """Previous implementation: JSON list in the SHARE_NODE_LIST variable"""
+    list = json.loads(os.environ["SHARE_NODE_LIST"])
+    nodeinfo = ShareNodeInformation(
+        latest_registration=datetime.utcnow(),
+        status=NodeStatus.ONLINE,
+        **node.dict(),
+    ).dict()
+    nodeinfo["latest_registration"] = nodeinfo["latest_registration"].isoformat()
+    for i in range(len(list)):
+        if list[i]["node_id"] == node.node_id and list[i]["url"] == node.url:
+            list[i] = nodeinfo
+            break
+    else:
+        list.append(nodeinfo)
+    os.environ["SHARE_NODE_LIST"] = json.dumps(list)
+
+
+def legacy_node(node_id: str) -> None:
+    list = json.loads(os.environ["SHARE_NODE_LIST"])
+    for i in range(len(list)):
+        if list[i]["node_id"] == node_id:
+            return
+
+
+def legacy_update_node_status() -> None:
+    """Previous implementation: full sweep of the JSON list"""
+    list = json.loads(os.environ["SHARE_NODE_LIST"])
+    updated = False
+    for i in range(len(list)):
+        latest = datetime.fromisoformat(list[i]["latest_registration"])
+        if (datetime.utcnow() - latest).total_seconds() > REFRESH_PERIOD:
+            if list[i]["status"] != NodeStatus.OFFLINE:
+                list[i]["status"] = NodeStatus.OFFLINE
+                updated = True
+    if updated is True:
+        os.environ["SHARE_NODE_LIST"] = json.dumps(list)
+
+
+def measure_sweep(count: int, nodes: List[ShareNode]) -> None:
+    now = datetime.utcnow()
+    expired_count = int(count * EXPIRED_RATIO)
+    node_store = MemoryNodeStore(refresh_period=REFRESH_PERIOD)
+    nodeinfos = []
+    for index, node in enumerate(nodes):
+        latest = now
+        if index < expired_count:
+            latest = now - timedelta(seconds=2 * REFRESH_PERIOD)
+        nodeinfo = ShareNodeInformation(
+            latest_registration=latest, status=NodeStatus.ONLINE, **node.dict()
+        )
+        node_store.register(nodeinfo)
+        nodeinfos.append(json.loads(nodeinfo.json()))
+    start = time.perf_counter()
+    expired = node_store.expire_nodes(now)
+    duration = (time.perf_counter() - start) * 1000
+    print(
+        f"{'expiry index sweep':<28} nodes={count:<7} expired={len(expired):<6}"
+        f" duration={duration:9.4f}ms"
+    )
+    os.environ["SHARE_NODE_LIST"] = json.dumps(nodeinfos)
+    start = time.perf_counter()
+    legacy_update_node_status()
+    duration = (time.perf_counter() - start) * 1000
+    print(
+        f"{'legacy full sweep':<28} nodes={count:<7} expired={expired_count:<6}"
+        f" duration={duration:9.4f}ms"
+    )
+
+
+def main() -> None:
+    for count in NODE_COUNTS:
+        nodes = [create_share_node(index) for index in range(count)]
+
+        registry_service = RegistryService(node_store=MemoryNodeStore())
+        for node in nodes:
+            registry_service.register(node)
+        measure(
+            "node table register",
+            count,
+            ITERATIONS,
+            lambda index: registry_service.register(nodes[index]),
+        )
+        measure(
+            "node table node",
+            count,
+            ITERATIONS,
+            lambda index: registry_service.node(nodes[index].node_id),
+        )
+
+        os.environ["SHARE_NODE_LIST"] = json.dumps(
+            [
+                json.loads(
+                    ShareNodeInformation(
+                        latest_registration=datetime.utcnow(),
+                        status=NodeStatus.ONLINE,
+                        **node.dict(),
+                    ).json()
+                )
+                for node in nodes
+            ]
+        )
+        measure(
+            "legacy JSON list register",
+            count,
+            LEGACY_ITERATIONS[count],
+            lambda index: legacy_register(nodes[index]),
+        )
+        measure(
+            "legacy JSON list node",
+            count,
+            LEGACY_ITERATIONS[count],
+            lambda index: legacy_node(nodes[index].node_id),
+        )
+        measure_sweep(count, nodes)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 #!/bin/bash
 set -e
 
-gunicorn --bind 0.0.0.0:${PORT_HTTP} -k uvicorn.workers.UvicornWorker main:app
+gunicorn --bind 0.0.0.0:${PORT_HTTP} --workers ${WORKERS:-1} -k uvicorn.workers.UvicornWorker main:app
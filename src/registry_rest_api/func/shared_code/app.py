@@ -2,13 +2,13 @@ import os
 from datetime import datetime
 from typing import List
 
-from fastapi import APIRouter, Body, FastAPI
+from fastapi import APIRouter, Body, FastAPI, Header, Response
 from fastapi.params import Depends
 from starlette.requests import Request
 
 from shared_code.configuration_service import ConfigurationService
 from shared_code.log_service import LogService
-from shared_code.models import ConsumeResponse, Node, ShareNode
+from shared_code.models import ConsumeResponse, Node, NodeHeartbeat, ShareNode
 from shared_code.registry_service import RegistryService
 
 router = APIRouter(prefix="")
@@ -77,18 +77,55 @@ def get_time(
 )
 def register(
     request: Request,
+    http_response: Response,
     body: ShareNode = Body(...),
     registry_service: RegistryService = Depends(get_registry_service),
 ) -> ShareNode:
     """Register Node using POST /register BODY: ShareNode"""
     get_log_service().log_information(f"HTTP REQUEST POST /register BODY: {body}")
     response = registry_service.register(body)
+    http_response.headers["ETag"] = registry_service.get_etag(body)
+    http_response.headers["X-Next-Heartbeat"] = str(
+        registry_service.get_next_heartbeat()
+    )
     get_log_service().log_information(
         f"HTTP REQUEST POST /register BODY: {body} RESPONSE: {response}"
     )
     return response
 
 
+@router.put(
+    "/nodes/{node_id}/heartbeat",
+    responses={
+        200: {"description": "NodeHeartbeat registered"},
+        404: {"description": "The node with id {node_id} does not exist."},
+        412: {
+            "description": "The node metadata changed since the ETag\
+ in header If-Match was returned, POST /register is required."
+        },
+    },
+    summary="Update the latest registration of a node",
+    response_model=NodeHeartbeat,
+)
+def heartbeat(
+    request: Request,
+    http_response: Response,
+    node_id: str,
+    if_match: str = Header(None),
+    registry_service: RegistryService = Depends(get_registry_service),
+) -> NodeHeartbeat:
+    """Register node heartbeat using PUT /nodes/{node_id}/heartbeat\
+ HEADER: If-Match RESPONSE BODY: NodeHeartbeat"""
+    get_log_service().log_debug(f"HTTP REQUEST PUT /nodes/{node_id}/heartbeat")
+    response = registry_service.heartbeat(node_id, if_match)
+    http_response.headers["ETag"] = response.etag
+    http_response.headers["X-Next-Heartbeat"] = str(response.next_heartbeat)
+    get_log_service().log_debug(
+        f"HTTP REQUEST PUT /nodes/{node_id}/heartbeat RESPONSE: {response}"
+    )
+    return response
+
+
 @router.get(
     "/nodes",
     responses={
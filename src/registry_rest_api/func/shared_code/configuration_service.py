@@ -1,5 +1,6 @@
 import json
 import os
+import tempfile
 from typing import Any
 
 
@@ -11,7 +12,15 @@ class ConfigurationService:
     """{ "name":"PORT_HTTP", "value":"${APP_PORT}"},"""
     """{ "name":"WEBSITES_PORT", "value":"${APP_PORT}"}, """
     """{ "name":"REFRESH_PERIOD", "value":"60"},"""
+    """{ "name":"LOCK_DIR", "value":"/tmp/registry_rest_api/locks"},"""
+    """{ "name":"LEADER_RETRY_PERIOD", "value":"10"},"""
     """{ "name":"SHARE_NODE_LIST", "value":"[]"},"""
+    """{ "name":"NODE_STORE_TYPE", "value":"memory"},"""
+    """{ "name":"NODE_STORE_PATH", "value":"/tmp/registry_rest_api/nodes.db"},"""
+    """{ "name":"NODE_STORE_URL", "value":"redis://localhost:6379/0"},"""
+    """{ "name":"HTTP_POOL_SIZE", "value":"32"},"""
+    """{ "name":"HTTP_CONNECT_TIMEOUT", "value":"5"},"""
+    """{ "name":"HTTP_READ_TIMEOUT", "value":"30"},"""
 
     def set_env_value(self, variable: str, value: str) -> str:
         if not os.environ.get(variable):
@@ -39,9 +48,39 @@ class ConfigurationService:
     def get_refresh_period(self) -> int:
         return int(self.get_env_value("REFRESH_PERIOD", "120"))
 
+    def get_lock_dir(self) -> str:
+        return self.get_env_value(
+            "LOCK_DIR",
+            os.path.join(tempfile.gettempdir(), "registry_rest_api", "locks"),
+        )
+
+    def get_leader_retry_period(self) -> int:
+        return int(self.get_env_value("LEADER_RETRY_PERIOD", "10"))
+
     def get_share_node_list(self) -> Any:
         return json.loads(self.get_env_value("SHARE_NODE_LIST", "[]"))
 
+    def get_node_store_type(self) -> str:
+        return self.get_env_value("NODE_STORE_TYPE", "memory").lower()
+
+    def get_node_store_path(self) -> str:
+        return self.get_env_value(
+            "NODE_STORE_PATH",
+            os.path.join(tempfile.gettempdir(), "registry_rest_api", "nodes.db"),
+        )
+
+    def get_node_store_url(self) -> str:
+        return self.get_env_value("NODE_STORE_URL", "redis://localhost:6379/0")
+
+    def get_http_pool_size(self) -> int:
+        return int(self.get_env_value("HTTP_POOL_SIZE", "32"))
+
+    def get_http_connect_timeout(self) -> float:
+        return float(self.get_env_value("HTTP_CONNECT_TIMEOUT", "5"))
+
+    def get_http_read_timeout(self) -> float:
+        return float(self.get_env_value("HTTP_READ_TIMEOUT", "30"))
+
     def get_subscription_id(self) -> str:
         return self.get_env_value("AZURE_SUBSCRIPTION_ID", "")
 
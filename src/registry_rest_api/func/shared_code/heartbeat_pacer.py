@@ -0,0 +1,57 @@
+import random
+import threading
+import time
+from typing import Dict, Union
+
+
+class HeartbeatPacer:
+    """
+    Class used to spread the share node heartbeats over time.
+    The pacer counts the heartbeats already scheduled for each second and
+    suggests to each node the least loaded second in the window
+    [min_ratio * refresh_period, max_ratio * refresh_period], so that the
+    node heartbeats before being considered offline.
+    """
+
+    def __init__(
+        self, refresh_period: int, min_ratio: float = 0.5, max_ratio: float = 0.75
+    ) -> None:
+        """Initialize the pacer with the registry refresh period"""
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.min_interval = max(1, int(refresh_period * min_ratio))
+        self.max_interval = max(self.min_interval, int(refresh_period * max_ratio))
+        self.slots: Dict[int, int] = {}
+        self.pruned_until = 0
+
+    def prune(self, second: int) -> None:
+        """Remove the slots older than second"""
+        if self.pruned_until == 0 or second - self.pruned_until > self.max_interval:
+            self.slots = {
+                key: value for key, value in self.slots.items() if key >= second
+            }
+        else:
+            for key in range(self.pruned_until, second):
+                self.slots.pop(key, None)
+        self.pruned_until = second
+
+    def suggest_interval(self, now: Union[float, None] = None) -> int:
+        """Return the number of seconds before the next node heartbeat"""
+        second = int(time.time() if now is None else now)
+        window = self.max_interval - self.min_interval + 1
+        with self.lock:
+            self.prune(second)
+            # Start the scan at a random offset, the first empty slot wins
+            offset = self.random.randrange(window)
+            best_interval = self.min_interval
+            best_count = None
+            for index in range(window):
+                interval = self.min_interval + (offset + index) % window
+                count = self.slots.get(second + interval, 0)
+                if best_count is None or count < best_count:
+                    best_interval = interval
+                    best_count = count
+                    if count == 0:
+                        break
+            self.slots[second + best_interval] = best_count + 1
+        return best_interval
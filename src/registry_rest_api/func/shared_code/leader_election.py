@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+from typing import Any, Callable, Dict, List, Union
+
+from starlette.concurrency import run_in_threadpool
+
+from shared_code.log_service import LogService
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class LeaderElection:
+    """
+    Class used to elect a single leader per job among the gunicorn workers
+    of the same host.
+    The leader of a job holds an exclusive lock on the file
+    {lock_dir}/{name}.lock. The lock is released by the operating system when
+    the leader process dies, so that another worker acquires it at its next
+    attempt.
+    """
+
+    def __init__(self, lock_dir: str) -> None:
+        """Initialize the election with the directory of the lock files"""
+        self.lock_dir = lock_dir
+        self.lock = threading.Lock()
+        self.lock_files: Dict[str, Any] = {}
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def is_leader(self, name: str) -> bool:
+        """Return True if the current process is (or becomes) the job leader"""
+        with self.lock:
+            if name in self.lock_files:
+                return True
+            if fcntl is None:
+                # No file lock on this platform, every worker is a leader
+                self.lock_files[name] = None
+                return True
+            lock_file = open(os.path.join(self.lock_dir, f"{name}.lock"), "a+")
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            self.lock_files[name] = lock_file
+            return True
+
+    def release(self, name: str) -> None:
+        """Release the leadership of the job"""
+        with self.lock:
+            lock_file = self.lock_files.pop(name, None)
+            if lock_file is not None:
+                lock_file.close()
+
+    def release_all(self) -> None:
+        """Release the leadership of all the jobs"""
+        for name in list(self.lock_files):
+            self.release(name)
+
+
+class PeriodicJob:
+    """
+    Class used to describe a periodic job.
+    The function may return the delay in seconds before its next run,
+    otherwise the job runs every interval seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable[[], Union[float, None]],
+        interval: float,
+        initial_delay: float = 0,
+    ) -> None:
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.initial_delay = initial_delay
+
+
+class PeriodicJobService:
+    """
+    Class used to run named periodic jobs, each job runs only in the worker
+    elected as its leader. The other workers try to become the leader every
+    retry_period seconds, or every job interval if it is shorter.
+    """
+
+    def __init__(self, election: LeaderElection, retry_period: float = 10) -> None:
+        self.election = election
+        self.retry_period = retry_period
+        self.log_service = LogService()
+        self.jobs: Dict[str, PeriodicJob] = {}
+        self.tasks: List[asyncio.Future] = []
+
+    def add_job(
+        self,
+        name: str,
+        function: Callable[[], Union[float, None]],
+        interval: float,
+        initial_delay: float = 0,
+    ) -> None:
+        """Add a named job running every interval seconds"""
+        self.jobs[name] = PeriodicJob(name, function, interval, initial_delay)
+
+    async def run_job(self, job: PeriodicJob) -> None:
+        """Run the job while the worker is the job leader"""
+        await asyncio.sleep(job.initial_delay)
+        leader = False
+        while True:
+            if not self.election.is_leader(job.name):
+                await asyncio.sleep(min(self.retry_period, job.interval))
+                continue
+            if not leader:
+                leader = True
+                self.log_service.log_information(
+                    f"Process {os.getpid()} is the leader of the job {job.name}"
+                )
+            delay = None
+            try:
+                delay = await run_in_threadpool(job.function)
+            except Exception as ex:
+                self.log_service.log_error(f"EXCEPTION in job {job.name}: {ex}")
+            await asyncio.sleep(job.interval if delay is None else delay)
+
+    def start(self) -> None:
+        """Start all the jobs in the running event loop"""
+        for job in self.jobs.values():
+            self.tasks.append(asyncio.ensure_future(self.run_job(job)))
+
+    def stop(self) -> None:
+        """Stop all the jobs and release their leadership"""
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.election.release_all()
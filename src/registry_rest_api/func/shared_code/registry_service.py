@@ -1,20 +1,25 @@
+import hashlib
 import json
+import threading
 from datetime import datetime
-from typing import Any, List
+from typing import List, Union
 
-import requests
 from fastapi import HTTPException
 
 from shared_code.configuration_service import ConfigurationService
+from shared_code.heartbeat_pacer import HeartbeatPacer
+from shared_code.http_client import get_http_client
 from shared_code.log_service import LogService
 from shared_code.models import (
     ConsumeResponse,
     Error,
     Node,
+    NodeHeartbeat,
     NodeStatus,
     ShareNode,
     ShareNodeInformation,
 )
+from shared_code.node_store import NodeStore, get_node_store
 
 
 def get_log_service() -> LogService:
@@ -27,9 +32,36 @@ def get_configuration_service() -> ConfigurationService:
     return ConfigurationService()
 
 
+heartbeat_pacer_lock = threading.Lock()
+heartbeat_pacer: Union[HeartbeatPacer, None] = None
+
+
+def get_heartbeat_pacer() -> HeartbeatPacer:
+    """Getting the single process-wide instance of the HeartbeatPacer"""
+    global heartbeat_pacer
+    if heartbeat_pacer is None:
+        with heartbeat_pacer_lock:
+            if heartbeat_pacer is None:
+                heartbeat_pacer = HeartbeatPacer(
+                    get_configuration_service().get_refresh_period()
+                )
+    return heartbeat_pacer
+
+
 class RegistryService:
     """Class used to implement the datashare service"""
 
+    def __init__(self, node_store: NodeStore = None) -> None:
+        """Initialize the service with the node store"""
+        self.node_store = node_store if node_store is not None else get_node_store()
+
+    def get_next_heartbeat(self) -> int:
+        """
+        Return the number of seconds the node should wait before its next
+        heartbeat, the heartbeats are spread over the refresh period
+        """
+        return get_heartbeat_pacer().suggest_interval()
+
     def serialize(self, o):
         if isinstance(o, dict):
             return {k: self.serialize(v) for k, v in o.items()}
@@ -41,10 +73,6 @@ class RegistryService:
             return o.isoformat()
         return o
 
-    def set_memory_persistent_node_list(self, list: Any):
-        o = self.serialize(list)
-        get_configuration_service().set_env_value("SHARE_NODE_LIST", json.dumps(o))
-
     def raise_http_exception(self, code: int, message: str, detail: str):
         if not detail:
             get_log_service().log_error(
@@ -63,33 +91,33 @@ class RegistryService:
         )
 
     def update_node_status(self) -> bool:
+        """
+        Report the nodes which went offline since the previous call.
+        The node status is computed when a node is read, this method only
+        reads the nodes which expired.
+        """
         try:
-            list = get_configuration_service().get_share_node_list()
-            updated = False
-            for i in range(len(list)):
-                latest = datetime.fromisoformat(list[i]["latest_registration"])
-                if (
-                    datetime.utcnow() - latest
-                ).total_seconds() > get_configuration_service().get_refresh_period():
-                    if list[i]["status"] != NodeStatus.OFFLINE:
-                        list[i]["status"] = NodeStatus.OFFLINE
-                        updated = True
-                else:
-                    if list[i]["status"] != NodeStatus.ONLINE:
-                        list[i]["status"] = NodeStatus.ONLINE
-                        updated = True
-            if updated is True:
-                self.set_memory_persistent_node_list(list)
+            for nodeinfo in self.node_store.expire_nodes(datetime.utcnow()):
+                get_log_service().log_information(
+                    f"Node '{nodeinfo.node_id}' url: {nodeinfo.url} is offline,\
+ latest registration: {nodeinfo.latest_registration.isoformat()}"
+                )
             return True
         except Exception as ex:
             get_log_service().log_error(f"EXCEPTION in updatenode_status: {ex}")
             return False
 
+    def get_etag(self, node: ShareNode) -> str:
+        """
+        Return the entity tag associated with the node metadata, the node
+        sends a full registration only when this value changes
+        """
+        text = f"{node.node_id}-{node.url}-{node.name}-{node.tenant_id}-\
+{node.identity}"
+        return f'"{hashlib.md5(text.encode()).hexdigest()}"'
+
     def register(self, node: ShareNode) -> ShareNode:
         try:
-            list = get_configuration_service().get_share_node_list()
-            found = False
-
             nodeinfo = ShareNodeInformation(
                 node_id=node.node_id,
                 name=node.name,
@@ -99,14 +127,7 @@ class RegistryService:
                 latest_registration=datetime.utcnow(),
                 status=NodeStatus.ONLINE,
             )
-            for i in range(len(list)):
-                if list[i]["node_id"] == node.node_id and list[i]["url"] == node.url:
-                    list[i] = nodeinfo.dict()
-                    found = True
-                    break
-            if found is False:
-                list.append(nodeinfo.dict())
-            self.set_memory_persistent_node_list(list)
+            self.node_store.register(nodeinfo)
             return node
         except HTTPException as e:
             self.raise_http_exception(e.status_code, e.detail, "")
@@ -115,16 +136,53 @@ class RegistryService:
                 500, "Internal server error", f"Exception in 'register' method: {ex}"
             )
 
+    def heartbeat(self, node_id: str, etag: str) -> NodeHeartbeat:
+        """
+        Update the latest registration of the node registered with node_id
+        whose metadata match the entity tag etag
+        """
+        try:
+            if not etag:
+                raise HTTPException(
+                    status_code=428, detail="Header 'If-Match' is required."
+                )
+            entries = self.node_store.get_node_entries(node_id)
+            if len(entries) == 0:
+                raise HTTPException(
+                    status_code=404, detail=f"Node '{node_id}' does not exists."
+                )
+            for nodeinfo in entries:
+                if self.get_etag(nodeinfo) == etag:
+                    latest_registration = datetime.utcnow()
+                    if self.node_store.touch(
+                        node_id, nodeinfo.url, latest_registration
+                    ):
+                        return NodeHeartbeat(
+                            node_id=node_id,
+                            etag=etag,
+                            latest_registration=latest_registration,
+                            next_heartbeat=self.get_next_heartbeat(),
+                        )
+            raise HTTPException(
+                status_code=412,
+                detail=f"Node '{node_id}' metadata changed, register the node.",
+            )
+        except HTTPException as e:
+            self.raise_http_exception(e.status_code, e.detail, "")
+        except Exception as ex:
+            self.raise_http_exception(
+                500, "Internal server error", f"Exception in 'heartbeat' method: {ex}"
+            )
+
     def nodes(self) -> List[Node]:
         try:
-            list = get_configuration_service().get_share_node_list()
             returned_list = []
-            for i in range(len(list)):
-                if list[i]["status"] == NodeStatus.ONLINE:
+            for nodeinfo in self.node_store.get_nodes():
+                if nodeinfo.status == NodeStatus.ONLINE:
                     node = Node(
-                        node_id=list[i]["node_id"],
-                        tenant_id=list[i]["tenant_id"],
-                        identity=list[i]["identity"],
+                        node_id=nodeinfo.node_id,
+                        tenant_id=nodeinfo.tenant_id,
+                        identity=nodeinfo.identity,
                     )
                     returned_list.append(node)
             return returned_list
@@ -137,16 +195,14 @@ class RegistryService:
 
     def node(self, node_id: str):
         try:
-            list = get_configuration_service().get_share_node_list()
-            for i in range(len(list)):
-                if list[i]["node_id"] == node_id:
-                    if list[i]["status"] == NodeStatus.ONLINE:
-                        node = Node(
-                            node_id=list[i]["node_id"],
-                            tenant_id=list[i]["tenant_id"],
-                            identity=list[i]["identity"],
-                        )
-                        return node
+            nodeinfo = self.node_store.get_node(node_id)
+            if nodeinfo is not None:
+                node = Node(
+                    node_id=nodeinfo.node_id,
+                    tenant_id=nodeinfo.tenant_id,
+                    identity=nodeinfo.identity,
+                )
+                return node
             raise HTTPException(
                 status_code=404, detail=f"Node '{node_id}' does not exists."
             )
@@ -161,29 +217,26 @@ class RegistryService:
         self, provider_node_id: str, consumer_node_id: str, invitation_id: str
     ):
         try:
-            list = get_configuration_service().get_share_node_list()
-            for i in range(len(list)):
-                if list[i]["node_id"] == consumer_node_id:
-                    if list[i]["status"] == NodeStatus.ONLINE:
-                        url = list[i]["url"]
-                        consumer_node_url = f"{url}/consumeshare"
-                        headers = {
-                            "Content-Type": "application/json",
-                        }
-                        params = dict()
-                        params["provider_node_id"] = provider_node_id
-                        params["consumer_node_id"] = consumer_node_id
-                        params["invitation_id"] = invitation_id
-                        consumer_node_response = requests.get(
-                            url=consumer_node_url,
-                            params=params,
-                            headers=headers,
-                        )
-                        consumer_node_response.raise_for_status()
-                        consumeresponse: ConsumeResponse = json.loads(
-                            consumer_node_response.text
-                        )
-                        return consumeresponse
+            nodeinfo = self.node_store.get_node(consumer_node_id)
+            if nodeinfo is not None:
+                consumer_node_url = f"{nodeinfo.url}/consumeshare"
+                headers = {
+                    "Content-Type": "application/json",
+                }
+                params = dict()
+                params["provider_node_id"] = provider_node_id
+                params["consumer_node_id"] = consumer_node_id
+                params["invitation_id"] = invitation_id
+                consumer_node_response = get_http_client().get(
+                    url=consumer_node_url,
+                    params=params,
+                    headers=headers,
+                )
+                consumer_node_response.raise_for_status()
+                consumeresponse: ConsumeResponse = json.loads(
+                    consumer_node_response.text
+                )
+                return consumeresponse
             raise HTTPException(
                 status_code=404,
                 detail=f"Consumer Node '{consumer_node_id}' does not exists.",
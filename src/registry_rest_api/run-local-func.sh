@@ -15,6 +15,10 @@ cp ../src/shared_code/app.py ./shared_code/app.py
 cp ../src/shared_code/configuration_service.py ./shared_code/configuration_service.py
 cp ../src/shared_code/log_service.py ./shared_code/log_service.py
 cp ../src/shared_code/models.py ./shared_code/models.py
+cp ../src/shared_code/node_store.py ./shared_code/node_store.py
+cp ../src/shared_code/heartbeat_pacer.py ./shared_code/heartbeat_pacer.py
+cp ../src/shared_code/leader_election.py ./shared_code/leader_election.py
 cp ../src/shared_code/registry_service.py ./shared_code/registry_service.py
+cp ../src/shared_code/http_client.py ./shared_code/http_client.py
 func start
 popd > /dev/null
@@ -1,7 +1,6 @@
-from fastapi_utils.tasks import repeat_every
-
 from shared_code.app import app
 from shared_code.configuration_service import ConfigurationService
+from shared_code.leader_election import LeaderElection, PeriodicJobService
 from shared_code.log_service import LogService
 from shared_code.registry_service import RegistryService
 
@@ -21,9 +20,6 @@ def get_configuration_service() -> ConfigurationService:
     return ConfigurationService()
 
 
-# Periodic task used to managed place order workflow
-@app.on_event("startup")
-@repeat_every(seconds=get_configuration_service().get_refresh_period())
 def periodic_task() -> None:
     registry_service = get_registry_service()
     # Check logging on startup
@@ -34,3 +30,25 @@ def periodic_task() -> None:
     get_log_service().log_information("Calling registry_service.update_node_status()")
     """Update the node status for each active node"""
     registry_service.update_node_status()
+
+
+# Periodic tasks run only by the gunicorn worker elected as leader of each job
+periodic_job_service = PeriodicJobService(
+    LeaderElection(get_configuration_service().get_lock_dir()),
+    get_configuration_service().get_leader_retry_period(),
+)
+periodic_job_service.add_job(
+    "update_node_status",
+    periodic_task,
+    get_configuration_service().get_refresh_period(),
+)
+
+
+@app.on_event("startup")
+async def start_periodic_tasks() -> None:
+    periodic_job_service.start()
+
+
+@app.on_event("shutdown")
+async def stop_periodic_tasks() -> None:
+    periodic_job_service.stop()
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from typing import Any, Dict, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared_code.configuration_service import ConfigurationService
+
+
+class HttpClient:
+    """
+    Class used to send the HTTP requests between the share nodes and the
+    registries with a single requests.Session: the connections are kept
+    alive in a pool of pool_size connections per host, a request fails
+    after connect_timeout seconds without connection or read_timeout
+    seconds without data.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 32,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url=url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url=url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.put(url=url, **kwargs)
+
+
+class HttpResponse:
+    """Class used to return the response of the AsyncHttpClient"""
+
+    def __init__(
+        self, url: str, status_code: int, text: str, headers: Dict[str, str]
+    ) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def raise_for_status(self) -> None:
+        """Raise requests.HTTPError like requests.Response"""
+        if self.status_code >= 400:
+            raise requests.HTTPError(
+                f"{self.status_code} Error for url: {self.url}", response=self
+            )
+
+
+class AsyncHttpClient:
+    """
+    Class used to send the HTTP requests of the async routes with a single
+    aiohttp.ClientSession per event loop, with the pool and the timeouts
+    of the HttpClient
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 32,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+    ) -> None:
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session: Any = None
+        self.loop: Union[asyncio.AbstractEventLoop, None] = None
+
+    def get_session(self) -> Any:
+        """Return the session of the running event loop, create it if required"""
+        loop = asyncio.get_event_loop()
+        if self.session is None or self.loop is not loop:
+            import aiohttp
+
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.connect_timeout, sock_read=self.read_timeout
+                ),
+            )
+            self.loop = loop
+        return self.session
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> HttpResponse:
+        async with self.get_session().request(method, url, **kwargs) as response:
+            return HttpResponse(
+                str(response.url),
+                response.status,
+                await response.text(),
+                dict(response.headers),
+            )
+
+    async def get(self, url: str, **kwargs: Any) -> HttpResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> HttpResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs: Any) -> HttpResponse:
+        return await self.request("PUT", url, **kwargs)
+
+
+def get_http_settings() -> Tuple[int, float, float]:
+    configuration_service = ConfigurationService()
+    return (
+        configuration_service.get_http_pool_size(),
+        configuration_service.get_http_connect_timeout(),
+        configuration_service.get_http_read_timeout(),
+    )
+
+
+http_client: Union[HttpClient, None] = None
+async_http_client: Union[AsyncHttpClient, None] = None
+http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Getting a single instance of the HttpClient"""
+    global http_client
+    if http_client is None:
+        with http_client_lock:
+            if http_client is None:
+                http_client = HttpClient(*get_http_settings())
+    return http_client
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    """Getting a single instance of the AsyncHttpClient"""
+    global async_http_client
+    if async_http_client is None:
+        with http_client_lock:
+            if async_http_client is None:
+                async_http_client = AsyncHttpClient(*get_http_settings())
+    return async_http_client
@@ -1,5 +1,6 @@
 from datetime import datetime
 from enum import Enum
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -29,6 +30,13 @@ class ShareNodeInformation(BaseModel):
     latest_registration: datetime
 
 
+class NodeHeartbeat(BaseModel):
+    node_id: str
+    etag: str
+    latest_registration: datetime
+    next_heartbeat: int
+
+
 class Node(BaseModel):
     node_id: str
     tenant_id: str
@@ -47,12 +55,15 @@ class ShareRequest(BaseModel):
     provider_node_id: str
     consumer_node_id: str
     dataset: Dataset
+    callback_url: Optional[str] = None
 
 
 class ConsumeRequest(BaseModel):
     provider_node_id: str
-    consumer_node_id: str
+    # The current node when the request is sent to the consumer node
+    consumer_node_id: Optional[str] = None
     invitation_id: str
+    callback_url: Optional[str] = None
 
 
 class Error(BaseModel):
@@ -87,6 +98,11 @@ class ShareResponse(BaseModel):
     error: Error
 
 
+class ShareBatchResult(BaseModel):
+    response: Optional[ShareResponse] = None
+    error: Optional[Error] = None
+
+
 class ConsumeResponse(BaseModel):
     invitation_id: str
     provider_node_id: str
@@ -94,3 +110,8 @@ class ConsumeResponse(BaseModel):
     dataset: Dataset
     status: StatusDetails
     error: Error
+
+
+class ConsumeBatchResult(BaseModel):
+    response: Optional[ConsumeResponse] = None
+    error: Optional[Error] = None
@@ -0,0 +1,488 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Tuple, Union
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.models import NodeStatus, ShareNodeInformation
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp(date: datetime) -> float:
+    """Convert a naive UTC datetime into a number of seconds since epoch"""
+    return (date - EPOCH).total_seconds()
+
+
+def from_timestamp(timestamp: float) -> datetime:
+    """Convert a number of seconds since epoch into a naive UTC datetime"""
+    return EPOCH + timedelta(seconds=timestamp)
+
+
+class NodeStoreType(str, Enum):
+    MEMORY = "memory"
+    SQLITE = "sqlite"
+    REDIS = "redis"
+
+
+class NodeStore(ABC):
+    """
+    Interface of the share node table used by the RegistryService.
+    A node is identified by the pair (node_id, url).
+    The status returned by the read methods is computed when the node is
+    read: a node is online if it has been registered during the last
+    refresh period. The stored status is only updated by expire_nodes to
+    report each node going offline once.
+    """
+
+    def __init__(self, refresh_period: int = None) -> None:
+        """Initialize the store with the refresh period in seconds"""
+        if refresh_period is None:
+            refresh_period = ConfigurationService().get_refresh_period()
+        self.refresh_period = refresh_period
+
+    def get_status(self, latest_registration: datetime, now: datetime) -> NodeStatus:
+        """Return the status of a node according to its latest registration"""
+        elapsed = now - latest_registration
+        if elapsed.total_seconds() > self.refresh_period:
+            return NodeStatus.OFFLINE
+        return NodeStatus.ONLINE
+
+    def with_status(
+        self, nodeinfo: ShareNodeInformation, now: datetime
+    ) -> ShareNodeInformation:
+        """Return the node with the status computed at the date now"""
+        status = self.get_status(nodeinfo.latest_registration, now)
+        if status == nodeinfo.status:
+            return nodeinfo
+        return nodeinfo.copy(update={"status": status})
+
+    @abstractmethod
+    def register(self, nodeinfo: ShareNodeInformation) -> None:
+        """Insert or replace the node associated with (node_id, url)"""
+
+    @abstractmethod
+    def get_node(self, node_id: str) -> Union[ShareNodeInformation, None]:
+        """Return the first online node registered with node_id"""
+
+    @abstractmethod
+    def get_nodes(self) -> List[ShareNodeInformation]:
+        """Return all the registered nodes"""
+
+    @abstractmethod
+    def get_node_entries(self, node_id: str) -> List[ShareNodeInformation]:
+        """Return the nodes registered with node_id, whatever their status"""
+
+    @abstractmethod
+    def touch(self, node_id: str, url: str, latest_registration: datetime) -> bool:
+        """
+        Update only the latest registration of the node (node_id, url),
+        return False if the node is not registered
+        """
+
+    @abstractmethod
+    def expire_nodes(self, now: datetime) -> List[ShareNodeInformation]:
+        """
+        Mark as offline the nodes which have not been registered during the
+        last refresh period and return them. Only the expired nodes are
+        read, each node is returned once per expiration.
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of registered (node_id, url) entries"""
+
+    def load(self, node_list: Any) -> None:
+        """Register a list of nodes (for instance SHARE_NODE_LIST)"""
+        for item in node_list or []:
+            self.register(ShareNodeInformation(**item))
+
+
+class MemoryNodeStore(NodeStore):
+    """
+    Class used to store the share node table in the process memory.
+    The table is a dictionary keyed by node_id, each entry is a dictionary
+    keyed by node url, so that a (node_id, url) registration is updated in
+    place without parsing or scanning the whole node list.
+    The expiry index is a min-heap of (expiry, node_id, url), the live
+    expiry of each online node is kept in expiries: the entries left behind
+    by a new registration are skipped when they are popped, and the heap is
+    rebuilt from the live expiries when it holds more than twice as many
+    entries, whether expire_nodes runs in this process or not.
+    This store is private to the process.
+    """
+
+    def __init__(self, node_list: Any = None, refresh_period: int = None) -> None:
+        """
+        Initialize the node table, optionally with a list of nodes
+        (for instance the SHARE_NODE_LIST configuration value)
+        """
+        super().__init__(refresh_period)
+        self.lock = threading.Lock()
+        self.node_table: Dict[str, Dict[str, ShareNodeInformation]] = {}
+        self.expiry_index: List[Tuple[float, str, str]] = []
+        self.expiries: Dict[Tuple[str, str], float] = {}
+        self.load(node_list)
+
+    def push_expiry(self, expiry: float, node_id: str, url: str) -> None:
+        """Set the live expiry of the node, called with the lock held"""
+        self.expiries[(node_id, url)] = expiry
+        heapq.heappush(self.expiry_index, (expiry, node_id, url))
+        if len(self.expiry_index) > 2 * len(self.expiries):
+            self.expiry_index = [
+                (expiry, node_id, url)
+                for (node_id, url), expiry in self.expiries.items()
+            ]
+            heapq.heapify(self.expiry_index)
+
+    def register(self, nodeinfo: ShareNodeInformation) -> None:
+        expiry = to_timestamp(nodeinfo.latest_registration) + self.refresh_period
+        with self.lock:
+            self.node_table.setdefault(nodeinfo.node_id, {})[nodeinfo.url] = nodeinfo
+            self.push_expiry(expiry, nodeinfo.node_id, nodeinfo.url)
+
+    def get_node(self, node_id: str) -> Union[ShareNodeInformation, None]:
+        now = datetime.utcnow()
+        with self.lock:
+            urls = self.node_table.get(node_id)
+            if urls is None:
+                return None
+            for nodeinfo in urls.values():
+                nodeinfo = self.with_status(nodeinfo, now)
+                if nodeinfo.status == NodeStatus.ONLINE:
+                    return nodeinfo
+        return None
+
+    def get_nodes(self) -> List[ShareNodeInformation]:
+        now = datetime.utcnow()
+        with self.lock:
+            return [
+                self.with_status(nodeinfo, now)
+                for urls in self.node_table.values()
+                for nodeinfo in urls.values()
+            ]
+
+    def get_node_entries(self, node_id: str) -> List[ShareNodeInformation]:
+        now = datetime.utcnow()
+        with self.lock:
+            urls = self.node_table.get(node_id, {})
+            return [self.with_status(nodeinfo, now) for nodeinfo in urls.values()]
+
+    def touch(self, node_id: str, url: str, latest_registration: datetime) -> bool:
+        expiry = to_timestamp(latest_registration) + self.refresh_period
+        with self.lock:
+            nodeinfo = self.node_table.get(node_id, {}).get(url)
+            if nodeinfo is None:
+                return False
+            nodeinfo.latest_registration = latest_registration
+            nodeinfo.status = NodeStatus.ONLINE
+            self.push_expiry(expiry, node_id, url)
+        return True
+
+    def expire_nodes(self, now: datetime) -> List[ShareNodeInformation]:
+        limit = to_timestamp(now)
+        expired = []
+        with self.lock:
+            while self.expiry_index and self.expiry_index[0][0] < limit:
+                expiry, node_id, url = heapq.heappop(self.expiry_index)
+                if self.expiries.get((node_id, url)) != expiry:
+                    # The node has been registered again since this entry
+                    continue
+                del self.expiries[(node_id, url)]
+                nodeinfo = self.node_table.get(node_id, {}).get(url)
+                if nodeinfo is None or nodeinfo.status == NodeStatus.OFFLINE:
+                    continue
+                nodeinfo.status = NodeStatus.OFFLINE
+                expired.append(nodeinfo)
+        return expired
+
+    def count(self) -> int:
+        with self.lock:
+            return sum(len(urls) for urls in self.node_table.values())
+
+
+class SqliteNodeStore(NodeStore):
+    """
+    Class used to store the share node table in a SQLite database in WAL
+    mode. The database file is shared by all the gunicorn workers running
+    on the same host. The index on (status, latest_registration) is used
+    as the expiry index.
+    """
+
+    def __init__(
+        self, path: str, node_list: Any = None, refresh_period: int = None
+    ) -> None:
+        """Initialize the database stored in the file path"""
+        super().__init__(refresh_period)
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self.get_connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "node_id TEXT NOT NULL, "
+            "url TEXT NOT NULL, "
+            "name TEXT NOT NULL, "
+            "tenant_id TEXT NOT NULL, "
+            "identity TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "latest_registration REAL NOT NULL, "
+            "PRIMARY KEY (node_id, url))"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS nodes_expiry "
+            "ON nodes (status, latest_registration)"
+        )
+        self.load(node_list)
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Return the connection associated with the current thread"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def to_node_information(self, row: Any) -> ShareNodeInformation:
+        return ShareNodeInformation(
+            node_id=row[0],
+            url=row[1],
+            name=row[2],
+            tenant_id=row[3],
+            identity=row[4],
+            status=row[5],
+            latest_registration=from_timestamp(row[6]),
+        )
+
+    def register(self, nodeinfo: ShareNodeInformation) -> None:
+        self.get_connection().execute(
+            "INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (node_id, url) DO UPDATE SET "
+            "name=excluded.name, tenant_id=excluded.tenant_id, "
+            "identity=excluded.identity, status=excluded.status, "
+            "latest_registration=excluded.latest_registration",
+            (
+                nodeinfo.node_id,
+                nodeinfo.url,
+                nodeinfo.name,
+                nodeinfo.tenant_id,
+                nodeinfo.identity,
+                nodeinfo.status.value,
+                to_timestamp(nodeinfo.latest_registration),
+            ),
+        )
+
+    def get_node(self, node_id: str) -> Union[ShareNodeInformation, None]:
+        now = datetime.utcnow()
+        row = (
+            self.get_connection()
+            .execute(
+                "SELECT * FROM nodes WHERE node_id = ? AND latest_registration >= ? "
+                "LIMIT 1",
+                (node_id, to_timestamp(now) - self.refresh_period),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return self.with_status(self.to_node_information(row), now)
+
+    def get_nodes(self) -> List[ShareNodeInformation]:
+        now = datetime.utcnow()
+        rows = self.get_connection().execute("SELECT * FROM nodes").fetchall()
+        return [self.with_status(self.to_node_information(row), now) for row in rows]
+
+    def get_node_entries(self, node_id: str) -> List[ShareNodeInformation]:
+        now = datetime.utcnow()
+        rows = (
+            self.get_connection()
+            .execute("SELECT * FROM nodes WHERE node_id = ?", (node_id,))
+            .fetchall()
+        )
+        return [self.with_status(self.to_node_information(row), now) for row in rows]
+
+    def touch(self, node_id: str, url: str, latest_registration: datetime) -> bool:
+        cursor = self.get_connection().execute(
+            "UPDATE nodes SET latest_registration = ?, status = ? "
+            "WHERE node_id = ? AND url = ?",
+            (
+                to_timestamp(latest_registration),
+                NodeStatus.ONLINE.value,
+                node_id,
+                url,
+            ),
+        )
+        return cursor.rowcount > 0
+
+    def expire_nodes(self, now: datetime) -> List[ShareNodeInformation]:
+        limit = to_timestamp(now) - self.refresh_period
+        connection = self.get_connection()
+        # The immediate transaction prevents two workers from reporting
+        # the same expiration
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT * FROM nodes WHERE status = ? AND latest_registration < ?",
+                (NodeStatus.ONLINE.value, limit),
+            ).fetchall()
+            connection.execute(
+                "UPDATE nodes SET status = ? "
+                "WHERE status = ? AND latest_registration < ?",
+                (NodeStatus.OFFLINE.value, NodeStatus.ONLINE.value, limit),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        expired = [self.to_node_information(row) for row in rows]
+        for nodeinfo in expired:
+            nodeinfo.status = NodeStatus.OFFLINE
+        return expired
+
+    def count(self) -> int:
+        return self.get_connection().execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+
+class RedisNodeStore(NodeStore):
+    """
+    Class used to store the share node table in Redis. The table can be
+    shared by all the workers and all the hosts running the registry.
+    Each node_id is stored in a hash keyed by node url, the expiry index
+    is a sorted set of [node_id, url] scored by latest registration.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        node_list: Any = None,
+        client: Any = None,
+        refresh_period: int = None,
+    ) -> None:
+        """Initialize the connection with the Redis server at url"""
+        super().__init__(refresh_period)
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = "registry:node:"
+        self.index = "registry:nodes"
+        self.expiry_index = "registry:expiry"
+        self.load(node_list)
+
+    def register(self, nodeinfo: ShareNodeInformation) -> None:
+        member = json.dumps([nodeinfo.node_id, nodeinfo.url])
+        pipeline = self.client.pipeline()
+        pipeline.hset(self.prefix + nodeinfo.node_id, nodeinfo.url, nodeinfo.json())
+        pipeline.sadd(self.index, nodeinfo.node_id)
+        if nodeinfo.status == NodeStatus.ONLINE:
+            pipeline.zadd(
+                self.expiry_index,
+                {member: to_timestamp(nodeinfo.latest_registration)},
+            )
+        pipeline.execute()
+
+    def get_node(self, node_id: str) -> Union[ShareNodeInformation, None]:
+        now = datetime.utcnow()
+        for value in self.client.hvals(self.prefix + node_id):
+            nodeinfo = self.with_status(ShareNodeInformation.parse_raw(value), now)
+            if nodeinfo.status == NodeStatus.ONLINE:
+                return nodeinfo
+        return None
+
+    def get_nodes(self) -> List[ShareNodeInformation]:
+        now = datetime.utcnow()
+        pipeline = self.client.pipeline()
+        for node_id in self.client.smembers(self.index):
+            pipeline.hvals(self.prefix + node_id.decode("utf-8"))
+        return [
+            self.with_status(ShareNodeInformation.parse_raw(value), now)
+            for values in pipeline.execute()
+            for value in values
+        ]
+
+    def get_node_entries(self, node_id: str) -> List[ShareNodeInformation]:
+        now = datetime.utcnow()
+        return [
+            self.with_status(ShareNodeInformation.parse_raw(value), now)
+            for value in self.client.hvals(self.prefix + node_id)
+        ]
+
+    def touch(self, node_id: str, url: str, latest_registration: datetime) -> bool:
+        value = self.client.hget(self.prefix + node_id, url)
+        if value is None:
+            return False
+        nodeinfo = ShareNodeInformation.parse_raw(value)
+        nodeinfo.latest_registration = latest_registration
+        nodeinfo.status = NodeStatus.ONLINE
+        self.register(nodeinfo)
+        return True
+
+    def expire_nodes(self, now: datetime) -> List[ShareNodeInformation]:
+        limit = to_timestamp(now) - self.refresh_period
+        expired = []
+        for member in self.client.zrangebyscore(self.expiry_index, "-inf", limit):
+            # zrem returns 0 when another worker already reported this node
+            if self.client.zrem(self.expiry_index, member) == 0:
+                continue
+            node_id, url = json.loads(member)
+            value = self.client.hget(self.prefix + node_id, url)
+            if value is None:
+                continue
+            nodeinfo = ShareNodeInformation.parse_raw(value)
+            if to_timestamp(nodeinfo.latest_registration) >= limit:
+                self.register(nodeinfo)
+                continue
+            nodeinfo.status = NodeStatus.OFFLINE
+            self.client.hset(self.prefix + node_id, url, nodeinfo.json())
+            expired.append(nodeinfo)
+        return expired
+
+    def count(self) -> int:
+        pipeline = self.client.pipeline()
+        for node_id in self.client.smembers(self.index):
+            pipeline.hlen(self.prefix + node_id.decode("utf-8"))
+        return sum(pipeline.execute())
+
+
+def create_node_store(configuration_service: ConfigurationService) -> NodeStore:
+    """Create the node store selected in the configuration"""
+    node_list = configuration_service.get_share_node_list()
+    refresh_period = configuration_service.get_refresh_period()
+    node_store_type = configuration_service.get_node_store_type()
+    if node_store_type == NodeStoreType.SQLITE:
+        return SqliteNodeStore(
+            configuration_service.get_node_store_path(),
+            node_list,
+            refresh_period=refresh_period,
+        )
+    if node_store_type == NodeStoreType.REDIS:
+        return RedisNodeStore(
+            configuration_service.get_node_store_url(),
+            node_list,
+            refresh_period=refresh_period,
+        )
+    return MemoryNodeStore(node_list, refresh_period=refresh_period)
+
+
+node_store_lock = threading.Lock()
+node_store: Union[NodeStore, None] = None
+
+
+def get_node_store() -> NodeStore:
+    """Getting the single process-wide instance of the node store"""
+    global node_store
+    if node_store is None:
+        with node_store_lock:
+            if node_store is None:
+                node_store = create_node_store(ConfigurationService())
+    return node_store
@@ -7,6 +7,7 @@ from fastapi.testclient import TestClient
 
 from shared_code.app import app as application  # pragma: no cover # NOQA: E402
 from shared_code.configuration_service import ConfigurationService
+from shared_code.node_store import MemoryNodeStore, RedisNodeStore, SqliteNodeStore
 from shared_code.registry_service import RegistryService
 
 os.environ["AZURE_TENANT_ID"] = "02020202-0000-0000-0000-020202020202"
@@ -41,6 +42,16 @@ def registry_service():
     return RegistryService()
 
 
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def node_store(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteNodeStore(str(tmp_path / "nodes.db"))
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        return RedisNodeStore("", client=fakeredis.FakeRedis())
+    return MemoryNodeStore()
+
+
 class MinimalResponse(object):  # Not for production use
     def __init__(self, requests_resp=None, status_code=None, text=None):
         self.status_code = status_code or requests_resp.status_code
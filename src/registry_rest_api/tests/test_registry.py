@@ -1,9 +1,25 @@
-from datetime import datetime
+import asyncio
+import multiprocessing
+from datetime import datetime, timedelta
 from unittest.mock import patch
 
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
-from shared_code.models import ConsumeResponse, Dataset, Error, ShareNode, StatusDetails
+from shared_code.heartbeat_pacer import HeartbeatPacer
+from shared_code.leader_election import LeaderElection, PeriodicJobService
+from shared_code.models import (
+    ConsumeResponse,
+    Dataset,
+    Error,
+    NodeStatus,
+    ShareNode,
+    ShareNodeInformation,
+    StatusDetails,
+)
+from shared_code.node_store import MemoryNodeStore, NodeStore, SqliteNodeStore
+from shared_code.registry_service import RegistryService
 
 from .conftest import MinimalResponse
 
@@ -58,7 +74,7 @@ def test_get_node(client: TestClient):
 
 
 def test_shareconsume(client: TestClient):
-    with patch("requests.get") as mock_requests_get:
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get:
         node_id = "testa"
         invitation_id = "00000000-0000-0000-000000000000"
 
@@ -102,3 +118,230 @@ def test_shareconsume(client: TestClient):
             headers={"accept": "application/json", "Content-Type": "application/json"},
         )
         assert registry_response.status_code == 200
+
+
+def test_register_node_in_place(node_store):
+    registry_service = RegistryService(node_store=node_store)
+    node = ShareNode(
+        node_id="testb",
+        url="http://127.0.0.1/",
+        name="testb",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+    )
+    registry_service.register(node)
+    registry_service.register(node)
+    assert registry_service.node_store.count() == 1
+    assert registry_service.node("testb").node_id == "testb"
+    assert len(registry_service.nodes()) == 1
+
+
+def test_update_node_status_offline(node_store):
+    registry_service = RegistryService(node_store=node_store)
+    nodeinfo = ShareNodeInformation(
+        node_id="testb",
+        url="http://127.0.0.1/",
+        name="testb",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+        status=NodeStatus.ONLINE,
+        latest_registration=datetime.utcnow() - timedelta(seconds=120),
+    )
+    node_store.register(nodeinfo)
+    # The status is computed when the node is read
+    with pytest.raises(HTTPException) as ex:
+        registry_service.node("testb")
+    assert ex.value.status_code == 404
+    assert node_store.get_nodes()[0].status == NodeStatus.OFFLINE
+    # Each expired node is reported once
+    expired = node_store.expire_nodes(datetime.utcnow())
+    assert [item.node_id for item in expired] == ["testb"]
+    assert node_store.expire_nodes(datetime.utcnow()) == []
+    assert registry_service.update_node_status() is True
+
+
+def test_expire_nodes_registered_again(node_store):
+    node = ShareNode(
+        node_id="testb",
+        url="http://127.0.0.1/",
+        name="testb",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+    )
+    RegistryService(node_store=node_store).register(node)
+    RegistryService(node_store=node_store).register(node)
+    expired = node_store.expire_nodes(datetime.utcnow() + timedelta(seconds=30))
+    assert expired == []
+    expired = node_store.expire_nodes(datetime.utcnow() + timedelta(seconds=120))
+    assert len(expired) == 1
+
+
+def test_incomplete_node_store():
+    class PartialNodeStore(NodeStore):
+        def register(self, nodeinfo: ShareNode) -> None:
+            pass
+
+    with pytest.raises(TypeError):
+        PartialNodeStore(refresh_period=60)
+
+
+def test_sqlite_node_store_shared(tmp_path):
+    path = str(tmp_path / "nodes.db")
+    worker_a = RegistryService(node_store=SqliteNodeStore(path))
+    worker_b = RegistryService(node_store=SqliteNodeStore(path))
+    node = ShareNode(
+        node_id="testc",
+        url="http://127.0.0.1/",
+        name="testc",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+    )
+    worker_a.register(node)
+    assert worker_b.node("testc").node_id == "testc"
+
+
+def test_heartbeat(client: TestClient):
+    node = ShareNode(
+        node_id="testd",
+        url="http://127.0.0.1/",
+        name="testd",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+    )
+    headers = {"accept": "application/json", "Content-Type": "application/json"}
+    registry_response = client.post(url="/register", json=node.dict(), headers=headers)
+    assert registry_response.status_code == 200
+    etag = registry_response.headers["ETag"]
+
+    registry_response = client.put(
+        url="/nodes/testd/heartbeat", headers={**headers, "If-Match": etag}
+    )
+    assert registry_response.status_code == 200
+    assert registry_response.json()["etag"] == etag
+    assert 30 <= int(registry_response.headers["X-Next-Heartbeat"]) <= 45
+
+    registry_response = client.put(
+        url="/nodes/testd/heartbeat", headers={**headers, "If-Match": '"changed"'}
+    )
+    assert registry_response.status_code == 412
+
+    registry_response = client.put(
+        url="/nodes/unknown/heartbeat", headers={**headers, "If-Match": etag}
+    )
+    assert registry_response.status_code == 404
+
+    registry_response = client.put(url="/nodes/testd/heartbeat", headers=headers)
+    assert registry_response.status_code == 428
+
+
+def test_touch_node(node_store):
+    nodeinfo = ShareNodeInformation(
+        node_id="teste",
+        url="http://127.0.0.1/",
+        name="teste",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+        status=NodeStatus.ONLINE,
+        latest_registration=datetime.utcnow() - timedelta(seconds=120),
+    )
+    node_store.register(nodeinfo)
+    assert node_store.get_node("teste") is None
+    assert node_store.touch("teste", "http://127.0.0.1/", datetime.utcnow()) is True
+    assert node_store.get_node("teste").status == NodeStatus.ONLINE
+    assert node_store.touch("teste", "http://unknown/", datetime.utcnow()) is False
+    assert node_store.expire_nodes(datetime.utcnow()) == []
+
+
+def test_memory_node_store_expiry_index_bounded():
+    node_store = MemoryNodeStore(refresh_period=60)
+    for index in range(10):
+        node_store.register(
+            ShareNodeInformation(
+                node_id=f"node{index}",
+                url="http://127.0.0.1/",
+                name=f"node{index}",
+                tenant_id="00000000-0000-0000-000000000000",
+                identity="00000000-0000-0000-000000000000",
+                status=NodeStatus.ONLINE,
+                latest_registration=datetime.utcnow(),
+            )
+        )
+    # Heartbeats without any expire_nodes call (non leader worker)
+    for _ in range(100):
+        for index in range(10):
+            node_store.touch(f"node{index}", "http://127.0.0.1/", datetime.utcnow())
+    assert len(node_store.expiry_index) <= 20
+    expired = node_store.expire_nodes(datetime.utcnow() + timedelta(seconds=120))
+    assert len(expired) == 10
+    assert node_store.expiry_index == []
+
+
+def test_heartbeat_pacer_spreads_heartbeats():
+    heartbeat_pacer = HeartbeatPacer(60)
+    intervals = [heartbeat_pacer.suggest_interval(1000.0) for _ in range(32)]
+    assert min(intervals) == 30
+    assert max(intervals) == 45
+    # 32 heartbeats in a window of 16 seconds: 2 heartbeats per second
+    assert all(intervals.count(interval) == 2 for interval in set(intervals))
+
+
+def hold_leadership(lock_dir, acquired, stop):
+    election = LeaderElection(lock_dir)
+    if election.is_leader("update_node_status"):
+        acquired.set()
+    stop.wait(10)
+
+
+def test_leader_election(tmp_path):
+    election_a = LeaderElection(str(tmp_path))
+    election_b = LeaderElection(str(tmp_path))
+    assert election_a.is_leader("update_node_status") is True
+    assert election_b.is_leader("update_node_status") is False
+    # Each job has its own leader
+    assert election_b.is_leader("other_job") is True
+    election_a.release("update_node_status")
+    assert election_b.is_leader("update_node_status") is True
+    election_b.release_all()
+
+    # Handoff when the leader process dies
+    context = multiprocessing.get_context("fork")
+    acquired, stop = context.Event(), context.Event()
+    process = context.Process(
+        target=hold_leadership, args=(str(tmp_path), acquired, stop)
+    )
+    process.start()
+    assert acquired.wait(10)
+    assert election_a.is_leader("update_node_status") is False
+    stop.set()
+    process.join(10)
+    assert election_a.is_leader("update_node_status") is True
+    election_a.release_all()
+
+
+def test_periodic_job_service(tmp_path):
+    calls = {"a": 0, "b": 0}
+
+    def job_a():
+        calls["a"] += 1
+
+    def job_b():
+        calls["b"] += 1
+
+    async def run_workers():
+        service_a = PeriodicJobService(LeaderElection(str(tmp_path)), 0.01)
+        service_b = PeriodicJobService(LeaderElection(str(tmp_path)), 0.01)
+        service_a.add_job("update_node_status", job_a, 0.01)
+        service_b.add_job("update_node_status", job_b, 0.01)
+        service_a.start()
+        service_b.start()
+        await asyncio.sleep(0.2)
+        # Only the leader runs the job
+        assert calls["a"] > 0
+        assert calls["b"] == 0
+        service_a.stop()
+        await asyncio.sleep(0.2)
+        service_b.stop()
+
+    asyncio.run(run_workers())
+    # The other worker takes over when the leader stops
+    assert calls["b"] > 0
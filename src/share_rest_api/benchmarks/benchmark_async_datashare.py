@@ -0,0 +1,150 @@
+# coding: utf-8
+"""
+Concurrent share status polls with the sync and the async Datashare paths.
+
+Azure is replaced by a local stand-in: each ARM call waits ARM_LATENCY
+seconds, each registry lookup waits REGISTRY_LATENCY seconds. CONCURRENCY
+polls of distinct shares are in flight at the same time in one worker, the
+way GET /share runs them.
+
+sync: the route runs ShareService.share_status in the threadpool of the
+event loop, the ARM calls run in the workers of the WorkScheduler.
+async: the route awaits AsyncShareService.share_status, the ARM calls are
+awaited with the aio client (ASYNC_DATASHARE=true).
+
+Usage (from src/share_rest_api):
+    PYTHONPATH=./src python3 benchmarks/benchmark_async_datashare.py
+"""
+import asyncio
+import statistics
+import threading
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List
+from unittest.mock import patch
+
+from starlette.concurrency import run_in_threadpool
+
+from shared_code.async_share_service import AsyncShareService
+from shared_code.models import Node
+from shared_code.share_service import ShareService
+
+ARM_LATENCY = 0.05
+REGISTRY_LATENCY = 0.005
+CONCURRENCY = [50, 200, 500]
+
+
+class FakeInvitation:
+    invitation_status = "Pending"
+    sent_at = datetime.utcnow()
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.invitation_id = name
+
+
+class FakeInvitations:
+    """Stand-in of the invitations operations of DataShareManagementClient"""
+
+    def get(self, resource_group_name, account_name, share_name, name):
+        time.sleep(ARM_LATENCY)
+        return FakeInvitation(name)
+
+
+class FakeAsyncInvitations:
+    """Stand-in of the invitations operations of the aio client"""
+
+    async def get(self, resource_group_name, account_name, share_name, name):
+        await asyncio.sleep(ARM_LATENCY)
+        return FakeInvitation(name)
+
+
+class FakeClient:
+    def __init__(self, invitations) -> None:
+        self.invitations = invitations
+
+
+class FakeResponse:
+    status_code = 200
+    text = Node(node_id="consumer", tenant_id="tenant", identity="identity").json()
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+def registry_get(*args, **kwargs) -> FakeResponse:
+    time.sleep(REGISTRY_LATENCY)
+    return FakeResponse()
+
+
+async def async_registry_get(*args, **kwargs) -> FakeResponse:
+    await asyncio.sleep(REGISTRY_LATENCY)
+    return FakeResponse()
+
+
+def initialize(self) -> None:
+    self.datashare_client = FakeClient(FakeInvitations())
+    self.async_client = FakeClient(FakeAsyncInvitations())
+
+
+def get_parameters(index: int) -> dict:
+    return dict(
+        provider_node_id="provider",
+        consumer_node_id=f"consumer{index}",
+        datashare_storage_resource_group_name="rg",
+        datashare_storage_account_name="sa",
+        datashare_storage_container_name="container",
+        datashare_storage_folder_path="folder",
+        datashare_storage_file_name="file.csv",
+    )
+
+
+def sync_poll(index: int) -> Awaitable:
+    return run_in_threadpool(ShareService().share_status, **get_parameters(index))
+
+
+def async_poll(index: int) -> Awaitable:
+    return AsyncShareService().share_status(**get_parameters(index))
+
+
+async def measure(name: str, poll: Callable[[int], Awaitable], concurrency: int):
+    latencies: List[float] = []
+    threads = [threading.active_count()]
+
+    async def run(index: int) -> None:
+        start = time.perf_counter()
+        await poll(index)
+        latencies.append(time.perf_counter() - start)
+        threads.append(threading.active_count())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run(index) for index in range(concurrency)])
+    duration = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{name:<6} concurrency={concurrency:<4}"
+        f" throughput={concurrency / duration:7.1f} req/s"
+        f" p50={statistics.median(latencies) * 1000:7.1f} ms"
+        f" p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms"
+        f" threads={max(threads)}"
+    )
+
+
+async def main() -> None:
+    for concurrency in CONCURRENCY:
+        await measure("sync", sync_poll, concurrency)
+        await measure("async", async_poll, concurrency)
+
+
+if __name__ == "__main__":
+    with patch(
+        "shared_code.datashare_service.DatashareService.initialize", initialize
+    ), patch(
+        "shared_code.async_datashare_service.AsyncDatashareService.initialize",
+        initialize,
+    ), patch(
+        "shared_code.http_client.HttpClient.get", registry_get
+    ), patch(
+        "shared_code.http_client.AsyncHttpClient.get", async_registry_get
+    ):
+        asyncio.run(main())
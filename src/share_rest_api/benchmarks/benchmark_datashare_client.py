@@ -0,0 +1,147 @@
+# coding: utf-8
+"""
+Per-request latency of the DatashareService initialization.
+
+Azure is replaced by a local stand-in: the credential acquires its token
+(credential chain probe) at its first use, then each ARM call waits
+ARM_LATENCY seconds. Each request builds a DatashareService and runs one
+ARM operation, the way ShareService.share, share_status and consume do.
+
+Before: each request creates a DefaultAzureCredential and a
+DataShareManagementClient and reads the datashare account.
+After: the requests share the client of the DatashareClientPool.
+
+The cold start measures the first request after a restart of the worker
+(empty DatashareClientPool): with the persistent token cache, the token
+acquired before the restart is reused.
+
+Usage (from src/share_rest_api):
+    PYTHONPATH=./src python3 benchmarks/benchmark_datashare_client.py
+"""
+import os
+import statistics
+import tempfile
+import threading
+import time
+from typing import Callable, List
+from unittest.mock import patch
+
+from azure.core.credentials import AccessToken
+
+from shared_code.datashare_client_pool import get_datashare_client_pool
+from shared_code.datashare_service import DatashareService
+from shared_code.token_cache import PersistentTokenCache
+
+TOKEN_LATENCY = 0.1
+ARM_LATENCY = 0.02
+THREADS = 8
+REQUESTS = 25
+
+
+class FakeAccount:
+    location = "westus"
+
+
+class FakeCredential:
+    """Stand-in of DefaultAzureCredential, the token is cached per instance"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.token = None
+
+    def get_token(self, *scopes: str) -> AccessToken:
+        with self.lock:
+            if self.token is None:
+                time.sleep(TOKEN_LATENCY)
+                self.token = AccessToken("token", int(time.time()) + 3600)
+        return self.token
+
+
+class FakeOperations:
+    def __init__(self, credential: FakeCredential) -> None:
+        self.credential = credential
+
+    def get(self, *args) -> FakeAccount:
+        self.credential.get_token()
+        time.sleep(ARM_LATENCY)
+        return FakeAccount()
+
+
+class FakeDataShareManagementClient:
+    """Stand-in of DataShareManagementClient"""
+
+    def __init__(self, credential: FakeCredential, subscription_id: str) -> None:
+        self.accounts = FakeOperations(credential)
+        self.shares = FakeOperations(credential)
+
+
+def legacy_request() -> None:
+    # Previous DatashareService.initialize_azure_clients
+    credentials = FakeCredential()
+    datashare_client = FakeDataShareManagementClient(credentials, "sub")
+    datashare_client.accounts.get("testrg", "testds")
+    datashare_client.shares.get("testrg", "testds", "share")
+
+
+def pooled_request() -> None:
+    datashare_service = DatashareService("sub", "tenant", "testrg", "testds")
+    datashare_service.datashare_client.shares.get("testrg", "testds", "share")
+
+
+def measure(name: str, request: Callable[[], None]) -> None:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def run() -> None:
+        for _ in range(REQUESTS):
+            start = time.perf_counter()
+            request()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    print(
+        f"{name:<8} requests={len(latencies)}"
+        f" p50={statistics.median(latencies) * 1000:7.1f} ms"
+        f" p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms"
+    )
+
+
+def measure_cold_start(name: str, request: Callable[[], None]) -> None:
+    latencies: List[float] = []
+    for _ in range(5):
+        get_datashare_client_pool().clear()
+        start = time.perf_counter()
+        request()
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{name:<8} cold start: first={latencies[0] * 1000:7.1f} ms"
+        f" restarts={statistics.mean(latencies[1:]) * 1000:7.1f} ms"
+    )
+
+
+def main() -> None:
+    cache_path = os.path.join(tempfile.mkdtemp(), "token_cache.bin")
+    with patch(
+        "shared_code.datashare_client_pool.create_credential", FakeCredential
+    ), patch(
+        "shared_code.datashare_client_pool.DataShareManagementClient",
+        FakeDataShareManagementClient,
+    ), patch(
+        "shared_code.datashare_client_pool.get_token_cache",
+        lambda: PersistentTokenCache(cache_path),
+    ):
+        measure("before", legacy_request)
+        get_datashare_client_pool().clear()
+        measure("after", pooled_request)
+        measure_cold_start("before", legacy_request)
+        measure_cold_start("after", pooled_request)
+
+
+if __name__ == "__main__":
+    main()
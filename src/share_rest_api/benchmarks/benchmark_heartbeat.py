@@ -0,0 +1,135 @@
+# coding: utf-8
+"""
+Simulation of the registrations of 5000 share nodes in the registry.
+
+All the nodes are restarted at the same time (fleet-wide redeployment),
+then the registry is unavailable during one minute. The simulation
+reports the peak number of requests per second received by the registry:
+- with the previous fixed period (repeat_every),
+- with the HeartbeatScheduler (initial jitter, jitter, backoff),
+- with the HeartbeatScheduler and the delays suggested by the registry
+  HeartbeatPacer.
+It also reports the longest delay between two successful registrations of
+a node while the registry is available: a node is considered offline
+by the registry when this delay is longer than the refresh period.
+
+Usage (from src/share_rest_api):
+    PYTHONPATH=./src python3 benchmarks/benchmark_heartbeat.py
+"""
+import heapq
+import importlib.util
+import os
+import random
+from collections import Counter
+from typing import Any, Callable, Union
+
+from shared_code.heartbeat_scheduler import HeartbeatScheduler
+
+NODE_COUNT = 5000
+REFRESH_PERIOD = 60
+DURATION = 900
+OUTAGE_START = 300
+OUTAGE_END = 360
+REGISTRY_PACER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "..",
+    "registry_rest_api",
+    "src",
+    "shared_code",
+    "heartbeat_pacer.py",
+)
+
+
+def load_registry_pacer() -> Any:
+    """Load the HeartbeatPacer class from the registry_rest_api sources"""
+    if not os.path.exists(REGISTRY_PACER_PATH):
+        return None
+    spec = importlib.util.spec_from_file_location(
+        "registry_heartbeat_pacer", REGISTRY_PACER_PATH
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.HeartbeatPacer
+
+
+def simulate(
+    name: str,
+    initial_delay: Callable[[int], float],
+    next_delay: Callable[[int, float, bool], float],
+) -> None:
+    requests_per_second = Counter()
+    latest_success = {}
+    max_gap = 0.0
+    events = [(initial_delay(node), node) for node in range(NODE_COUNT)]
+    heapq.heapify(events)
+    while events:
+        time, node = heapq.heappop(events)
+        if time >= DURATION:
+            continue
+        requests_per_second[int(time)] += 1
+        success = not (OUTAGE_START <= time < OUTAGE_END)
+        if success:
+            previous = latest_success.get(node)
+            if previous is not None and not (
+                previous < OUTAGE_END and time > OUTAGE_START
+            ):
+                max_gap = max(max_gap, time - previous)
+            latest_success[node] = time
+        heapq.heappush(events, (time + next_delay(node, time, success), node))
+
+    def peak(start: int, end: int) -> int:
+        return max(requests_per_second.get(second, 0) for second in range(start, end))
+
+    print(
+        f"{name:<38} peak rps: startup={peak(0, REFRESH_PERIOD):5}"
+        f" steady={peak(2 * REFRESH_PERIOD, OUTAGE_START):5}"
+        f" after outage={peak(OUTAGE_END, DURATION):5}"
+        f" max gap={max_gap:5.1f}s"
+    )
+
+
+def main() -> None:
+    rng = random.Random(0)
+
+    # Previous behavior: every node restarts within 2 seconds, then
+    # registers every REFRESH_PERIOD whatever the result
+    simulate(
+        "fixed period",
+        lambda node: rng.uniform(0, 2),
+        lambda node, time, success: REFRESH_PERIOD,
+    )
+
+    schedulers = [
+        HeartbeatScheduler(REFRESH_PERIOD, seed=node) for node in range(NODE_COUNT)
+    ]
+    simulate(
+        "jitter + backoff",
+        lambda node: rng.uniform(0, 2) + schedulers[node].get_initial_delay(),
+        lambda node, time, success: schedulers[node].get_next_delay(success),
+    )
+
+    HeartbeatPacer = load_registry_pacer()
+    if HeartbeatPacer is None:
+        print("registry HeartbeatPacer not found, pacing not simulated")
+        return
+    pacer = HeartbeatPacer(REFRESH_PERIOD)
+    schedulers = [
+        HeartbeatScheduler(REFRESH_PERIOD, seed=node) for node in range(NODE_COUNT)
+    ]
+
+    def paced_delay(node: int, time: float, success: bool) -> float:
+        suggested: Union[int, None] = None
+        if success:
+            suggested = pacer.suggest_interval(time)
+        return schedulers[node].get_next_delay(success, suggested)
+
+    simulate(
+        "jitter + backoff + registry pacing",
+        lambda node: rng.uniform(0, 2) + schedulers[node].get_initial_delay(),
+        paced_delay,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,39 @@
 import os
 from datetime import datetime
+from typing import List, Union
 
-from fastapi import APIRouter, Body, FastAPI
+from fastapi import APIRouter, Body, FastAPI, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.params import Depends
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
 
+from shared_code.arm_throttling import get_arm_metrics
+from shared_code.async_share_service import AsyncShareService
 from shared_code.configuration_service import ConfigurationService
+from shared_code.job_service import JobService, get_job_service
 from shared_code.log_service import LogService
-from shared_code.models import ConsumeResponse, ShareRequest, ShareResponse
+from shared_code.lro_manager import LroManager, get_lro_manager
+from shared_code.models import (
+    ConsumeBatchResult,
+    ConsumeRequest,
+    ConsumeResponse,
+    JobResponse,
+    LaneMetrics,
+    OperationResponse,
+    ShareBatchResult,
+    ShareRequest,
+    ShareResponse,
+    ThrottleMetrics,
+)
 from shared_code.share_service import ShareService
+from shared_code.status_watcher import (
+    StatusWatcherService,
+    get_status_watcher_service,
+)
+from shared_code.webhook_service import get_webhook_service
+from shared_code.work_scheduler import WorkScheduler, get_work_scheduler
 
 router = APIRouter(prefix="")
 
@@ -31,11 +56,41 @@ def get_share_service() -> ShareService:
     return ShareService()
 
 
+def get_async_share_service() -> Union[AsyncShareService, None]:
+    """Getting the AsyncShareService, None if ASYNC_DATASHARE is not true"""
+    if get_configuration_service().get_async_datashare():
+        return AsyncShareService()
+    return None
+
+
 def get_configuration_service() -> ConfigurationService:
     """Getting a single instance of the LogService"""
     return ConfigurationService()
 
 
+def is_respond_async(prefer: Union[str, None]) -> bool:
+    """Return True if the Prefer header asks for an asynchronous response"""
+    if not prefer:
+        return False
+    return "respond-async" in [value.strip() for value in prefer.split(",")]
+
+
+def check_callback_urls(callback_urls: List[Union[str, None]]) -> None:
+    """Reject the request with 400 if a callback url can't receive webhooks"""
+    for callback_url in callback_urls:
+        if callback_url:
+            get_webhook_service().check_callback_url(callback_url)
+
+
+def accepted(job: JobResponse) -> JSONResponse:
+    """Return 202 Accepted with the job and its url"""
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(job),
+        headers={"Location": f"/jobs/{job.job_id}"},
+    )
+
+
 @router.get(
     "/version",
     responses={
@@ -73,6 +128,11 @@ def get_time(
             "description": "return shareresponse  (ShareResponse)\
  status with params: {ShareRequest}"
         },
+        202: {
+            "description": "return the share job (JobResponse)\
+ with the header Prefer: respond-async",
+            "model": JobResponse,
+        },
         404: {
             "description": "The node with id {consumer_node_id}\
  does not exist."
@@ -81,21 +141,92 @@ def get_time(
     summary="Trigger ShareConsume process with Body: {ShareRequest}",
     response_model=ShareResponse,
 )
-def share(
+async def share(
     request: Request,
     body: ShareRequest = Body(...),
+    prefer: str = Header(None),
     share_service: ShareService = Depends(get_share_service),
-) -> ShareResponse:
+    async_share_service: AsyncShareService = Depends(get_async_share_service),
+) -> Union[ShareResponse, JSONResponse]:
     """Trigger sharing process using POST /share BODY: ShareRequest \
 RESPONSE: ShareResponse"""
     get_log_service().log_information(f"HTTP REQUEST POST /share BODY: {body}")
-    shareresponse = share_service.share(body)
+    if body.callback_url:
+        await run_in_threadpool(check_callback_urls, [body.callback_url])
+    if is_respond_async(prefer):
+        job = await run_in_threadpool(get_job_service().submit, "share", body)
+        get_log_service().log_information(
+            f"HTTP REQUEST POST /share BODY: {body} JOB: {job.job_id}"
+        )
+        return accepted(job)
+    if async_share_service is not None:
+        shareresponse = await async_share_service.share(body)
+    else:
+        shareresponse = await run_in_threadpool(share_service.share, body)
     get_log_service().log_information(
         f"HTTP REQUEST POST /share BODY: {body} RESPONSE: {shareresponse}"
     )
     return shareresponse
 
 
+@router.post(
+    "/share/batch",
+    responses={
+        200: {
+            "description": "return the list of ShareBatchResult\
+ with Body: List of ShareRequest"
+        },
+    },
+    summary="Trigger several share processes with Body: List of ShareRequest",
+    response_model=List[ShareBatchResult],
+)
+def share_batch(
+    request: Request,
+    body: List[ShareRequest] = Body(...),
+    share_service: ShareService = Depends(get_share_service),
+) -> List[ShareBatchResult]:
+    """Trigger sharing processes using POST /share/batch BODY: List of\
+ ShareRequest RESPONSE: List of ShareBatchResult"""
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /share/batch BODY: {len(body)} ShareRequest"
+    )
+    check_callback_urls([share.callback_url for share in body])
+    results = share_service.share_batch(body)
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /share/batch RESPONSE: {results}"
+    )
+    return results
+
+
+@router.post(
+    "/share/status",
+    responses={
+        200: {
+            "description": "return the list of ShareBatchResult\
+ with Body: List of ShareRequest"
+        },
+    },
+    summary="Get the status of several share processes with Body:\
+ List of ShareRequest",
+    response_model=List[ShareBatchResult],
+)
+def share_status_batch(
+    request: Request,
+    body: List[ShareRequest] = Body(...),
+    share_service: ShareService = Depends(get_share_service),
+) -> List[ShareBatchResult]:
+    """Get sharing processes status using POST /share/status BODY: List of\
+ ShareRequest RESPONSE: List of ShareBatchResult"""
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /share/status BODY: {len(body)} ShareRequest"
+    )
+    results = share_service.share_status_batch(body)
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /share/status RESPONSE: {results}"
+    )
+    return results
+
+
 @router.get(
     "/share",
     responses={
@@ -111,7 +242,7 @@ RESPONSE: ShareResponse"""
     summary="Get Share status using params",
     response_model=ShareResponse,
 )
-def share_status(
+async def share_status(
     request: Request,
     provider_node_id: str,
     consumer_node_id: str,
@@ -121,13 +252,14 @@ def share_status(
     datashare_storage_folder_path: str,
     datashare_storage_file_name: str,
     share_service: ShareService = Depends(get_share_service),
+    async_share_service: AsyncShareService = Depends(get_async_share_service),
 ) -> ShareResponse:
     """Get share status using GET /share RESPONSE ShareResponse"""
     get_log_service().log_information(
         f"HTTP REQUEST GET /share PARAMS: {provider_node_id}\
  {consumer_node_id} ..."
     )
-    shareresponse = share_service.share_status(
+    parameters = dict(
         provider_node_id=provider_node_id,
         consumer_node_id=consumer_node_id,
         datashare_storage_resource_group_name=datashare_storage_resource_group_name,
@@ -136,6 +268,12 @@ def share_status(
         datashare_storage_folder_path=datashare_storage_folder_path,
         datashare_storage_file_name=datashare_storage_file_name,
     )
+    if async_share_service is not None:
+        shareresponse = await async_share_service.share_status(**parameters)
+    else:
+        shareresponse = await run_in_threadpool(
+            share_service.share_status, **parameters
+        )
     get_log_service().log_information(
         f"HTTP REQUEST GET /share PARAMS: {provider_node_id}\
  {consumer_node_id} ... RESPONSE: {shareresponse}"
@@ -143,6 +281,53 @@ def share_status(
     return shareresponse
 
 
+@router.get(
+    "/share/events",
+    responses={
+        200: {
+            "description": "Server-Sent Events stream: one event 'status'\
+ with the ShareResponse for each status transition, the stream is closed\
+ when the status is Succeeded or Failed, or after an event 'error'"
+        },
+    },
+    summary="Stream the Share status transitions using params",
+    response_class=StreamingResponse,
+)
+def share_events(
+    request: Request,
+    provider_node_id: str,
+    consumer_node_id: str,
+    datashare_storage_resource_group_name: str,
+    datashare_storage_account_name: str,
+    datashare_storage_container_name: str,
+    datashare_storage_folder_path: str,
+    datashare_storage_file_name: str,
+    share_service: ShareService = Depends(get_share_service),
+    status_watcher_service: StatusWatcherService = Depends(get_status_watcher_service),
+) -> StreamingResponse:
+    """Stream share status transitions using GET /share/events"""
+    get_log_service().log_information(
+        f"HTTP REQUEST GET /share/events PARAMS: {provider_node_id}\
+ {consumer_node_id} ..."
+    )
+    parameters = dict(
+        provider_node_id=provider_node_id,
+        consumer_node_id=consumer_node_id,
+        datashare_storage_resource_group_name=datashare_storage_resource_group_name,
+        datashare_storage_account_name=datashare_storage_account_name,
+        datashare_storage_container_name=datashare_storage_container_name,
+        datashare_storage_folder_path=datashare_storage_folder_path,
+        datashare_storage_file_name=datashare_storage_file_name,
+    )
+    return StreamingResponse(
+        status_watcher_service.events(
+            ("share",) + tuple(parameters.values()),
+            lambda: share_service.share_status(**parameters),
+        ),
+        media_type="text/event-stream",
+    )
+
+
 @router.get(
     "/consume",
     responses={
@@ -150,6 +335,11 @@ def share_status(
             "description": "return consume (ConsumeResponse)\
  status with params: {provider_node_id} {consumer_node_id} {invitation_id}"
         },
+        202: {
+            "description": "return the consume job (JobResponse)\
+ with the header Prefer: respond-async",
+            "model": JobResponse,
+        },
         404: {
             "description": "The node with id {consumer_node_id}\
  does not exist."
@@ -159,21 +349,51 @@ def share_status(
  {provider_node_id} {consumer_node_id} {invitation_id}",
     response_model=ConsumeResponse,
 )
-def consume(
+async def consume(
     request: Request,
     provider_node_id: str,
     consumer_node_id: str,
     invitation_id: str,
+    callback_url: str = None,
+    prefer: str = Header(None),
     share_service: ShareService = Depends(get_share_service),
-) -> ConsumeResponse:
+    async_share_service: AsyncShareService = Depends(get_async_share_service),
+) -> Union[ConsumeResponse, JSONResponse]:
     """Trigger data consumption using GET /consume RESPONSE ConsumeResponse"""
     get_log_service().log_information(
         f"HTTP REQUEST GET /consume PARAMS:\
  {provider_node_id} {consumer_node_id} {invitation_id}"
     )
-    consumeresponse = share_service.consume(
-        provider_node_id, consumer_node_id, invitation_id
-    )
+    if callback_url:
+        await run_in_threadpool(check_callback_urls, [callback_url])
+    if is_respond_async(prefer):
+        job = await run_in_threadpool(
+            get_job_service().submit,
+            "consume",
+            ConsumeRequest(
+                provider_node_id=provider_node_id,
+                consumer_node_id=consumer_node_id,
+                invitation_id=invitation_id,
+                callback_url=callback_url,
+            ),
+        )
+        get_log_service().log_information(
+            f"HTTP REQUEST GET /consume PARAMS:\
+ {provider_node_id} {consumer_node_id} {invitation_id} JOB: {job.job_id}"
+        )
+        return accepted(job)
+    if async_share_service is not None:
+        consumeresponse = await async_share_service.consume(
+            provider_node_id, consumer_node_id, invitation_id, callback_url
+        )
+    else:
+        consumeresponse = await run_in_threadpool(
+            share_service.consume,
+            provider_node_id,
+            consumer_node_id,
+            invitation_id,
+            callback_url,
+        )
     get_log_service().log_information(
         f"HTTP REQUEST GET /consume PARAMS:\
  {provider_node_id} {consumer_node_id} {invitation_id}\
@@ -182,6 +402,104 @@ def consume(
     return consumeresponse
 
 
+@router.post(
+    "/consume/batch",
+    responses={
+        200: {
+            "description": "return the list of ConsumeBatchResult\
+ with Body: List of ConsumeRequest"
+        },
+    },
+    summary="Trigger several consume processes with Body: List of ConsumeRequest",
+    response_model=List[ConsumeBatchResult],
+)
+def consume_batch(
+    request: Request,
+    body: List[ConsumeRequest] = Body(...),
+    share_service: ShareService = Depends(get_share_service),
+) -> List[ConsumeBatchResult]:
+    """Trigger data consumptions using POST /consume/batch BODY: List of\
+ ConsumeRequest RESPONSE: List of ConsumeBatchResult"""
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /consume/batch BODY: {len(body)} ConsumeRequest"
+    )
+    results = share_service.consume_batch(body)
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /consume/batch RESPONSE: {results}"
+    )
+    return results
+
+
+@router.post(
+    "/consume/status",
+    responses={
+        200: {
+            "description": "return the list of ConsumeBatchResult\
+ with Body: List of ConsumeRequest"
+        },
+    },
+    summary="Get the status of several consume processes with Body:\
+ List of ConsumeRequest",
+    response_model=List[ConsumeBatchResult],
+)
+def consume_status_batch(
+    request: Request,
+    body: List[ConsumeRequest] = Body(...),
+    share_service: ShareService = Depends(get_share_service),
+) -> List[ConsumeBatchResult]:
+    """Get data consumptions status using POST /consume/status BODY: List of\
+ ConsumeRequest RESPONSE: List of ConsumeBatchResult"""
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /consume/status BODY: {len(body)} ConsumeRequest"
+    )
+    results = share_service.consume_batch(body, create_subscription=False)
+    get_log_service().log_information(
+        f"HTTP REQUEST POST /consume/status RESPONSE: {results}"
+    )
+    return results
+
+
+@router.get(
+    "/consume/events",
+    responses={
+        200: {
+            "description": "Server-Sent Events stream: one event 'status'\
+ with the ConsumeResponse for each status transition, the stream is closed\
+ when the status is Succeeded or Failed, or after an event 'error'"
+        },
+    },
+    summary="Stream the Consume status transitions with params:\
+ {provider_node_id} {consumer_node_id} {invitation_id}",
+    response_class=StreamingResponse,
+)
+def consume_events(
+    request: Request,
+    provider_node_id: str,
+    consumer_node_id: str,
+    invitation_id: str,
+    share_service: ShareService = Depends(get_share_service),
+    status_watcher_service: StatusWatcherService = Depends(get_status_watcher_service),
+) -> StreamingResponse:
+    """Stream consume status transitions using GET /consume/events"""
+    get_log_service().log_information(
+        f"HTTP REQUEST GET /consume/events PARAMS:\
+ {provider_node_id} {consumer_node_id} {invitation_id}"
+    )
+    return StreamingResponse(
+        status_watcher_service.events(
+            ("consume", provider_node_id, consumer_node_id, invitation_id),
+            # The stream only reads the status of an existing subscription
+            lambda: share_service.consume(
+                provider_node_id,
+                consumer_node_id,
+                invitation_id,
+                create_subscription=False,
+            ),
+        ),
+        media_type="text/event-stream",
+    )
+
+
 @router.post(
     "/shareconsume",
     responses={
@@ -197,17 +515,23 @@ def consume(
     summary="Trigger ShareConsume process with Body: {ShareRequest}",
     response_model=ShareResponse,
 )
-def shareconsume(
+async def shareconsume(
     request: Request,
     body: ShareRequest = Body(...),
     share_service: ShareService = Depends(get_share_service),
+    async_share_service: AsyncShareService = Depends(get_async_share_service),
 ) -> ShareResponse:
     """Trigger data sharing using POST /shareconsume RESPONSE ShareResponse"""
     get_log_service().log_information(
         f"HTTP REQUEST POST\
  /shareconsume BODY: {body}"
     )
-    shareresponse = share_service.share(body)
+    if body.callback_url:
+        await run_in_threadpool(check_callback_urls, [body.callback_url])
+    if async_share_service is not None:
+        shareresponse = await async_share_service.share(body)
+    else:
+        shareresponse = await run_in_threadpool(share_service.share, body)
     get_log_service().log_information(
         f"HTTP REQUEST GET /shareconsume BODY: {body}\
  RESPONSE: {shareresponse}"
@@ -270,12 +594,14 @@ RESPONSE ConsumeResponse"""
  params: {provider_node_id} {consumer_node_id} {invitation_id}",
     response_model=ConsumeResponse,
 )
-def consumeshare(
+async def consumeshare(
     request: Request,
     provider_node_id: str,
     consumer_node_id: str,
     invitation_id: str,
+    callback_url: str = None,
     share_service: ShareService = Depends(get_share_service),
+    async_share_service: AsyncShareService = Depends(get_async_share_service),
 ) -> ConsumeResponse:
     """Get data share status using GET /consumeshare RESPONSE\
  ConsumeResponse"""
@@ -283,9 +609,20 @@ def consumeshare(
         f"HTTP REQUEST GET /consumeshare PARAMS: {provider_node_id}\
  {consumer_node_id} {invitation_id}"
     )
-    consumeresponse = share_service.consume(
-        provider_node_id, consumer_node_id, invitation_id
-    )
+    if callback_url:
+        await run_in_threadpool(check_callback_urls, [callback_url])
+    if async_share_service is not None:
+        consumeresponse = await async_share_service.consume(
+            provider_node_id, consumer_node_id, invitation_id, callback_url
+        )
+    else:
+        consumeresponse = await run_in_threadpool(
+            share_service.consume,
+            provider_node_id,
+            consumer_node_id,
+            invitation_id,
+            callback_url,
+        )
     get_log_service().log_information(
         f"HTTP REQUEST GET /consumeshare PARAMS: {provider_node_id}\
  {consumer_node_id} {invitation_id} RESPONSE: {consumeresponse}"
@@ -293,4 +630,76 @@ def consumeshare(
     return consumeresponse
 
 
+@router.get(
+    "/scheduler/lanes",
+    responses={
+        200: {"description": "return the metrics of each lane (LaneMetrics)"},
+    },
+    summary="Get the queue depth and the wait time of the scheduler lanes",
+    response_model=List[LaneMetrics],
+)
+def get_scheduler_lanes(
+    request: Request,
+    work_scheduler: WorkScheduler = Depends(get_work_scheduler),
+) -> List[LaneMetrics]:
+    """Get the scheduler metrics using GET /scheduler/lanes"""
+    return work_scheduler.get_metrics()
+
+
+@router.get(
+    "/throttling",
+    responses={
+        200: {"description": "return the ARM throttling metrics (ThrottleMetrics)"},
+    },
+    summary="Get the rate limiter and throttling metrics of the Azure subscriptions",
+    response_model=List[ThrottleMetrics],
+)
+def get_throttling(
+    request: Request,
+) -> List[ThrottleMetrics]:
+    """Get the throttling metrics using GET /throttling"""
+    return get_arm_metrics()
+
+
+@router.get(
+    "/operations",
+    responses={
+        200: {"description": "return the Azure long running operations"},
+    },
+    summary="Get the status of the Azure long running operations of the node",
+    response_model=List[OperationResponse],
+)
+def get_operations(
+    request: Request,
+    lro_manager: LroManager = Depends(get_lro_manager),
+) -> List[OperationResponse]:
+    """Get the long running operations using GET /operations"""
+    return lro_manager.get_responses()
+
+
+@router.get(
+    "/jobs/{job_id}",
+    responses={
+        200: {"description": "return the job (JobResponse)"},
+        404: {"description": "The job with id {job_id} does not exist."},
+    },
+    summary="Get the status and the result of a share or consume job",
+    response_model=JobResponse,
+)
+def get_job(
+    request: Request,
+    job_id: str,
+    job_service: JobService = Depends(get_job_service),
+) -> JobResponse:
+    """Get job status using GET /jobs/{job_id} RESPONSE JobResponse"""
+    get_log_service().log_information(f"HTTP REQUEST GET /jobs/{job_id}")
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    get_log_service().log_information(
+        f"HTTP REQUEST GET /jobs/{job_id} RESPONSE: {job}"
+    )
+    return job
+
+
 app.include_router(router, prefix="")
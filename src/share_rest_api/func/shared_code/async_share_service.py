@@ -0,0 +1,225 @@
+import json
+from typing import Union
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from shared_code.async_datashare_service import AsyncDatashareService
+from shared_code.configuration_service import ConfigurationService
+from shared_code.http_client import get_async_http_client
+from shared_code.models import (
+    ConsumeRequest,
+    ConsumeResponse,
+    Dataset,
+    Node,
+    ShareRequest,
+    ShareResponse,
+)
+from shared_code.node_directory import get_node_directory
+from shared_code.share_service import ShareService
+from shared_code.terminal_state_cache import get_terminal_state_cache
+from shared_code.webhook_service import get_webhook_service
+
+
+async def get_async_datashare_service() -> AsyncDatashareService:
+    """
+    Getting a single instance of the AsyncDatashareService, created in the
+    threadpool: its initialization calls Azure with the sync client
+    """
+    configuration_service = ConfigurationService()
+    return await run_in_threadpool(
+        AsyncDatashareService,
+        subscription_id=configuration_service.get_subscription_id(),
+        tenant_id=configuration_service.get_tenant_id(),
+        datashare_resource_group_name=configuration_service.get_datashare_resource_group_name(),
+        datashare_account_name=configuration_service.get_datashare_account_name(),
+    )
+
+
+class AsyncShareService:
+    """
+    Class used to implement the share, share_status and consume methods of
+    the ShareService with the AsyncDatashareService for the async routes.
+    The terminal state cache and the webhooks are shared with the
+    ShareService, the webhooks poll the status with the ShareService.
+    """
+
+    def __init__(self) -> None:
+        self.share_service = ShareService()
+
+    async def read_node(self, node_id: str) -> Union[Node, None]:
+        """Read the node from the registry, None if it is not found"""
+        for url in ConfigurationService().get_registry_list():
+            node_response = await get_async_http_client().get(
+                url=f"{url}/nodes/{node_id}",
+                headers={"Content-Type": "application/json"},
+            )
+            if node_response.status_code == 404:
+                return None
+            node_response.raise_for_status()
+            return json.loads(node_response.text)
+        return None
+
+    async def get_node(self, node_id: str) -> Node:
+        """Get the node from the node directory, see ShareService.get_node"""
+        node = await get_node_directory().get_async(node_id, self.read_node)
+        if node is None:
+            raise HTTPException(
+                status_code=404, detail=f"Node '{node_id}' does not exists."
+            )
+        return node
+
+    async def share(self, share: ShareRequest) -> ShareResponse:
+        """
+        Implement the share method
+        input ShareRequest
+        return ShareResponse
+        """
+        try:
+            node = await self.get_node(share.consumer_node_id)
+            try:
+                datashare_service = await get_async_datashare_service()
+                share_response = await datashare_service.share_async(
+                    provider_node_id=share.provider_node_id,
+                    consumer_node_id=share.consumer_node_id,
+                    tenant_id=node["tenant_id"],
+                    identity=node["identity"],
+                    datashare_storage_resource_group_name=share.dataset.resource_group_name,
+                    datashare_storage_account_name=share.dataset.storage_account_name,
+                    datashare_storage_container_name=share.dataset.container_name,
+                    datashare_storage_folder_path=share.dataset.folder_path,
+                    datashare_storage_file_name=share.dataset.file_name,
+                )
+            except Exception as ex:
+                self.share_service.invalidate_node(share.consumer_node_id, ex)
+                raise
+            if share.callback_url:
+                self.share_service.watch_share(share)
+            return share_response
+        except HTTPException as e:
+            self.share_service.raise_http_exception(e.status_code, e.detail, "")
+        except Exception as ex:
+            self.share_service.raise_http_exception(
+                500,
+                "Internal server error",
+                f"Exception in 'share' method: {ex}",
+            )
+
+    async def share_status(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+    ) -> ShareResponse:
+        """
+        Implement the share_status method, see ShareService.share_status
+        """
+        share = ShareRequest(
+            provider_node_id=provider_node_id,
+            consumer_node_id=consumer_node_id,
+            dataset=Dataset(
+                resource_group_name=datashare_storage_resource_group_name,
+                storage_account_name=datashare_storage_account_name,
+                container_name=datashare_storage_container_name,
+                folder_path=datashare_storage_folder_path,
+                file_name=datashare_storage_file_name,
+            ),
+        )
+        key = self.share_service.get_share_key(share)
+        share_response = get_terminal_state_cache().get(key)
+        if share_response is not None:
+            return share_response
+        try:
+            node = await self.get_node(consumer_node_id)
+            try:
+                datashare_service = await get_async_datashare_service()
+                share_response = await datashare_service.share_status_async(
+                    provider_node_id=provider_node_id,
+                    consumer_node_id=consumer_node_id,
+                    tenant_id=node["tenant_id"],
+                    identity=node["identity"],
+                    datashare_storage_resource_group_name=datashare_storage_resource_group_name,
+                    datashare_storage_account_name=datashare_storage_account_name,
+                    datashare_storage_container_name=datashare_storage_container_name,
+                    datashare_storage_folder_path=datashare_storage_folder_path,
+                    datashare_storage_file_name=datashare_storage_file_name,
+                )
+            except Exception as ex:
+                self.share_service.invalidate_node(consumer_node_id, ex)
+                raise
+            get_terminal_state_cache().put(key, share_response)
+            return share_response
+        except HTTPException as e:
+            self.share_service.raise_http_exception(e.status_code, e.detail, "")
+        except Exception as ex:
+            self.share_service.raise_http_exception(
+                500,
+                "Internal server error",
+                f"Exception in 'share' method: {ex}",
+            )
+
+    async def consume(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        invitation_id: str,
+        callback_url: str = None,
+        create_subscription: bool = True,
+    ) -> ConsumeResponse:
+        """
+        Implement the consume method, see ShareService.consume
+        """
+        try:
+            consume = ConsumeRequest(
+                provider_node_id=provider_node_id,
+                consumer_node_id=consumer_node_id,
+                invitation_id=invitation_id,
+                callback_url=callback_url,
+            )
+            consumer_node_id = (
+                consume.consumer_node_id or ConfigurationService().get_node_id()
+            )
+            key = ("consume", provider_node_id, consumer_node_id, invitation_id)
+            consume_response = get_terminal_state_cache().get(key)
+            if consume_response is None:
+                dataset = self.share_service.get_consume_dataset(
+                    provider_node_id, invitation_id
+                )
+                datashare_service = await get_async_datashare_service()
+                consume_response = await datashare_service.consume_async(
+                    provider_node_id=provider_node_id,
+                    consumer_node_id=consumer_node_id,
+                    invitation_id=invitation_id,
+                    datashare_storage_resource_group_name=dataset.resource_group_name,
+                    datashare_storage_account_name=dataset.storage_account_name,
+                    datashare_storage_container_name=dataset.container_name,
+                    datashare_storage_folder_path=dataset.folder_path,
+                    datashare_storage_file_name=dataset.file_name,
+                    create_subscription=create_subscription,
+                )
+                get_terminal_state_cache().put(key, consume_response)
+            if consume.callback_url:
+                get_webhook_service().watch(
+                    key,
+                    "consume",
+                    lambda: self.share_service.consume(
+                        provider_node_id,
+                        consumer_node_id,
+                        invitation_id,
+                        create_subscription=False,
+                    ),
+                    consume.callback_url,
+                )
+            return consume_response
+        except HTTPException as e:
+            self.share_service.raise_http_exception(e.status_code, e.detail, "")
+        except Exception as ex:
+            self.share_service.raise_http_exception(
+                500,
+                "Internal server error",
+                f"Exception in 'consume' method: {ex}",
+            )
@@ -1,5 +1,6 @@
 import json
 import os
+import tempfile
 from typing import Any
 
 
@@ -11,12 +12,51 @@ class ConfigurationService:
     """{ "name":"PORT_HTTP", "value":"${APP_PORT}"},"""
     """{ "name":"WEBSITES_PORT", "value":"${APP_PORT}"}, """
     """{ "name":"REFRESH_PERIOD", "value":"60"},"""
+    """{ "name":"LOCK_DIR", "value":"/tmp/share_rest_api/locks"},"""
+    """{ "name":"LEADER_RETRY_PERIOD", "value":"10"},"""
     """{ "name":"REGISTRY_URL_LIST", "value":"[\"${REGISTRY_URL}\"]"},"""
     """{ "name":"NODE_ID", "value":"${APP_PREFIX}"},"""
     """{ "name":"NODE_NAME", "value":"${APP_PREFIX}"},"""
     """{ "name":"NODE_URL", "value":"https://${WEB_APP_SERVER}"},"""
     """{ "name":"NODE_IDENTITY", "value":"${WEB_APP_OBJECT_ID}"},"""
     """{ "name":"DATASHARE_ACCOUNT_NAME", "value":"${DATASHARE_ACCOUNT_NAME}"},"""
+    """{ "name":"DATASHARE_METADATA_TTL", "value":"3600"},"""
+    """{ "name":"INVITATION_INDEX_REFRESH_PERIOD", "value":"60"},"""
+    """{ "name":"SYNCHRONIZATION_POLL_MIN_INTERVAL", "value":"2"},"""
+    """{ "name":"SYNCHRONIZATION_POLL_MAX_INTERVAL", "value":"60"},"""
+    """{ "name":"STATUS_WATCHER_INTERVAL", "value":"5"},"""
+    """{ "name":"PROVISIONING_CACHE_PATH", "value":"/tmp/share_rest_api/provisioning_cache.db"},"""
+    """{ "name":"PROVISIONING_CACHE_VERIFY_PERIOD", "value":"300"},"""
+    """{ "name":"TERMINAL_STATE_CACHE_SIZE", "value":"10000"},"""
+    """{ "name":"STATUS_MICRO_CACHE_TTL", "value":"1"},"""
+    """{ "name":"JOB_DB_PATH", "value":"/tmp/share_rest_api/jobs.db"},"""
+    """{ "name":"JOB_WORKERS", "value":"4"},"""
+    """{ "name":"JOB_MAX_ATTEMPTS", "value":"3"},"""
+    """{ "name":"HTTP_POOL_SIZE", "value":"32"},"""
+    """{ "name":"HTTP_CONNECT_TIMEOUT", "value":"5"},"""
+    """{ "name":"HTTP_READ_TIMEOUT", "value":"30"},"""
+    """{ "name":"NODE_CACHE_NEGATIVE_TTL", "value":"5"},"""
+    """{ "name":"ASYNC_DATASHARE", "value":"false"},"""
+    """{ "name":"SCHEDULER_WORKERS", "value":"8"},"""
+    """{ "name":"LRO_RETENTION", "value":"3600"},"""
+    """{ "name":"ARM_READ_RATE", "value":"25"},"""
+    """{ "name":"ARM_READ_BURST", "value":"250"},"""
+    """{ "name":"ARM_WRITE_RATE", "value":"10"},"""
+    """{ "name":"ARM_WRITE_BURST", "value":"200"},"""
+    """{ "name":"ARM_RETRY_TOTAL", "value":"6"},"""
+    """{ "name":"ARM_RETRY_MIN_BACKOFF", "value":"1"},"""
+    """{ "name":"ARM_RETRY_MAX_BACKOFF", "value":"60"},"""
+    """{ "name":"BATCH_MAX_WORKERS", "value":"8"},"""
+    """{ "name":"WEBHOOK_SECRET", "value":""},"""
+    """{ "name":"WEBHOOK_POLL_INTERVAL", "value":"10"},"""
+    """{ "name":"WEBHOOK_OUTBOX_SIZE", "value":"1000"},"""
+    """{ "name":"WEBHOOK_MAX_ATTEMPTS", "value":"6"},"""
+    """{ "name":"WEBHOOK_ALLOWED_HOSTS", "value":"[]"},"""
+    """{ "name":"AZURE_CREDENTIAL_TYPE", "value":""},"""
+    """{ "name":"CREDENTIAL_TYPE_PATH", "value":"/tmp/share_rest_api/credential_type"},"""
+    """{ "name":"TOKEN_CACHE_PATH", "value":"/tmp/share_rest_api/token_cache.bin"},"""
+    """{ "name":"TOKEN_CACHE_KEY", "value":""},"""
+    """{ "name":"TOKEN_REFRESH_MARGIN", "value":"300"},"""
     """{ "name":"DATASHARE_RESOURCE_GROUP_NAME", "value":"${RESOURCE_GROUP}"},"""
     """{ "name":"DATASHARE_STORAGE_RESOURCE_GROUP_NAME", "value":"${RESOURCE_GROUP}"},"""
     """{ "name":"DATASHARE_STORAGE_ACCOUNT_NAME", "value":"${STORAGE_ACCOUNT_NAME}"},"""
@@ -53,6 +93,14 @@ class ConfigurationService:
     def get_refresh_period(self) -> int:
         return int(self.get_env_value("REFRESH_PERIOD", "120"))
 
+    def get_lock_dir(self) -> str:
+        return self.get_env_value(
+            "LOCK_DIR", os.path.join(tempfile.gettempdir(), "share_rest_api", "locks")
+        )
+
+    def get_leader_retry_period(self) -> int:
+        return int(self.get_env_value("LEADER_RETRY_PERIOD", "10"))
+
     def get_registry_list(self) -> Any:
         # return json.loads(self.get_env_value("REGISTRY_URL_LIST", "[]"))
         return json.loads('["https://webappreghub0000.azurewebsites.net"]')
@@ -72,6 +120,131 @@ class ConfigurationService:
     def get_datashare_account_name(self) -> str:
         return self.get_env_value("DATASHARE_ACCOUNT_NAME", "")
 
+    def get_datashare_metadata_ttl(self) -> int:
+        return int(self.get_env_value("DATASHARE_METADATA_TTL", "3600"))
+
+    def get_invitation_index_refresh_period(self) -> int:
+        return int(self.get_env_value("INVITATION_INDEX_REFRESH_PERIOD", "60"))
+
+    def get_synchronization_poll_min_interval(self) -> int:
+        return int(self.get_env_value("SYNCHRONIZATION_POLL_MIN_INTERVAL", "2"))
+
+    def get_synchronization_poll_max_interval(self) -> int:
+        return int(self.get_env_value("SYNCHRONIZATION_POLL_MAX_INTERVAL", "60"))
+
+    def get_status_watcher_interval(self) -> int:
+        return int(self.get_env_value("STATUS_WATCHER_INTERVAL", "5"))
+
+    def get_provisioning_cache_path(self) -> str:
+        return self.get_env_value(
+            "PROVISIONING_CACHE_PATH",
+            os.path.join(
+                tempfile.gettempdir(), "share_rest_api", "provisioning_cache.db"
+            ),
+        )
+
+    def get_provisioning_cache_verify_period(self) -> int:
+        return int(self.get_env_value("PROVISIONING_CACHE_VERIFY_PERIOD", "300"))
+
+    def get_terminal_state_cache_size(self) -> int:
+        return int(self.get_env_value("TERMINAL_STATE_CACHE_SIZE", "10000"))
+
+    def get_status_micro_cache_ttl(self) -> float:
+        return float(self.get_env_value("STATUS_MICRO_CACHE_TTL", "1"))
+
+    def get_job_db_path(self) -> str:
+        return self.get_env_value(
+            "JOB_DB_PATH",
+            os.path.join(tempfile.gettempdir(), "share_rest_api", "jobs.db"),
+        )
+
+    def get_job_workers(self) -> int:
+        return int(self.get_env_value("JOB_WORKERS", "4"))
+
+    def get_job_max_attempts(self) -> int:
+        return int(self.get_env_value("JOB_MAX_ATTEMPTS", "3"))
+
+    def get_http_pool_size(self) -> int:
+        return int(self.get_env_value("HTTP_POOL_SIZE", "32"))
+
+    def get_http_connect_timeout(self) -> float:
+        return float(self.get_env_value("HTTP_CONNECT_TIMEOUT", "5"))
+
+    def get_http_read_timeout(self) -> float:
+        return float(self.get_env_value("HTTP_READ_TIMEOUT", "30"))
+
+    def get_node_cache_negative_ttl(self) -> float:
+        return float(self.get_env_value("NODE_CACHE_NEGATIVE_TTL", "5"))
+
+    def get_async_datashare(self) -> bool:
+        return self.get_env_value("ASYNC_DATASHARE", "false").lower() == "true"
+
+    def get_scheduler_workers(self) -> int:
+        return int(self.get_env_value("SCHEDULER_WORKERS", "8"))
+
+    def get_lro_retention(self) -> int:
+        return int(self.get_env_value("LRO_RETENTION", "3600"))
+
+    def get_arm_read_rate(self) -> float:
+        return float(self.get_env_value("ARM_READ_RATE", "25"))
+
+    def get_arm_read_burst(self) -> float:
+        return float(self.get_env_value("ARM_READ_BURST", "250"))
+
+    def get_arm_write_rate(self) -> float:
+        return float(self.get_env_value("ARM_WRITE_RATE", "10"))
+
+    def get_arm_write_burst(self) -> float:
+        return float(self.get_env_value("ARM_WRITE_BURST", "200"))
+
+    def get_arm_retry_total(self) -> int:
+        return int(self.get_env_value("ARM_RETRY_TOTAL", "6"))
+
+    def get_arm_retry_min_backoff(self) -> float:
+        return float(self.get_env_value("ARM_RETRY_MIN_BACKOFF", "1"))
+
+    def get_arm_retry_max_backoff(self) -> float:
+        return float(self.get_env_value("ARM_RETRY_MAX_BACKOFF", "60"))
+
+    def get_batch_max_workers(self) -> int:
+        return int(self.get_env_value("BATCH_MAX_WORKERS", "8"))
+
+    def get_webhook_secret(self) -> str:
+        return self.get_env_value("WEBHOOK_SECRET", "")
+
+    def get_webhook_poll_interval(self) -> int:
+        return int(self.get_env_value("WEBHOOK_POLL_INTERVAL", "10"))
+
+    def get_webhook_outbox_size(self) -> int:
+        return int(self.get_env_value("WEBHOOK_OUTBOX_SIZE", "1000"))
+
+    def get_webhook_max_attempts(self) -> int:
+        return int(self.get_env_value("WEBHOOK_MAX_ATTEMPTS", "6"))
+
+    def get_webhook_allowed_hosts(self) -> Any:
+        return json.loads(self.get_env_value("WEBHOOK_ALLOWED_HOSTS", "[]"))
+
+    def get_azure_credential_type(self) -> str:
+        return self.get_env_value("AZURE_CREDENTIAL_TYPE", "").lower()
+
+    def get_credential_type_path(self) -> str:
+        return self.get_env_value(
+            "CREDENTIAL_TYPE_PATH",
+            os.path.join(tempfile.gettempdir(), "share_rest_api", "credential_type"),
+        )
+
+    def get_token_cache_path(self) -> str:
+        return self.get_env_value(
+            "TOKEN_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "share_rest_api", "token_cache.bin"),
+        )
+
+    def get_token_cache_key(self) -> str:
+        return self.get_env_value("TOKEN_CACHE_KEY", "")
+
+    def get_token_refresh_margin(self) -> int:
+        return int(self.get_env_value("TOKEN_REFRESH_MARGIN", "300"))
+
     def get_datashare_resource_group_name(self) -> str:
         return self.get_env_value("DATASHARE_RESOURCE_GROUP_NAME", "")
 
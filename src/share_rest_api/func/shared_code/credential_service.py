@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from enum import Enum
+from typing import Any, Union
+
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ClientAuthenticationError
+from azure.identity import (
+    AzureCliCredential,
+    AzurePowerShellCredential,
+    DefaultAzureCredential,
+    EnvironmentCredential,
+    ManagedIdentityCredential,
+    SharedTokenCacheCredential,
+    VisualStudioCodeCredential,
+)
+from azure.identity import aio
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+
+
+class CredentialType(str, Enum):
+    DEFAULT = "default"
+    ENVIRONMENT = "environment"
+    MANAGED_IDENTITY = "managed_identity"
+    SHARED_TOKEN_CACHE = "shared_token_cache"
+    VISUAL_STUDIO_CODE = "visual_studio_code"
+    AZURE_CLI = "azure_cli"
+    AZURE_POWERSHELL = "azure_powershell"
+
+
+CREDENTIAL_CLASSES = {
+    CredentialType.ENVIRONMENT: EnvironmentCredential,
+    CredentialType.MANAGED_IDENTITY: ManagedIdentityCredential,
+    CredentialType.SHARED_TOKEN_CACHE: SharedTokenCacheCredential,
+    CredentialType.VISUAL_STUDIO_CODE: VisualStudioCodeCredential,
+    CredentialType.AZURE_CLI: AzureCliCredential,
+    CredentialType.AZURE_POWERSHELL: AzurePowerShellCredential,
+}
+
+
+ASYNC_CREDENTIAL_CLASSES = {
+    CredentialType.ENVIRONMENT: aio.EnvironmentCredential,
+    CredentialType.MANAGED_IDENTITY: aio.ManagedIdentityCredential,
+    CredentialType.SHARED_TOKEN_CACHE: aio.SharedTokenCacheCredential,
+    CredentialType.VISUAL_STUDIO_CODE: aio.VisualStudioCodeCredential,
+    CredentialType.AZURE_CLI: aio.AzureCliCredential,
+    CredentialType.AZURE_POWERSHELL: aio.AzurePowerShellCredential,
+}
+
+
+def build_credential(credential_type: CredentialType) -> Any:
+    """Create the credential associated with the credential type"""
+    if credential_type == CredentialType.DEFAULT:
+        return DefaultAzureCredential()
+    if credential_type == CredentialType.MANAGED_IDENTITY:
+        # Same user assigned identity as DefaultAzureCredential
+        return ManagedIdentityCredential(client_id=os.environ.get("AZURE_CLIENT_ID"))
+    return CREDENTIAL_CLASSES[credential_type]()
+
+
+def build_async_credential(credential_type: CredentialType) -> Any:
+    """Create the azure.identity.aio credential of the credential type"""
+    if credential_type == CredentialType.DEFAULT:
+        return aio.DefaultAzureCredential()
+    if credential_type == CredentialType.MANAGED_IDENTITY:
+        return aio.ManagedIdentityCredential(
+            client_id=os.environ.get("AZURE_CLIENT_ID")
+        )
+    return ASYNC_CREDENTIAL_CLASSES[credential_type]()
+
+
+def read_credential_type(record_path: str) -> CredentialType:
+    """Return the credential type recorded on the host"""
+    try:
+        with open(record_path, "r") as file:
+            return CredentialType(file.read().strip())
+    except (OSError, ValueError):
+        return CredentialType.DEFAULT
+
+
+def get_credential_type(credential: Any) -> Union[CredentialType, None]:
+    """Return the type of the credential, None if the type is unknown"""
+    for credential_type, credential_class in CREDENTIAL_CLASSES.items():
+        if isinstance(credential, credential_class):
+            return credential_type
+    return None
+
+
+class FastPathCredential:
+    """
+    Class used to skip the DefaultAzureCredential chain.
+    The credential type which acquired the first token with the
+    DefaultAzureCredential is recorded in the file record_path, the next
+    starts on the host create this credential directly. If the recorded
+    credential fails, the record is removed and the DefaultAzureCredential
+    chain is used again. AZURE_CREDENTIAL_TYPE overrides the record.
+    """
+
+    def __init__(
+        self,
+        record_path: str,
+        override_type: Union[CredentialType, None] = None,
+    ) -> None:
+        self.record_path = record_path
+        self.override_type = override_type
+        self.lock = threading.Lock()
+        self.log_service = LogService()
+        self.credential_type = override_type or self.read_record()
+        self.credential = build_credential(self.credential_type)
+        self.token_acquired = False
+
+    def read_record(self) -> CredentialType:
+        """Return the credential type recorded on the host"""
+        return read_credential_type(self.record_path)
+
+    def write_record(self, credential_type: CredentialType) -> None:
+        """Record the credential type which acquired a token on the host"""
+        try:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.record_path)), exist_ok=True
+            )
+            temporary_path = f"{self.record_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                file.write(credential_type.value)
+            os.replace(temporary_path, self.record_path)
+        except OSError as ex:
+            self.log_service.log_warning(f"Credential type not recorded: {ex}")
+
+    def remove_record(self) -> None:
+        """Remove the credential type recorded on the host"""
+        try:
+            os.remove(self.record_path)
+        except OSError:
+            pass
+
+    def record_successful_credential(self) -> None:
+        """Record the type of the credential selected by the default chain"""
+        credential_type = get_credential_type(
+            getattr(self.credential, "_successful_credential", None)
+        )
+        if credential_type is not None:
+            self.log_service.log_information(
+                f"Credential {credential_type.value} recorded for the next starts"
+            )
+            self.write_record(credential_type)
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Return a token from the selected credential"""
+        start = time.perf_counter()
+        try:
+            token = self.credential.get_token(*scopes, **kwargs)
+        except ClientAuthenticationError as ex:
+            if self.credential_type in (CredentialType.DEFAULT, self.override_type):
+                raise
+            # The recorded credential is no longer available on this host
+            self.log_service.log_warning(
+                f"Credential {self.credential_type.value} failed, using the\
+ default credential chain: {ex}"
+            )
+            self.remove_record()
+            with self.lock:
+                self.credential_type = CredentialType.DEFAULT
+                self.credential = build_credential(CredentialType.DEFAULT)
+            token = self.credential.get_token(*scopes, **kwargs)
+            self.record_successful_credential()
+        if not self.token_acquired:
+            self.token_acquired = True
+            self.log_service.log_information(
+                f"First token acquired in\
+ {(time.perf_counter() - start) * 1000:.0f} ms with the credential\
+ {self.credential_type.value}"
+            )
+            if self.credential_type == CredentialType.DEFAULT:
+                self.record_successful_credential()
+        return token
+
+    def close(self) -> None:
+        close = getattr(self.credential, "close", None)
+        if close is not None:
+            close()
+
+
+def create_credential() -> FastPathCredential:
+    """Create the credential used to access the Azure management API"""
+    configuration_service = ConfigurationService()
+    override_type = configuration_service.get_azure_credential_type()
+    return FastPathCredential(
+        configuration_service.get_credential_type_path(),
+        CredentialType(override_type) if override_type else None,
+    )
+
+
+def create_async_credential() -> Any:
+    """
+    Create the azure.identity.aio credential used by the aio clients: the
+    credential type recorded by the FastPathCredential, followed by the
+    default chain if the recorded credential fails
+    """
+    configuration_service = ConfigurationService()
+    override_type = configuration_service.get_azure_credential_type()
+    if override_type:
+        return build_async_credential(CredentialType(override_type))
+    credential_type = read_credential_type(
+        configuration_service.get_credential_type_path()
+    )
+    if credential_type == CredentialType.DEFAULT:
+        return build_async_credential(CredentialType.DEFAULT)
+    return aio.ChainedTokenCredential(
+        build_async_credential(credential_type),
+        build_async_credential(CredentialType.DEFAULT),
+    )
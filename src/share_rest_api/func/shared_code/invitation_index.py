@@ -0,0 +1,111 @@
+import threading
+from typing import Any, Dict, Union
+
+from shared_code.log_service import LogService
+
+
+class InvitationIndex:
+    """
+    Class used to index the consumer invitations received by the datashare
+    account by invitation_id.
+    A background thread adds the new invitations every refresh_period
+    seconds: the listing stops at the first page which only contains
+    invitations already indexed, and every full_refresh_count refreshes the
+    whole list is read again to remove the invitations which disappeared.
+    On a miss, the invitation is read directly with
+    consumer_invitations.get(location, invitation_id).
+    """
+
+    def __init__(
+        self,
+        datashare_client: Any,
+        location: str,
+        refresh_period: float = 60,
+        full_refresh_count: int = 10,
+    ) -> None:
+        self.datashare_client = datashare_client
+        self.location = location
+        self.refresh_period = refresh_period
+        self.full_refresh_count = full_refresh_count
+        self.lock = threading.Lock()
+        self.invitations: Dict[str, Any] = {}
+        self.loaded = False
+        self.refresh_count = 0
+        self.refresh_thread: Union[threading.Thread, None] = None
+        self.stopped = threading.Event()
+
+    def refresh(self, full: bool = False) -> None:
+        """Add the new consumer invitations to the index"""
+        invitations = {}
+        for (
+            page
+        ) in self.datashare_client.consumer_invitations.list_invitations().by_page():
+            known = True
+            for invitation in page:
+                invitations[invitation.invitation_id] = invitation
+                if invitation.invitation_id not in self.invitations:
+                    known = False
+            if known and not full:
+                break
+        with self.lock:
+            if full:
+                self.invitations = invitations
+            else:
+                self.invitations.update(invitations)
+            self.loaded = True
+
+    def refresh_loop(self) -> None:
+        while not self.stopped.wait(self.refresh_period):
+            self.refresh_count += 1
+            try:
+                self.refresh(self.refresh_count % self.full_refresh_count == 0)
+            except Exception as ex:
+                LogService().log_error(f"EXCEPTION while indexing invitations: {ex}")
+
+    def start(self) -> None:
+        """Load the index and start the background refresh"""
+        if self.refresh_thread is not None:
+            return
+        with self.lock:
+            if self.refresh_thread is not None:
+                return
+            self.refresh_thread = threading.Thread(
+                target=self.refresh_loop, daemon=True
+            )
+        try:
+            self.refresh(full=True)
+        except Exception as ex:
+            LogService().log_error(f"EXCEPTION while indexing invitations: {ex}")
+        self.refresh_thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def is_empty(self) -> bool:
+        """Return True if no invitation has been received"""
+        self.start()
+        if not self.invitations:
+            # An invitation may have been received since the latest refresh
+            self.refresh()
+        return not self.invitations
+
+    def contains(self, invitation_id: str) -> bool:
+        """Return True if the invitation has been received"""
+        self.start()
+        if invitation_id in self.invitations:
+            return True
+        try:
+            invitation = self.datashare_client.consumer_invitations.get(
+                self.location, invitation_id
+            )
+        except Exception:
+            return False
+        if invitation is None:
+            return False
+        self.add(invitation_id, invitation)
+        return True
+
+    def add(self, invitation_id: str, invitation: Any) -> None:
+        """Add an invitation read outside of the index"""
+        with self.lock:
+            self.invitations[invitation_id] = invitation
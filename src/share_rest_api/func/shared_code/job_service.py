@@ -0,0 +1,303 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Union
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.leader_election import LeaderElection
+from shared_code.log_service import LogService
+from shared_code.models import JobResponse, ShareRequest, Status
+from shared_code.share_service import ShareService
+
+RETRYABLE_CODES = [408, 429]
+
+
+class JobStore:
+    """
+    Class used to persist the jobs in a SQLite database shared by the
+    workers of the host. A job is claimed by a single worker with an
+    atomic update of its status.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    not_before REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )"""
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)"
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def insert(self, kind: str, request: str) -> str:
+        """Store a new queued job, return its id"""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, kind, request, status, created, updated)\
+ VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, request, Status.QUEUED.value, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Union[sqlite3.Row, None]:
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+    def claim(self, owner: str) -> Union[sqlite3.Row, None]:
+        """Mark the oldest queued job as in progress for owner, return it"""
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT job_id FROM jobs WHERE status = ? AND not_before <= ?\
+ ORDER BY created LIMIT 1",
+                (Status.QUEUED.value, time.time()),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, owner = ?, attempts = attempts + 1,\
+ updated = ? WHERE job_id = ?",
+                (Status.IN_PROGRESS.value, owner, time.time(), row["job_id"]),
+            )
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)
+            ).fetchone()
+            connection.execute("COMMIT")
+            return job
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def complete(
+        self,
+        job_id: str,
+        status: Status,
+        result: Union[str, None],
+        error: Union[str, None],
+        not_before: float = 0,
+    ) -> None:
+        """Store the result of a job, Status.QUEUED runs it again"""
+        with self.connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, result = ?, error = ?,\
+ not_before = ?, updated = ? WHERE job_id = ?",
+                (status.value, result, error, not_before, time.time(), job_id),
+            )
+
+    def get_owners(self) -> List[str]:
+        """Return the owners of the jobs in progress"""
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status = ?",
+                (Status.IN_PROGRESS.value,),
+            ).fetchall()
+        return [row["owner"] for row in rows if row["owner"]]
+
+    def requeue(self, owner: str) -> int:
+        """Queue again the jobs in progress of a dead owner"""
+        with self.connect() as connection:
+            return connection.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated = ?\
+ WHERE status = ? AND owner = ?",
+                (Status.QUEUED.value, time.time(), Status.IN_PROGRESS.value, owner),
+            ).rowcount
+
+
+class JobService:
+    """
+    Class used to run the share and consume requests asynchronously.
+    The requests are stored in the JobStore and run by a pool of worker
+    threads in each process. Each process holds the lock file
+    job-owner-{owner}.lock while it runs: when the lock of the owner of a
+    job in progress can be acquired, the process died and its jobs are
+    queued again, so that the jobs resume after a restart. The jobs failing
+    with a 408, 429 or 5xx error are retried up to max_attempts times.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        lock_dir: str,
+        workers: int = 4,
+        max_attempts: int = 3,
+        poll_interval: float = 5,
+    ) -> None:
+        self.store = store
+        self.election = LeaderElection(lock_dir)
+        self.lock_dir = lock_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.owner = uuid.uuid4().hex
+        self.runners: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self.condition = threading.Condition()
+        self.threads: List[threading.Thread] = []
+        self.log_service = LogService()
+
+    def register(self, kind: str, runner: Callable[[Dict[str, Any]], Any]) -> None:
+        """Register the function running the jobs of this kind"""
+        self.runners[kind] = runner
+
+    def submit(self, kind: str, request: BaseModel) -> JobResponse:
+        """Store the request and return the queued job"""
+        job_id = self.store.insert(kind, request.json())
+        self.start()
+        with self.condition:
+            self.condition.notify()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Union[JobResponse, None]:
+        row = self.store.get(job_id)
+        if row is None:
+            return None
+        return JobResponse(
+            job_id=row["job_id"],
+            kind=row["kind"],
+            status=row["status"],
+            attempts=row["attempts"],
+            created=datetime.utcfromtimestamp(row["created"]),
+            updated=datetime.utcfromtimestamp(row["updated"]),
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=json.loads(row["error"]) if row["error"] else None,
+        )
+
+    def recover(self) -> None:
+        """Queue again the jobs of the dead processes"""
+        for owner in self.store.get_owners():
+            name = f"job-owner-{owner}"
+            if owner == self.owner or not self.election.is_leader(name):
+                continue
+            count = self.store.requeue(owner)
+            self.log_service.log_information(f"{count} job(s) of {owner} resumed")
+            self.election.release(name)
+            try:
+                os.remove(os.path.join(self.lock_dir, f"{name}.lock"))
+            except OSError:
+                pass
+
+    def get_retry_delay(self, attempts: int) -> float:
+        return min(300.0, 10.0 * 2 ** (attempts - 1))
+
+    def run_next(self) -> bool:
+        """Run the next queued job, return False if there is none"""
+        job = self.store.claim(self.owner)
+        if job is None:
+            return False
+        try:
+            result = self.runners[job["kind"]](json.loads(job["request"]))
+            self.store.complete(
+                job["job_id"],
+                Status.SUCCEEDED,
+                json.dumps(jsonable_encoder(result)),
+                None,
+            )
+        except Exception as ex:
+            error = ShareService().get_error(ex)
+            self.log_service.log_error(
+                f"Job {job['job_id']} failed code: {error.code}\
+ message: {error.message}"
+            )
+            retryable = error.code in RETRYABLE_CODES or error.code >= 500
+            if retryable and job["attempts"] < self.max_attempts:
+                self.store.complete(
+                    job["job_id"],
+                    Status.QUEUED,
+                    None,
+                    error.json(),
+                    time.time() + self.get_retry_delay(job["attempts"]),
+                )
+            else:
+                self.store.complete(job["job_id"], Status.FAILED, None, error.json())
+        return True
+
+    def worker_loop(self) -> None:
+        while True:
+            try:
+                if self.run_next():
+                    continue
+                self.recover()
+            except Exception as ex:
+                self.log_service.log_error(f"EXCEPTION in job worker_loop: {ex}")
+            with self.condition:
+                self.condition.wait(self.poll_interval)
+
+    def start(self) -> None:
+        """Resume the jobs of the dead processes and start the workers"""
+        if self.threads:
+            return
+        with self.condition:
+            if self.threads:
+                return
+            self.election.is_leader(f"job-owner-{self.owner}")
+            self.recover()
+            self.threads = [
+                threading.Thread(target=self.worker_loop, daemon=True)
+                for _ in range(self.workers)
+            ]
+            for thread in self.threads:
+                thread.start()
+
+
+def run_share_job(request: Dict[str, Any]) -> Any:
+    return ShareService().share(ShareRequest.parse_obj(request))
+
+
+def run_consume_job(request: Dict[str, Any]) -> Any:
+    return ShareService().consume(**request)
+
+
+job_service: Union[JobService, None] = None
+job_service_lock = threading.Lock()
+
+
+def get_job_service() -> JobService:
+    """Getting a single instance of the JobService"""
+    global job_service
+    if job_service is None:
+        with job_service_lock:
+            if job_service is None:
+                configuration_service = ConfigurationService()
+                service = JobService(
+                    JobStore(configuration_service.get_job_db_path()),
+                    configuration_service.get_lock_dir(),
+                    configuration_service.get_job_workers(),
+                    configuration_service.get_job_max_attempts(),
+                )
+                service.register("share", run_share_job)
+                service.register("consume", run_consume_job)
+                job_service = service
+    return job_service
@@ -1,5 +1,6 @@
 from datetime import datetime
 from enum import Enum
+from typing import Optional, Union
 
 from pydantic import BaseModel
 
@@ -29,6 +30,13 @@ class ShareNodeInformation(BaseModel):
     latest_registration: datetime
 
 
+class NodeHeartbeat(BaseModel):
+    node_id: str
+    etag: str
+    latest_registration: datetime
+    next_heartbeat: int
+
+
 class Node(BaseModel):
     node_id: str
     tenant_id: str
@@ -47,12 +55,15 @@ class ShareRequest(BaseModel):
     provider_node_id: str
     consumer_node_id: str
     dataset: Dataset
+    callback_url: Optional[str] = None
 
 
 class ConsumeRequest(BaseModel):
     provider_node_id: str
-    consumer_node_id: str
+    # The current node when the request is sent to the consumer node
+    consumer_node_id: Optional[str] = None
     invitation_id: str
+    callback_url: Optional[str] = None
 
 
 class Error(BaseModel):
@@ -87,6 +98,11 @@ class ShareResponse(BaseModel):
     error: Error
 
 
+class ShareBatchResult(BaseModel):
+    response: Optional[ShareResponse] = None
+    error: Optional[Error] = None
+
+
 class ConsumeResponse(BaseModel):
     invitation_id: str
     provider_node_id: str
@@ -94,3 +110,60 @@ class ConsumeResponse(BaseModel):
     dataset: Dataset
     status: StatusDetails
     error: Error
+
+
+class ConsumeBatchResult(BaseModel):
+    response: Optional[ConsumeResponse] = None
+    error: Optional[Error] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: Status
+    attempts: int
+    created: datetime
+    updated: datetime
+    # ShareResponse of a share job, ConsumeResponse of a consume job
+    result: Optional[Union[ShareResponse, ConsumeResponse]] = None
+    error: Optional[Error] = None
+
+
+class Lane(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+    MAINTENANCE = "maintenance"
+
+
+class LaneMetrics(BaseModel):
+    lane: Lane
+    # Number of queued calls and of consumer nodes waiting
+    depth: int
+    consumers: int
+    running: int
+    submitted: int
+    completed: int
+    # Wait times in milliseconds
+    wait_average: int
+    wait_max: int
+    wait_oldest: int
+
+
+class ThrottleMetrics(BaseModel):
+    subscription_id: str
+    # read or write
+    kind: str
+    requests: int
+    throttled: int
+    retries: int
+    # Time in milliseconds spent waiting for the rate limiter
+    waited: int
+    available: int
+
+
+class OperationResponse(BaseModel):
+    name: str
+    status: Status
+    started: datetime
+    finished: Optional[datetime] = None
+    error: Optional[str] = None
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Union
+
+from azure.mgmt.datashare.models import Invitation
+from pydantic import BaseModel
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+
+
+class ProvisionedShare(BaseModel):
+    """Share, BlobDataSet and Invitation provisioned for a share_id"""
+
+    account: str
+    share_name: str
+    share_arm_id: str
+    data_set_name: str
+    data_set_arm_id: str
+    invitation_name: str
+    invitation_arm_id: str
+    invitation: Dict[str, Any]
+    verified: float
+
+    def get_invitation(self) -> Invitation:
+        return Invitation.from_dict(self.invitation)
+
+
+class ProvisioningCache:
+    """
+    Class used to record the Share, the BlobDataSet and the Invitation
+    created for each share_id (provider-consumer-hash), so that a repeated
+    share request does not read them again from Azure.
+    The entries are stored in a SQLite database shared by the workers of
+    the host and kept across restarts, one row per share_id. An entry older
+    than verify_period seconds is verified with a single invitations.get
+    before it is used, and removed when Azure returns 404.
+    """
+
+    def __init__(self, path: str, verify_period: float = 300) -> None:
+        self.path = path
+        self.verify_period = verify_period
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS provisioned_shares (
+                    share_id TEXT PRIMARY KEY,
+                    entry TEXT NOT NULL
+                )"""
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get(
+        self, share_id: str, account: str, share_name: str
+    ) -> Union[ProvisionedShare, None]:
+        """Return the entry of the share_id if it matches the share"""
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT entry FROM provisioned_shares WHERE share_id = ?", (share_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            entry = ProvisionedShare.parse_raw(row[0])
+        except ValueError as ex:
+            LogService().log_warning(f"Provisioning cache entry ignored: {ex}")
+            return None
+        if entry.account != account or entry.share_name != share_name:
+            return None
+        return entry
+
+    def is_verified(self, entry: ProvisionedShare) -> bool:
+        """Return True if the entry was verified less than verify_period ago"""
+        return time.time() - entry.verified < self.verify_period
+
+    def put(self, share_id: str, entry: ProvisionedShare) -> None:
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO provisioned_shares (share_id, entry)\
+ VALUES (?, ?)",
+                (share_id, entry.json()),
+            )
+
+    def invalidate(self, share_id: str) -> None:
+        with self.connect() as connection:
+            connection.execute(
+                "DELETE FROM provisioned_shares WHERE share_id = ?", (share_id,)
+            )
+
+    def count(self) -> int:
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM provisioned_shares"
+            ).fetchone()[0]
+
+
+provisioning_cache: Union[ProvisioningCache, None] = None
+provisioning_cache_lock = threading.Lock()
+
+
+def get_provisioning_cache() -> ProvisioningCache:
+    """Getting a single instance of the ProvisioningCache"""
+    global provisioning_cache
+    if provisioning_cache is None:
+        with provisioning_cache_lock:
+            if provisioning_cache is None:
+                configuration_service = ConfigurationService()
+                provisioning_cache = ProvisioningCache(
+                    configuration_service.get_provisioning_cache_path(),
+                    configuration_service.get_provisioning_cache_verify_period(),
+                )
+    return provisioning_cache
@@ -1,22 +1,34 @@
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any
+from typing import Any, Callable, Dict, List, Tuple, Type, Union
 
-import requests
 from fastapi import HTTPException
+from pydantic import BaseModel
 
 from shared_code.configuration_service import ConfigurationService
-from shared_code.datashare_service import DatashareService
+from shared_code.datashare_service import DatashareService, is_identity_error
+from shared_code.http_client import get_http_client
 from shared_code.log_service import LogService
 from shared_code.models import (
+    ConsumeBatchResult,
+    ConsumeRequest,
     ConsumeResponse,
+    Dataset,
     Error,
+    Lane,
     Node,
+    ShareBatchResult,
     ShareNode,
     ShareRequest,
     ShareResponse,
 )
+from shared_code.node_directory import get_node_directory
+from shared_code.terminal_state_cache import get_terminal_state_cache
+from shared_code.webhook_service import get_webhook_service
+from shared_code.work_scheduler import get_work_scheduler, work_lane
 
 
 def get_log_service() -> LogService:
@@ -39,9 +51,36 @@ def get_datashare_service() -> DatashareService:
     )
 
 
+# Latest registration sent to each registry url: (node metadata, ETag)
+registry_registrations: Dict[str, Tuple[str, str]] = {}
+registry_registrations_lock = threading.Lock()
+
+# Bounded pool running the Azure provisioning of the batch requests
+batch_executor: Union[ThreadPoolExecutor, None] = None
+batch_executor_lock = threading.Lock()
+
+
+def get_batch_executor() -> ThreadPoolExecutor:
+    """Getting a single instance of the batch ThreadPoolExecutor"""
+    global batch_executor
+    if batch_executor is None:
+        with batch_executor_lock:
+            if batch_executor is None:
+                batch_executor = ThreadPoolExecutor(
+                    max_workers=get_configuration_service().get_batch_max_workers(),
+                    thread_name_prefix="batch",
+                )
+    return batch_executor
+
+
 class ShareService:
     """Class used to implement the datashare service"""
 
+    def __init__(self) -> None:
+        # Delay in seconds suggested by the registry before the next
+        # registration of the node
+        self.next_heartbeat = None
+
     def set_env_value(self, variable: str, value: str) -> str:
         """set environment variable value (string type)"""
         if not os.environ.get(variable):
@@ -101,15 +140,14 @@ class ShareService:
             node url
             node tenant_id
             node identity
+        When these parameters did not change since the previous
+        registration, only a heartbeat is sent to the registry service.
+        The delay suggested by the registry before the next registration
+        is stored in next_heartbeat.
         """
         try:
             list = get_configuration_service().get_registry_list()
             for url in list:
-                register_url = f"{url}/register"
-                headers = {
-                    "Content-Type": "application/json",
-                }
-
                 # Register current node if node_id is present
                 if get_configuration_service().get_node_id() != "":
                     node = ShareNode(
@@ -119,19 +157,70 @@ class ShareService:
                         tenant_id=get_configuration_service().get_tenant_id(),
                         identity=get_configuration_service().get_node_identity(),
                     )
-                    register_response = requests.post(
-                        url=register_url,
-                        json=node.dict(),
-                        headers=headers,
-                    )
-                    register_response.raise_for_status()
-                    node: ShareNode = json.loads(register_response.text)
+                    metadata = node.json()
+                    with registry_registrations_lock:
+                        registration = registry_registrations.get(url)
+                    if registration is not None and registration[0] == metadata:
+                        if self.send_heartbeat(url, node.node_id, registration[1]):
+                            continue
+                    etag = self.send_registration(url, node)
+                    with registry_registrations_lock:
+                        if etag:
+                            registry_registrations[url] = (metadata, etag)
+                        else:
+                            registry_registrations.pop(url, None)
 
             return True
         except Exception as ex:
             get_log_service().log_error(f"EXCEPTION in register_share_node: {ex}")
             return False
 
+    def send_registration(self, url: str, node: ShareNode) -> str:
+        """
+        Send the full node metadata to the registry with POST /register,
+        return the ETag associated with the metadata
+        """
+        register_url = f"{url}/register"
+        headers = {
+            "Content-Type": "application/json",
+        }
+        register_response = get_http_client().post(
+            url=register_url,
+            json=node.dict(),
+            headers=headers,
+        )
+        register_response.raise_for_status()
+        self.set_next_heartbeat(register_response.headers)
+        return register_response.headers.get("ETag", "")
+
+    def send_heartbeat(self, url: str, node_id: str, etag: str) -> bool:
+        """
+        Send a heartbeat to the registry with PUT /nodes/{node_id}/heartbeat,
+        return False if a full registration is required
+        """
+        heartbeat_url = f"{url}/nodes/{node_id}/heartbeat"
+        headers = {
+            "Content-Type": "application/json",
+            "If-Match": etag,
+        }
+        heartbeat_response = get_http_client().put(
+            url=heartbeat_url,
+            headers=headers,
+        )
+        if heartbeat_response.status_code in (404, 412, 428):
+            return False
+        heartbeat_response.raise_for_status()
+        self.set_next_heartbeat(heartbeat_response.headers)
+        return True
+
+    def set_next_heartbeat(self, headers: Any) -> None:
+        """Keep the shortest delay suggested by the registries"""
+        value = headers.get("X-Next-Heartbeat")
+        if value:
+            delay = int(value)
+            if self.next_heartbeat is None or delay < self.next_heartbeat:
+                self.next_heartbeat = delay
+
     def share(self, share: ShareRequest) -> ShareResponse:
         """
         Implement the share method
@@ -139,33 +228,11 @@ class ShareService:
         return ShareResponse
         """
         try:
-            list = get_configuration_service().get_registry_list()
-            for url in list:
-                node_url = f"{url}/nodes/{share.consumer_node_id}"
-                headers = {
-                    "Content-Type": "application/json",
-                }
-                node_response = requests.get(
-                    url=node_url,
-                    headers=headers,
-                )
-                node_response.raise_for_status()
-                node: Node = json.loads(node_response.text)
-                tenant_id = node["tenant_id"]
-                identity = node["identity"]
-                # Trigger the sharing process
-                share_response = get_datashare_service().share(
-                    provider_node_id=share.provider_node_id,
-                    consumer_node_id=share.consumer_node_id,
-                    tenant_id=tenant_id,
-                    identity=identity,
-                    datashare_storage_resource_group_name=share.dataset.resource_group_name,
-                    datashare_storage_account_name=share.dataset.storage_account_name,
-                    datashare_storage_container_name=share.dataset.container_name,
-                    datashare_storage_folder_path=share.dataset.folder_path,
-                    datashare_storage_file_name=share.dataset.file_name,
-                )
-                return share_response
+            return self.call_with_node(
+                share.consumer_node_id,
+                self.get_node(share.consumer_node_id),
+                lambda node: self.share_with_node(get_datashare_service(), share, node),
+            )
         except HTTPException as e:
             self.raise_http_exception(e.status_code, e.detail, "")
         except Exception as ex:
@@ -175,6 +242,242 @@ class ShareService:
                 f"Exception in 'share' method: {ex}",
             )
 
+    def share_with_node(
+        self, datashare_service: DatashareService, share: ShareRequest, node: Node
+    ) -> ShareResponse:
+        """Trigger the sharing process with the consumer node"""
+        share_response = get_work_scheduler().run(
+            share.consumer_node_id,
+            lambda: datashare_service.share(
+                provider_node_id=share.provider_node_id,
+                consumer_node_id=share.consumer_node_id,
+                tenant_id=node["tenant_id"],
+                identity=node["identity"],
+                datashare_storage_resource_group_name=share.dataset.resource_group_name,
+                datashare_storage_account_name=share.dataset.storage_account_name,
+                datashare_storage_container_name=share.dataset.container_name,
+                datashare_storage_folder_path=share.dataset.folder_path,
+                datashare_storage_file_name=share.dataset.file_name,
+            ),
+        )
+        if share.callback_url:
+            self.watch_share(share)
+        return share_response
+
+    def get_registry_node(self, url: str, node_id: str) -> Union[Node, None]:
+        """Read the node with GET /nodes/{node_id}, None if it is not found"""
+        node_response = get_http_client().get(
+            url=f"{url}/nodes/{node_id}",
+            headers={"Content-Type": "application/json"},
+        )
+        if node_response.status_code == 404:
+            return None
+        node_response.raise_for_status()
+        return json.loads(node_response.text)
+
+    def read_node(self, node_id: str) -> Union[Node, None]:
+        """Read the node from the registry, None if it is not found"""
+        for url in get_configuration_service().get_registry_list():
+            return self.get_registry_node(url, node_id)
+        return None
+
+    def get_node(self, node_id: str) -> Node:
+        """
+        Return the node from the node directory, the node is read from the
+        registry when it is not in the directory
+        """
+        node = get_node_directory().get(node_id, self.read_node)
+        if node is None:
+            raise HTTPException(
+                status_code=404, detail=f"Node '{node_id}' does not exists."
+            )
+        return node
+
+    def invalidate_node(self, node_id: str, ex: Exception) -> None:
+        """
+        Remove the node from the node directory after a Datashare call
+        rejected for its tenant_id or its identity, which may have changed
+        in the registry. The node is kept after a transient failure.
+        """
+        if is_identity_error(ex):
+            get_node_directory().invalidate(node_id)
+
+    def call_with_node(
+        self, node_id: str, node: Node, function: Callable[[Node], Any]
+    ) -> Any:
+        """Call function with the node, invalidate the node if it fails"""
+        try:
+            return function(node)
+        except Exception as ex:
+            self.invalidate_node(node_id, ex)
+            raise
+
+    def get_nodes(self, node_ids: List[str]) -> Dict[str, Node]:
+        """
+        Get the nodes from the node directory, the other nodes are read from
+        the registry with a single GET /nodes request, the nodes which are not
+        online are read with GET /nodes/{node_id}
+        """
+        node_directory = get_node_directory()
+        nodes: Dict[str, Node] = {}
+        missing = set()
+        for node_id in set(node_ids):
+            entry = node_directory.lookup(node_id)
+            if entry is None or node_directory.is_stale(entry):
+                missing.add(node_id)
+            elif entry.node is not None:
+                nodes[node_id] = entry.node
+        if not missing:
+            return nodes
+        headers = {
+            "Content-Type": "application/json",
+        }
+        for url in get_configuration_service().get_registry_list():
+            nodes_response = get_http_client().get(url=f"{url}/nodes", headers=headers)
+            nodes_response.raise_for_status()
+            online = {node["node_id"]: node for node in json.loads(nodes_response.text)}
+            for node_id in missing:
+                node = online.get(node_id) or self.get_registry_node(url, node_id)
+                node_directory.put(node_id, node)
+                if node is not None:
+                    nodes[node_id] = node
+            return nodes
+        return nodes
+
+    def get_error(self, ex: Exception) -> Error:
+        """Return the Error associated with the exception"""
+        if isinstance(ex, HTTPException):
+            try:
+                return Error(**json.loads(ex.detail))
+            except (TypeError, ValueError):
+                message = str(ex.detail)
+                code = ex.status_code
+        else:
+            message = f"Internal server error: {ex}"
+            code = 500
+        return Error(
+            code=code, message=message, source="shareservice", date=datetime.utcnow()
+        )
+
+    def get_batch_node(self, nodes: Dict[str, Node], node_id: str) -> Node:
+        """Return the node of a batch request resolved by get_nodes"""
+        node = nodes.get(node_id)
+        if node is None:
+            raise HTTPException(
+                status_code=404, detail=f"Node '{node_id}' does not exists."
+            )
+        return node
+
+    def run_batch(
+        self,
+        name: str,
+        function: Callable[[Any], BaseModel],
+        items: List[Any],
+        result_class: Type[BaseModel],
+    ) -> List[Any]:
+        """
+        Run function on each item in the batch pool, return the list of
+        result_class in the order of the items, the failure of an item does
+        not abort the other items
+        """
+        futures = [
+            get_batch_executor().submit(
+                self.run_batch_item, name, function, item, result_class
+            )
+            for item in items
+        ]
+        return [future.result() for future in futures]
+
+    def run_batch_item(
+        self,
+        name: str,
+        function: Callable[[Any], BaseModel],
+        item: Any,
+        result_class: Type[BaseModel],
+    ) -> Any:
+        try:
+            with work_lane(Lane.BATCH):
+                response = function(item)
+            if response is None:
+                raise HTTPException(status_code=500, detail=f"No {name} response")
+            return result_class(response=response)
+        except Exception as ex:
+            error = self.get_error(ex)
+            get_log_service().log_error(
+                f"Batch {name} {item.provider_node_id} {item.consumer_node_id}\
+ failed code: {error.code} message: {error.message}"
+            )
+            return result_class(error=error)
+
+    def prepare_batch(
+        self, name: str, node_ids: Union[List[str], None] = None
+    ) -> Tuple[DatashareService, Dict[str, Node]]:
+        """
+        Return the DatashareService shared by the requests of the batch and
+        the nodes resolved with a single registry request
+        """
+        try:
+            nodes = self.get_nodes(node_ids) if node_ids is not None else {}
+            return get_datashare_service(), nodes
+        except HTTPException as e:
+            self.raise_http_exception(e.status_code, e.detail, "")
+        except Exception as ex:
+            self.raise_http_exception(
+                500,
+                "Internal server error",
+                f"Exception in '{name}' method: {ex}",
+            )
+
+    def share_batch(self, shares: List[ShareRequest]) -> List[ShareBatchResult]:
+        """
+        Implement the share_batch method
+        input list of ShareRequest
+        return the list of ShareBatchResult in the order of the requests
+        """
+        datashare_service, nodes = self.prepare_batch(
+            "share_batch", [share.consumer_node_id for share in shares]
+        )
+        return self.run_batch(
+            "share",
+            lambda share: self.call_with_node(
+                share.consumer_node_id,
+                self.get_batch_node(nodes, share.consumer_node_id),
+                lambda node: self.share_with_node(datashare_service, share, node),
+            ),
+            shares,
+            ShareBatchResult,
+        )
+
+    def share_status_batch(self, shares: List[ShareRequest]) -> List[ShareBatchResult]:
+        """
+        Implement the share_status_batch method
+        input list of ShareRequest
+        return the list of ShareBatchResult in the order of the requests
+        """
+        terminal_state_cache = get_terminal_state_cache()
+        # The nodes of the finished share processes are not required
+        datashare_service, nodes = self.prepare_batch(
+            "share_status_batch",
+            [
+                share.consumer_node_id
+                for share in shares
+                if terminal_state_cache.get(self.get_share_key(share)) is None
+            ],
+        )
+        return self.run_batch(
+            "share_status",
+            lambda share: terminal_state_cache.get(self.get_share_key(share))
+            or self.call_with_node(
+                share.consumer_node_id,
+                self.get_batch_node(nodes, share.consumer_node_id),
+                lambda node: self.share_status_with_node(
+                    datashare_service, share, node
+                ),
+            ),
+            shares,
+            ShareBatchResult,
+        )
+
     def share_status(
         self,
         provider_node_id: str,
@@ -204,34 +507,28 @@ class ShareService:
 
         return ShareResponse
         """
+        share = ShareRequest(
+            provider_node_id=provider_node_id,
+            consumer_node_id=consumer_node_id,
+            dataset=Dataset(
+                resource_group_name=datashare_storage_resource_group_name,
+                storage_account_name=datashare_storage_account_name,
+                container_name=datashare_storage_container_name,
+                folder_path=datashare_storage_folder_path,
+                file_name=datashare_storage_file_name,
+            ),
+        )
+        share_response = get_terminal_state_cache().get(self.get_share_key(share))
+        if share_response is not None:
+            return share_response
         try:
-            list = get_configuration_service().get_registry_list()
-            for url in list:
-                node_url = f"{url}/nodes/{consumer_node_id}"
-                headers = {
-                    "Content-Type": "application/json",
-                }
-                node_response = requests.get(
-                    url=node_url,
-                    headers=headers,
-                )
-                node_response.raise_for_status()
-                node: Node = json.loads(node_response.text)
-                tenant_id = node["tenant_id"]
-                identity = node["identity"]
-                # Get sharing process status
-                share_response = get_datashare_service().share_status(
-                    provider_node_id=provider_node_id,
-                    consumer_node_id=consumer_node_id,
-                    tenant_id=tenant_id,
-                    identity=identity,
-                    datashare_storage_resource_group_name=datashare_storage_resource_group_name,
-                    datashare_storage_account_name=datashare_storage_account_name,
-                    datashare_storage_container_name=datashare_storage_container_name,
-                    datashare_storage_folder_path=datashare_storage_folder_path,
-                    datashare_storage_file_name=datashare_storage_file_name,
-                )
-                return share_response
+            return self.call_with_node(
+                consumer_node_id,
+                self.get_node(consumer_node_id),
+                lambda node: self.share_status_with_node(
+                    get_datashare_service(), share, node
+                ),
+            )
         except HTTPException as e:
             self.raise_http_exception(e.status_code, e.detail, "")
         except Exception as ex:
@@ -241,8 +538,65 @@ class ShareService:
                 f"Exception in 'share' method: {ex}",
             )
 
+    def share_status_with_node(
+        self, datashare_service: DatashareService, share: ShareRequest, node: Node
+    ) -> ShareResponse:
+        """Get the status of the sharing process with the consumer node"""
+        share_response = get_work_scheduler().run(
+            share.consumer_node_id,
+            lambda: datashare_service.share_status(
+                provider_node_id=share.provider_node_id,
+                consumer_node_id=share.consumer_node_id,
+                tenant_id=node["tenant_id"],
+                identity=node["identity"],
+                datashare_storage_resource_group_name=share.dataset.resource_group_name,
+                datashare_storage_account_name=share.dataset.storage_account_name,
+                datashare_storage_container_name=share.dataset.container_name,
+                datashare_storage_folder_path=share.dataset.folder_path,
+                datashare_storage_file_name=share.dataset.file_name,
+            ),
+        )
+        get_terminal_state_cache().put(self.get_share_key(share), share_response)
+        return share_response
+
+    def get_share_key(self, share: ShareRequest) -> Tuple[str, ...]:
+        """Return the key of the sharing process in the terminal state cache"""
+        return (
+            "share",
+            share.provider_node_id,
+            share.consumer_node_id,
+            share.dataset.resource_group_name,
+            share.dataset.storage_account_name,
+            share.dataset.container_name,
+            share.dataset.folder_path,
+            share.dataset.file_name,
+        )
+
+    def watch_share(self, share: ShareRequest) -> None:
+        """POST the final ShareResponse to the callback url of the request"""
+        parameters = dict(
+            provider_node_id=share.provider_node_id,
+            consumer_node_id=share.consumer_node_id,
+            datashare_storage_resource_group_name=share.dataset.resource_group_name,
+            datashare_storage_account_name=share.dataset.storage_account_name,
+            datashare_storage_container_name=share.dataset.container_name,
+            datashare_storage_folder_path=share.dataset.folder_path,
+            datashare_storage_file_name=share.dataset.file_name,
+        )
+        get_webhook_service().watch(
+            ("share",) + tuple(parameters.values()),
+            "share",
+            lambda: self.share_status(**parameters),
+            share.callback_url,
+        )
+
     def consume(
-        self, provider_node_id: str, consumer_node_id: str, invitation_id: str
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        invitation_id: str,
+        callback_url: str = None,
+        create_subscription: bool = True,
     ) -> ConsumeResponse:
         """
         Implement the share_status method
@@ -251,46 +605,22 @@ class ShareService:
         consumer_node_id: the node_id of the node which will consume the
             dataset
         invitation_id: invitation_id used to consume the dataset
+        callback_url: optional url receiving the final ConsumeResponse
+        create_subscription: if False, only return the status of the
+            existing subscription
 
         return ConsumeResponse
         """
         try:
-            resource_group_name = (
-                get_configuration_service().get_datashare_storage_resource_group_name()
-            )
-            storage_account_name = (
-                get_configuration_service().get_datashare_storage_account_name()
-            )
-            container_name = (
-                get_configuration_service().get_datashare_storage_consume_container_name()
-            )
-            folder_path = (
-                get_configuration_service()
-                .get_datashare_storage_consume_folder_format()
-                .replace("{date}", datetime.utcnow().strftime("%Y-%m-%d"))
-                .replace("{time}", datetime.utcnow().strftime("%Y-%m-%d-%H-%M-%S"))
-                .replace("{node_id}", provider_node_id)
-                .replace("{invitation_id}", invitation_id)
-            )
-            file_name = (
-                get_configuration_service()
-                .get_datashare_storage_consume_file_name_format()
-                .replace("{date}", datetime.utcnow().strftime("%Y-%m-%d"))
-                .replace("{time}", datetime.utcnow().strftime("%Y-%m-%d-%H-%M-%S"))
-                .replace("{node_id}", provider_node_id)
-                .replace("{invitation_id}", invitation_id)
-            )
-            consume_response = get_datashare_service().consume(
+            consume = ConsumeRequest(
                 provider_node_id=provider_node_id,
                 consumer_node_id=consumer_node_id,
                 invitation_id=invitation_id,
-                datashare_storage_resource_group_name=resource_group_name,
-                datashare_storage_account_name=storage_account_name,
-                datashare_storage_container_name=container_name,
-                datashare_storage_folder_path=folder_path,
-                datashare_storage_file_name=file_name,
+                callback_url=callback_url,
+            )
+            return self.consume_with_service(
+                get_datashare_service(), consume, create_subscription
             )
-            return consume_response
         except HTTPException as e:
             self.raise_http_exception(e.status_code, e.detail, "")
         except Exception as ex:
@@ -300,6 +630,121 @@ class ShareService:
                 f"Exception in 'consume' method: {ex}",
             )
 
+    def consume_with_service(
+        self,
+        datashare_service: DatashareService,
+        consume: ConsumeRequest,
+        create_subscription: bool = True,
+    ) -> ConsumeResponse:
+        """Trigger or monitor the reception of the dataset"""
+        provider_node_id = consume.provider_node_id
+        consumer_node_id = (
+            consume.consumer_node_id or get_configuration_service().get_node_id()
+        )
+        invitation_id = consume.invitation_id
+        key = ("consume", provider_node_id, consumer_node_id, invitation_id)
+        consume_response = get_terminal_state_cache().get(key)
+        if consume_response is None:
+            consume_response = self.consume_with_datashare(
+                datashare_service,
+                provider_node_id,
+                consumer_node_id,
+                invitation_id,
+                create_subscription,
+            )
+            get_terminal_state_cache().put(key, consume_response)
+        if consume.callback_url:
+            get_webhook_service().watch(
+                key,
+                "consume",
+                lambda: self.consume(
+                    provider_node_id,
+                    consumer_node_id,
+                    invitation_id,
+                    create_subscription=False,
+                ),
+                consume.callback_url,
+            )
+        return consume_response
+
+    def get_consume_dataset(self, provider_node_id: str, invitation_id: str) -> Dataset:
+        """Return the location of the dataset received from the provider node"""
+        configuration_service = get_configuration_service()
+        now = datetime.utcnow()
+
+        def format_name(name_format: str) -> str:
+            return (
+                name_format.replace("{date}", now.strftime("%Y-%m-%d"))
+                .replace("{time}", now.strftime("%Y-%m-%d-%H-%M-%S"))
+                .replace("{node_id}", provider_node_id)
+                .replace("{invitation_id}", invitation_id)
+            )
+
+        return Dataset(
+            resource_group_name=(
+                configuration_service.get_datashare_storage_resource_group_name()
+            ),
+            storage_account_name=(
+                configuration_service.get_datashare_storage_account_name()
+            ),
+            container_name=(
+                configuration_service.get_datashare_storage_consume_container_name()
+            ),
+            folder_path=format_name(
+                configuration_service.get_datashare_storage_consume_folder_format()
+            ),
+            file_name=format_name(
+                configuration_service.get_datashare_storage_consume_file_name_format()
+            ),
+        )
+
+    def consume_with_datashare(
+        self,
+        datashare_service: DatashareService,
+        provider_node_id: str,
+        consumer_node_id: str,
+        invitation_id: str,
+        create_subscription: bool,
+    ) -> ConsumeResponse:
+        """Trigger or monitor the reception of the dataset with Azure"""
+        dataset = self.get_consume_dataset(provider_node_id, invitation_id)
+        # On the consumer side the work is shared between the provider nodes
+        return get_work_scheduler().run(
+            provider_node_id,
+            lambda: datashare_service.consume(
+                provider_node_id=provider_node_id,
+                consumer_node_id=consumer_node_id,
+                invitation_id=invitation_id,
+                datashare_storage_resource_group_name=dataset.resource_group_name,
+                datashare_storage_account_name=dataset.storage_account_name,
+                datashare_storage_container_name=dataset.container_name,
+                datashare_storage_folder_path=dataset.folder_path,
+                datashare_storage_file_name=dataset.file_name,
+                create_subscription=create_subscription,
+            ),
+        )
+
+    def consume_batch(
+        self, consumes: List[ConsumeRequest], create_subscription: bool = True
+    ) -> List[ConsumeBatchResult]:
+        """
+        Implement the consume_batch method
+        input list of ConsumeRequest, consumer_node_id is the current node
+            by default
+        create_subscription: if False, only return the status of the
+            existing subscriptions
+        return the list of ConsumeBatchResult in the order of the requests
+        """
+        datashare_service, _ = self.prepare_batch("consume_batch")
+        return self.run_batch(
+            "consume",
+            lambda consume: self.consume_with_service(
+                datashare_service, consume, create_subscription
+            ),
+            consumes,
+            ConsumeBatchResult,
+        )
+
     def get_shareconsume(
         self, provider_node_id: str, consumer_node_id: str, invitation_id: str
     ):
@@ -313,6 +758,10 @@ class ShareService:
 
         return ConsumeResponse
         """
+        key = ("shareconsume", provider_node_id, consumer_node_id, invitation_id)
+        consumeresponse = get_terminal_state_cache().get(key)
+        if consumeresponse is not None:
+            return consumeresponse
         try:
             list = get_configuration_service().get_registry_list()
             for url in list:
@@ -324,13 +773,14 @@ class ShareService:
                 params["provider_node_id"] = provider_node_id
                 params["consumer_node_id"] = consumer_node_id
                 params["invitation_id"] = invitation_id
-                consumer_node_response = requests.get(
+                consumer_node_response = get_http_client().get(
                     url=node_url, headers=headers, params=params
                 )
                 consumer_node_response.raise_for_status()
                 consumeresponse: ConsumeResponse = json.loads(
                     consumer_node_response.text
                 )
+                get_terminal_state_cache().put(key, consumeresponse)
                 return consumeresponse
         except HTTPException as e:
             self.raise_http_exception(e.status_code, e.detail, "")
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple, Union
+
+from azure.core.credentials import AccessToken
+from cryptography.fernet import Fernet, InvalidToken
+from starlette.concurrency import run_in_threadpool
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class PersistentTokenCache:
+    """
+    Class used to store the access tokens in a file encrypted with Fernet,
+    the file is shared by the workers of the host and kept across restarts.
+    The encryption key is TOKEN_CACHE_KEY when it is set, otherwise a key
+    generated in the file {path}.key readable only by the current user.
+    The file {path}.lock serializes the token requests of the workers.
+    """
+
+    def __init__(self, path: str, key: Union[str, None] = None) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.fernet = Fernet(key.encode() if key else self.load_key())
+
+    def load_key(self) -> bytes:
+        """Return the key stored in {path}.key, generate it if required"""
+        key_path = f"{self.path}.key"
+        if not os.path.exists(key_path):
+            temporary_path = f"{key_path}.{os.getpid()}.tmp"
+            with open(
+                os.open(temporary_path, os.O_WRONLY | os.O_CREAT, 0o600), "wb"
+            ) as file:
+                file.write(Fernet.generate_key())
+            try:
+                # Atomic creation, the first worker wins
+                os.link(temporary_path, key_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporary_path)
+        with open(key_path, "rb") as file:
+            return file.read().strip()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Lock the cache for the threads and the processes of the host"""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a+") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def read(self) -> Dict[str, AccessToken]:
+        """Return the tokens stored in the cache"""
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return {}
+        try:
+            entries = json.loads(self.fernet.decrypt(data))
+        except (InvalidToken, ValueError):
+            # Cache encrypted with another key or corrupted
+            return {}
+        return {
+            key: AccessToken(entry["token"], entry["expires_on"])
+            for key, entry in entries.items()
+        }
+
+    def write(self, tokens: Dict[str, AccessToken]) -> None:
+        """Replace the tokens stored in the cache"""
+        data = self.fernet.encrypt(
+            json.dumps(
+                {
+                    key: {"token": token.token, "expires_on": token.expires_on}
+                    for key, token in tokens.items()
+                }
+            ).encode()
+        )
+        temporary_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(
+            os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+            "wb",
+        ) as file:
+            file.write(data)
+        os.replace(temporary_path, self.path)
+
+
+class CachedTokenCredential:
+    """
+    Class used to wrap an Azure credential with a PersistentTokenCache.
+    A token is requested to the credential only when the cache does not
+    contain a token valid for more than refresh_margin seconds. A background
+    thread refreshes the tokens refresh_margin seconds before their expiry,
+    so that the requests do not wait for Azure Active Directory.
+    """
+
+    def __init__(
+        self,
+        credential: Any,
+        cache: PersistentTokenCache,
+        refresh_margin: float = 300,
+    ) -> None:
+        self.credential = credential
+        self.cache = cache
+        self.refresh_margin = refresh_margin
+        self.lock = threading.Lock()
+        self.tokens: Dict[str, AccessToken] = {}
+        self.scopes: Dict[str, Tuple[str, ...]] = {}
+        self.refresh_thread: Union[threading.Thread, None] = None
+        self.stopped = threading.Event()
+
+    def get_key(self, scopes: Tuple[str, ...]) -> str:
+        return " ".join(sorted(scopes))
+
+    def is_fresh(self, token: AccessToken) -> bool:
+        return token.expires_on - time.time() > self.refresh_margin
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Return a valid token from the cache, request it if required"""
+        if kwargs:
+            # Claims challenge or other tenant: bypass the cache
+            return self.credential.get_token(*scopes, **kwargs)
+        key = self.get_key(scopes)
+        token = self.tokens.get(key)
+        if token is None or token.expires_on - time.time() <= 30:
+            token = self.refresh(scopes)
+        self.start_refresh_thread()
+        return token
+
+    def refresh(self, scopes: Tuple[str, ...]) -> AccessToken:
+        """
+        Get the token from the cache, request a new token if the token in
+        the cache expires within refresh_margin seconds
+        """
+        key = self.get_key(scopes)
+        with self.cache.locked():
+            tokens = self.cache.read()
+            token = tokens.get(key)
+            if token is None or not self.is_fresh(token):
+                token = self.credential.get_token(*scopes)
+                tokens[key] = token
+                self.cache.write(tokens)
+            self.tokens[key] = token
+            self.scopes[key] = scopes
+        return token
+
+    def get_refresh_delay(self) -> float:
+        """Return the delay before the next token refresh"""
+        delays = [
+            token.expires_on - self.refresh_margin - time.time()
+            for token in list(self.tokens.values())
+        ]
+        return max(10.0, min(delays + [60.0]))
+
+    def refresh_loop(self) -> None:
+        while not self.stopped.wait(self.get_refresh_delay()):
+            for key, scopes in list(self.scopes.items()):
+                token = self.tokens.get(key)
+                if token is not None and self.is_fresh(token):
+                    continue
+                try:
+                    self.refresh(scopes)
+                except Exception as ex:
+                    LogService().log_error(f"EXCEPTION while refreshing token: {ex}")
+
+    def start_refresh_thread(self) -> None:
+        if self.refresh_thread is None:
+            with self.lock:
+                if self.refresh_thread is None:
+                    self.refresh_thread = threading.Thread(
+                        target=self.refresh_loop, daemon=True
+                    )
+                    self.refresh_thread.start()
+
+    def close(self) -> None:
+        """Stop the background refresh and close the credential"""
+        self.stopped.set()
+        close = getattr(self.credential, "close", None)
+        if close is not None:
+            close()
+
+
+class AsyncCachedTokenCredential:
+    """
+    Class used to wrap an azure.identity.aio credential with the
+    PersistentTokenCache for the aio clients. The cache file is read and
+    written in the threadpool. A token expiring within refresh_margin
+    seconds is refreshed by a background task while the requests keep
+    using it, a single task refreshes the token of a scope.
+    """
+
+    def __init__(
+        self,
+        credential: Any,
+        cache: PersistentTokenCache,
+        refresh_margin: float = 300,
+    ) -> None:
+        self.credential = credential
+        self.cache = cache
+        self.refresh_margin = refresh_margin
+        self.tokens: Dict[str, AccessToken] = {}
+        self.refreshes: Dict[str, "asyncio.Future[AccessToken]"] = {}
+
+    def get_key(self, scopes: Tuple[str, ...]) -> str:
+        return " ".join(sorted(scopes))
+
+    def is_fresh(self, token: AccessToken) -> bool:
+        return token.expires_on - time.time() > self.refresh_margin
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Return a valid token from the cache, request it if required"""
+        if kwargs:
+            # Claims challenge or other tenant: bypass the cache
+            return await self.credential.get_token(*scopes, **kwargs)
+        key = self.get_key(scopes)
+        token = self.tokens.get(key)
+        if token is not None and self.is_fresh(token):
+            return token
+        refresh = self.refreshes.get(key)
+        if refresh is None:
+            refresh = asyncio.ensure_future(self.refresh(scopes))
+            self.refreshes[key] = refresh
+            refresh.add_done_callback(lambda _: self.refreshes.pop(key, None))
+        if token is None or token.expires_on - time.time() <= 30:
+            token = await asyncio.shield(refresh)
+        return token
+
+    async def refresh(self, scopes: Tuple[str, ...]) -> AccessToken:
+        """
+        Get the token from the cache, request a new token if the token in
+        the cache expires within refresh_margin seconds
+        """
+        key = self.get_key(scopes)
+        token = (await run_in_threadpool(self.cache.read)).get(key)
+        if token is None or not self.is_fresh(token):
+            token = await self.credential.get_token(*scopes)
+            await run_in_threadpool(self.store, key, token)
+        self.tokens[key] = token
+        return token
+
+    def store(self, key: str, token: AccessToken) -> None:
+        with self.cache.locked():
+            tokens = self.cache.read()
+            tokens[key] = token
+            self.cache.write(tokens)
+
+    async def close(self) -> None:
+        await self.credential.close()
+
+
+token_cache: Union[PersistentTokenCache, None] = None
+token_cache_lock = threading.Lock()
+
+
+def get_token_cache() -> PersistentTokenCache:
+    """Getting a single instance of the PersistentTokenCache"""
+    global token_cache
+    if token_cache is None:
+        with token_cache_lock:
+            if token_cache is None:
+                configuration_service = ConfigurationService()
+                token_cache = PersistentTokenCache(
+                    configuration_service.get_token_cache_path(),
+                    configuration_service.get_token_cache_key(),
+                )
+    return token_cache
@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple, Union
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.models import Lane, LaneMetrics
+
+# Share of the workers given to each lane when all the lanes are busy
+LANE_WEIGHTS = {Lane.INTERACTIVE: 6, Lane.BATCH: 3, Lane.MAINTENANCE: 1}
+
+context = threading.local()
+
+
+@contextmanager
+def work_lane(lane: Lane) -> Iterator[None]:
+    """Run the work scheduled by the current thread in the lane"""
+    previous = getattr(context, "lane", None)
+    context.lane = lane
+    try:
+        yield
+    finally:
+        context.lane = previous
+
+
+def get_work_lane() -> Lane:
+    """Return the lane of the current thread, interactive by default"""
+    return getattr(context, "lane", None) or Lane.INTERACTIVE
+
+
+class WorkItem:
+    """Class used to store a call waiting for a worker"""
+
+    def __init__(self, function: Callable[[], Any]) -> None:
+        self.function = function
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+
+
+class LaneQueue:
+    """
+    Class used to store the work of a lane, the consumer nodes are served
+    in round robin so that a node with many requests does not starve the
+    other nodes
+    """
+
+    def __init__(self, weight: int) -> None:
+        self.weight = weight
+        self.credit = 0
+        self.consumers: "OrderedDict[str, Deque[WorkItem]]" = OrderedDict()
+        self.depth = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def put(self, consumer: str, item: WorkItem) -> None:
+        self.consumers.setdefault(consumer, deque()).append(item)
+        self.depth += 1
+        self.submitted += 1
+
+    def pop(self) -> WorkItem:
+        """Return the next item of the first consumer, which moves to the end"""
+        consumer, items = next(iter(self.consumers.items()))
+        item = items.popleft()
+        if items:
+            self.consumers.move_to_end(consumer)
+        else:
+            del self.consumers[consumer]
+        self.depth -= 1
+        wait = time.monotonic() - item.enqueued
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return item
+
+
+class WorkScheduler:
+    """
+    Class used to run the DatashareService calls in a pool of workers.
+    The calls are queued in a lane (interactive, batch or maintenance),
+    the lanes share the workers with a smooth weighted round robin
+    (LANE_WEIGHTS): the interactive requests go first without starving the
+    batch and maintenance work. In a lane, the consumer nodes are served in
+    round robin.
+    """
+
+    def __init__(
+        self, workers: int = 8, weights: Union[Dict[Lane, int], None] = None
+    ) -> None:
+        self.workers = workers
+        weights = weights or LANE_WEIGHTS
+        self.lanes = {lane: LaneQueue(weights[lane]) for lane in Lane}
+        self.condition = threading.Condition()
+        self.threads: List[threading.Thread] = []
+
+    def run(
+        self,
+        consumer: str,
+        function: Callable[[], Any],
+        lane: Union[Lane, None] = None,
+    ) -> Any:
+        """Queue function in the lane of the current thread, return its result"""
+        if getattr(context, "worker", False):
+            # Already running in a worker
+            return function()
+        item = WorkItem(function)
+        self.start()
+        with self.condition:
+            self.lanes[lane or get_work_lane()].put(consumer, item)
+            self.condition.notify()
+        return item.future.result()
+
+    def next_item(self) -> Tuple[LaneQueue, WorkItem]:
+        """Select the lane with the smooth weighted round robin, lock held"""
+        lanes = [lane for lane in self.lanes.values() if lane.depth > 0]
+        for lane in lanes:
+            lane.credit += lane.weight
+        selected = max(lanes, key=lambda lane: lane.credit)
+        selected.credit -= sum(lane.weight for lane in lanes)
+        return selected, selected.pop()
+
+    def worker_loop(self) -> None:
+        context.worker = True
+        while True:
+            with self.condition:
+                while not any(lane.depth for lane in self.lanes.values()):
+                    self.condition.wait()
+                lane, item = self.next_item()
+                lane.running += 1
+            try:
+                item.future.set_result(item.function())
+            except Exception as ex:
+                item.future.set_exception(ex)
+            finally:
+                with self.condition:
+                    lane.running -= 1
+                    lane.completed += 1
+
+    def get_metrics(self) -> List[LaneMetrics]:
+        """Return the queue depth and the wait time of each lane"""
+        with self.condition:
+            return [
+                LaneMetrics(
+                    lane=name,
+                    depth=lane.depth,
+                    consumers=len(lane.consumers),
+                    running=lane.running,
+                    submitted=lane.submitted,
+                    completed=lane.completed,
+                    wait_average=round(
+                        1000 * lane.total_wait / max(1, lane.submitted - lane.depth)
+                    ),
+                    wait_max=round(1000 * lane.max_wait),
+                    wait_oldest=round(
+                        1000
+                        * max(
+                            [
+                                time.monotonic() - items[0].enqueued
+                                for items in lane.consumers.values()
+                            ],
+                            default=0,
+                        )
+                    ),
+                )
+                for name, lane in self.lanes.items()
+            ]
+
+    def start(self) -> None:
+        """Start the workers"""
+        if not self.threads:
+            with self.condition:
+                if not self.threads:
+                    self.threads = [
+                        threading.Thread(target=self.worker_loop, daemon=True)
+                        for _ in range(self.workers)
+                    ]
+                    for thread in self.threads:
+                        thread.start()
+
+
+work_scheduler: Union[WorkScheduler, None] = None
+work_scheduler_lock = threading.Lock()
+
+
+def get_work_scheduler() -> WorkScheduler:
+    """Getting a single instance of the WorkScheduler"""
+    global work_scheduler
+    if work_scheduler is None:
+        with work_scheduler_lock:
+            if work_scheduler is None:
+                work_scheduler = WorkScheduler(
+                    ConfigurationService().get_scheduler_workers()
+                )
+    return work_scheduler
@@ -17,5 +17,25 @@ cp ../src/shared_code/log_service.py ./shared_code/log_service.py
 cp ../src/shared_code/models.py ./shared_code/models.py
 cp ../src/shared_code/share_service.py ./shared_code/share_service.py
 cp ../src/shared_code/datashare_service.py ./shared_code/datashare_service.py
+cp ../src/shared_code/heartbeat_scheduler.py ./shared_code/heartbeat_scheduler.py
+cp ../src/shared_code/leader_election.py ./shared_code/leader_election.py
+cp ../src/shared_code/datashare_client_pool.py ./shared_code/datashare_client_pool.py
+cp ../src/shared_code/token_cache.py ./shared_code/token_cache.py
+cp ../src/shared_code/credential_service.py ./shared_code/credential_service.py
+cp ../src/shared_code/invitation_index.py ./shared_code/invitation_index.py
+cp ../src/shared_code/synchronization_poller.py ./shared_code/synchronization_poller.py
+cp ../src/shared_code/status_watcher.py ./shared_code/status_watcher.py
+cp ../src/shared_code/webhook_service.py ./shared_code/webhook_service.py
+cp ../src/shared_code/provisioning_cache.py ./shared_code/provisioning_cache.py
+cp ../src/shared_code/terminal_state_cache.py ./shared_code/terminal_state_cache.py
+cp ../src/shared_code/single_flight.py ./shared_code/single_flight.py
+cp ../src/shared_code/job_service.py ./shared_code/job_service.py
+cp ../src/shared_code/work_scheduler.py ./shared_code/work_scheduler.py
+cp ../src/shared_code/arm_throttling.py ./shared_code/arm_throttling.py
+cp ../src/shared_code/lro_manager.py ./shared_code/lro_manager.py
+cp ../src/shared_code/async_datashare_service.py ./shared_code/async_datashare_service.py
+cp ../src/shared_code/async_share_service.py ./shared_code/async_share_service.py
+cp ../src/shared_code/http_client.py ./shared_code/http_client.py
+cp ../src/shared_code/node_directory.py ./shared_code/node_directory.py
 func start
 popd > /dev/null
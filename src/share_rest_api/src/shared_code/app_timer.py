@@ -1,7 +1,10 @@
-from fastapi_utils.tasks import repeat_every
+from typing import Tuple, Union
 
 from shared_code.app import app
 from shared_code.configuration_service import ConfigurationService
+from shared_code.heartbeat_scheduler import HeartbeatScheduler
+from shared_code.job_service import get_job_service
+from shared_code.leader_election import LeaderElection, PeriodicJobService
 from shared_code.log_service import LogService
 from shared_code.share_service import ShareService
 
@@ -21,10 +24,11 @@ def get_configuration_service() -> ConfigurationService:
     return ConfigurationService()
 
 
-# Periodic task used to managed place order workflow
-@app.on_event("startup")
-@repeat_every(seconds=get_configuration_service().get_refresh_period())
-def periodic_task() -> None:
+def periodic_task() -> Tuple[bool, Union[int, None]]:
+    """
+    Register the node in the registry, return the result of the
+    registration and the delay suggested by the registry
+    """
     share_service = get_share_service()
     get_log_service().log_information("Calling share_service.register_share_node()")
     result = share_service.register_share_node()
@@ -38,3 +42,47 @@ def periodic_task() -> None:
             "Calling share_service.register_share_node() share_rest_api\
  registration failed"
         )
+    return result, share_service.next_heartbeat
+
+
+heartbeat_scheduler = HeartbeatScheduler(
+    get_configuration_service().get_refresh_period()
+)
+
+
+def heartbeat_task() -> float:
+    """
+    Register the node, return the delay computed by the HeartbeatScheduler
+    before the next registration
+    """
+    try:
+        result, next_heartbeat = periodic_task()
+    except Exception as ex:
+        get_log_service().log_error(f"EXCEPTION in heartbeat_task: {ex}")
+        result, next_heartbeat = False, None
+    return heartbeat_scheduler.get_next_delay(result, next_heartbeat)
+
+
+# Periodic tasks run only by the gunicorn worker elected as leader of each job
+periodic_job_service = PeriodicJobService(
+    LeaderElection(get_configuration_service().get_lock_dir()),
+    get_configuration_service().get_leader_retry_period(),
+)
+periodic_job_service.add_job(
+    "register_share_node",
+    heartbeat_task,
+    get_configuration_service().get_refresh_period(),
+    heartbeat_scheduler.get_initial_delay(),
+)
+
+
+@app.on_event("startup")
+async def start_periodic_tasks() -> None:
+    periodic_job_service.start()
+    # Resume the share and consume jobs interrupted by a restart
+    get_job_service().start()
+
+
+@app.on_event("shutdown")
+async def stop_periodic_tasks() -> None:
+    periodic_job_service.stop()
@@ -0,0 +1,328 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, List, Tuple, Union
+
+from azure.core.pipeline.policies import (
+    AsyncHTTPPolicy,
+    AsyncRetryPolicy,
+    HTTPPolicy,
+    RetryPolicy,
+)
+from fastapi import HTTPException
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+from shared_code.models import ThrottleMetrics
+
+# ARM counts the reads and the writes of a subscription in separate buckets
+READ_METHODS = ["GET", "HEAD", "OPTIONS"]
+REMAINING_HEADERS = {
+    "read": "x-ms-ratelimit-remaining-subscription-reads",
+    "write": "x-ms-ratelimit-remaining-subscription-writes",
+}
+
+
+def get_operation_kind(method: str) -> str:
+    return "read" if method.upper() in READ_METHODS else "write"
+
+
+def get_retry_after(headers: Any) -> Union[float, None]:
+    """Return the Retry-After delay of an ARM response in seconds"""
+    for name, scale in [("retry-after-ms", 1000), ("Retry-After", 1)]:
+        try:
+            return float(headers.get(name)) / scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """
+    Class used to limit the requests to rate requests per second with
+    bursts of burst requests. A request takes a token, when no token is
+    available it waits for the refill. After a 429 the bucket is emptied
+    and paused until the Retry-After delay expires.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token, return the delay before the request can be sent"""
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate, self.paused_until - now)
+
+    def pause(self, delay: float) -> None:
+        """Stop the requests during delay seconds"""
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.tokens = min(self.tokens, 0)
+            self.paused_until = max(self.paused_until, now + delay)
+
+    def observe(self, remaining: int) -> None:
+        """Align the bucket with the remaining requests reported by ARM"""
+        with self.lock:
+            self.refill(time.monotonic())
+            self.tokens = min(self.tokens, remaining)
+
+    def get_available(self) -> float:
+        with self.lock:
+            self.refill(time.monotonic())
+            return max(0.0, self.tokens)
+
+
+class ArmThrottle:
+    """
+    Class used to share the ARM budget of a subscription between the
+    requests of the process, and to count the throttled requests
+    """
+
+    def __init__(
+        self,
+        subscription_id: str,
+        read_rate: float,
+        read_burst: float,
+        write_rate: float,
+        write_burst: float,
+    ) -> None:
+        self.subscription_id = subscription_id
+        self.buckets = {
+            "read": TokenBucket(read_rate, read_burst),
+            "write": TokenBucket(write_rate, write_burst),
+        }
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, float]] = {
+            kind: dict(requests=0, throttled=0, retries=0, waited=0.0)
+            for kind in self.buckets
+        }
+
+    def count(self, kind: str, counter: str, value: float = 1) -> None:
+        with self.lock:
+            self.counters[kind][counter] += value
+
+    def reserve(self, method: str) -> float:
+        """Take a token of the bucket of the method, return the delay"""
+        kind = get_operation_kind(method)
+        delay = self.buckets[kind].reserve()
+        self.count(kind, "requests")
+        if delay > 0:
+            self.count(kind, "waited", delay)
+        return delay
+
+    def acquire(self, method: str) -> None:
+        """Wait for a token of the bucket of the method"""
+        delay = self.reserve(method)
+        if delay > 0:
+            time.sleep(delay)
+
+    def observe(self, method: str, headers: Any) -> None:
+        """Read the remaining requests reported by ARM"""
+        kind = get_operation_kind(method)
+        remaining = headers.get(REMAINING_HEADERS[kind])
+        if remaining and remaining.isdigit():
+            self.buckets[kind].observe(int(remaining))
+
+    def throttled(self, method: str, retry_after: Union[float, None]) -> None:
+        """Record a 429 and pause the bucket during Retry-After"""
+        kind = get_operation_kind(method)
+        self.count(kind, "throttled")
+        if retry_after:
+            self.buckets[kind].pause(retry_after)
+        LogService().log_warning(
+            f"ARM {kind} throttled for subscription {self.subscription_id},\
+ Retry-After: {retry_after}"
+        )
+
+    def get_metrics(self) -> List[ThrottleMetrics]:
+        with self.lock:
+            counters = {kind: dict(values) for kind, values in self.counters.items()}
+        return [
+            ThrottleMetrics(
+                subscription_id=self.subscription_id,
+                kind=kind,
+                requests=counters[kind]["requests"],
+                throttled=counters[kind]["throttled"],
+                retries=counters[kind]["retries"],
+                waited=round(1000 * counters[kind]["waited"]),
+                available=int(bucket.get_available()),
+            )
+            for kind, bucket in self.buckets.items()
+        ]
+
+
+class ArmRateLimitPolicy(HTTPPolicy):
+    """Pipeline policy taking a token of the ArmThrottle before each attempt"""
+
+    def __init__(self, throttle: ArmThrottle) -> None:
+        super().__init__()
+        self.throttle = throttle
+
+    def send(self, request: Any) -> Any:
+        method = request.http_request.method
+        self.throttle.acquire(method)
+        response = self.next.send(request)
+        self.throttle.observe(method, response.http_response.headers)
+        if response.http_response.status_code == 429:
+            self.throttle.throttled(
+                method, get_retry_after(response.http_response.headers)
+            )
+        return response
+
+
+class AsyncArmRateLimitPolicy(AsyncHTTPPolicy):
+    """ArmRateLimitPolicy of the aio clients, the wait does not block the loop"""
+
+    def __init__(self, throttle: ArmThrottle) -> None:
+        super().__init__()
+        self.throttle = throttle
+
+    async def send(self, request: Any) -> Any:
+        method = request.http_request.method
+        delay = self.throttle.reserve(method)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await self.next.send(request)
+        self.throttle.observe(method, response.http_response.headers)
+        if response.http_response.status_code == 429:
+            self.throttle.throttled(
+                method, get_retry_after(response.http_response.headers)
+            )
+        return response
+
+
+class ArmRetryBackoff:
+    """
+    Backoff of the ARM retry policies: the Retry-After delay is honored,
+    otherwise the delay is a decorrelated jitter backoff between
+    min_backoff and 3 times the previous delay, up to max_backoff seconds
+    """
+
+    def __init__(
+        self,
+        throttle: ArmThrottle,
+        min_backoff: float = 1,
+        max_backoff: float = 60,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(retry_backoff_max=max_backoff, **kwargs)
+        self.throttle = throttle
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.random = random.Random()
+
+    def get_backoff_time(self, settings: Dict[str, Any]) -> float:
+        previous = settings.get("previous_backoff", self.min_backoff)
+        backoff = min(
+            self.max_backoff, self.random.uniform(self.min_backoff, previous * 3)
+        )
+        settings["previous_backoff"] = backoff
+        return backoff
+
+    def count_retry(self, settings: Dict[str, Any]) -> None:
+        history = settings["history"]
+        method = history[-1].http_request.method if history else "GET"
+        self.throttle.count(get_operation_kind(method), "retries")
+
+
+class ArmRetryPolicy(ArmRetryBackoff, RetryPolicy):
+    """Pipeline policy retrying the ARM requests with the ArmRetryBackoff"""
+
+    def sleep(self, settings: Dict[str, Any], transport: Any, response: Any = None):
+        self.count_retry(settings)
+        super().sleep(settings, transport, response)
+
+
+class AsyncArmRetryPolicy(ArmRetryBackoff, AsyncRetryPolicy):
+    """ArmRetryPolicy of the aio clients"""
+
+    async def sleep(
+        self, settings: Dict[str, Any], transport: Any, response: Any = None
+    ):
+        self.count_retry(settings)
+        await super().sleep(settings, transport, response)
+
+
+def raise_if_throttled(ex: Exception) -> None:
+    """Raise a 429 HTTPException when ARM still throttles after the retries"""
+    if getattr(ex, "status_code", None) == 429:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Azure Resource Manager throttling: {ex}",
+        )
+
+
+arm_throttles: Dict[str, ArmThrottle] = {}
+arm_throttles_lock = threading.Lock()
+
+
+def get_arm_throttle(subscription_id: str) -> ArmThrottle:
+    """Getting a single instance of the ArmThrottle of the subscription"""
+    throttle = arm_throttles.get(subscription_id)
+    if throttle is None:
+        with arm_throttles_lock:
+            throttle = arm_throttles.get(subscription_id)
+            if throttle is None:
+                configuration_service = ConfigurationService()
+                throttle = ArmThrottle(
+                    subscription_id,
+                    configuration_service.get_arm_read_rate(),
+                    configuration_service.get_arm_read_burst(),
+                    configuration_service.get_arm_write_rate(),
+                    configuration_service.get_arm_write_burst(),
+                )
+                arm_throttles[subscription_id] = throttle
+    return throttle
+
+
+def get_arm_policies(subscription_id: str) -> Tuple[ArmRetryPolicy, ArmRateLimitPolicy]:
+    """Return the retry policy and the rate limit policy of the subscription"""
+    throttle = get_arm_throttle(subscription_id)
+    configuration_service = ConfigurationService()
+    return (
+        ArmRetryPolicy(
+            throttle,
+            configuration_service.get_arm_retry_min_backoff(),
+            configuration_service.get_arm_retry_max_backoff(),
+            retry_total=configuration_service.get_arm_retry_total(),
+        ),
+        ArmRateLimitPolicy(throttle),
+    )
+
+
+def get_async_arm_policies(
+    subscription_id: str,
+) -> Tuple[AsyncArmRetryPolicy, AsyncArmRateLimitPolicy]:
+    """Return the policies of the subscription for the aio clients"""
+    throttle = get_arm_throttle(subscription_id)
+    configuration_service = ConfigurationService()
+    return (
+        AsyncArmRetryPolicy(
+            throttle,
+            configuration_service.get_arm_retry_min_backoff(),
+            configuration_service.get_arm_retry_max_backoff(),
+            retry_total=configuration_service.get_arm_retry_total(),
+        ),
+        AsyncArmRateLimitPolicy(throttle),
+    )
+
+
+def get_arm_metrics() -> List[ThrottleMetrics]:
+    """Return the metrics of all the subscriptions"""
+    with arm_throttles_lock:
+        throttles = list(arm_throttles.values())
+    return [metrics for throttle in throttles for metrics in throttle.get_metrics()]
@@ -0,0 +1,678 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Union
+
+from azure.core.exceptions import HttpResponseError
+from azure.mgmt.datashare.models import (
+    BlobDataSet,
+    BlobDataSetMapping,
+    ConsumerSourceDataSet,
+    DataSetMapping,
+    Invitation,
+    Share,
+    ShareSubscription,
+    ShareSubscriptionSynchronization,
+    Synchronize,
+)
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from shared_code.arm_throttling import raise_if_throttled
+from shared_code.datashare_client_pool import get_datashare_client_pool
+from shared_code.datashare_service import (
+    DatashareService,
+    raise_if_identity_error,
+)
+from shared_code.lro_manager import get_lro_manager
+from shared_code.models import ConsumeResponse, ShareResponse
+from shared_code.provisioning_cache import get_provisioning_cache
+
+
+class AsyncDatashareService(DatashareService):
+    """
+    Class used to implement the Datashare service with the aio client of
+    Azure Data Share API: the requests of a worker wait for Azure in the
+    event loop instead of holding a thread.
+    The provisioning cache, the invitation index and the synchronization
+    poller are shared with the DatashareService, the long running
+    operations are tracked by the LroManager. The constructor reads the
+    datashare account with the sync client: the service is created in the
+    threadpool, see get_async_datashare_service.
+    """
+
+    def __init__(
+        self,
+        subscription_id: str,
+        tenant_id: str,
+        datashare_resource_group_name: str,
+        datashare_account_name: str,
+    ) -> None:
+        self.async_client = None
+        super().__init__(
+            subscription_id,
+            tenant_id,
+            datashare_resource_group_name,
+            datashare_account_name,
+        )
+
+    def initialize(self):
+        """Initialize the Datashare clients"""
+        super().initialize()
+        if self.async_client is None:
+            self.async_client = (
+                get_datashare_client_pool()
+                .get(self.subscription_id, self.resource_group_name, self.account_name)
+                .get_async_client()
+            )
+
+    async def share_async(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        tenant_id: str,
+        identity: str,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+    ) -> ShareResponse:
+        """
+        Launch the datashare process, see DatashareService.share
+        """
+        share_id = self.get_share_id(
+            provider_node_id,
+            consumer_node_id,
+            datashare_storage_resource_group_name,
+            datashare_storage_account_name,
+            datashare_storage_container_name,
+            datashare_storage_folder_path,
+            datashare_storage_file_name,
+        )
+        share_name, share_datashare_name, invitation_name = self.get_share_names(
+            share_id, tenant_id, identity
+        )
+
+        try:
+            invitation = await self.get_provisioned_invitation_async(
+                share_id, share_name
+            )
+            if invitation is None:
+                sent_share = await self.get_share_async(share_name, "Provider share")
+                if sent_share is None:
+                    return None
+                blob_datashare = await self.create_blob_datashare_async(
+                    share_name,
+                    share_datashare_name,
+                    datashare_storage_resource_group_name,
+                    datashare_storage_account_name,
+                    datashare_storage_container_name,
+                    self.get_dataset_path(
+                        datashare_storage_folder_path, datashare_storage_file_name
+                    ),
+                )
+
+                invitation = await self.create_invitation_async(
+                    share_name,
+                    invitation_name,
+                    tenant_id,
+                    identity,
+                )
+                self.put_provisioned_share(
+                    share_id,
+                    share_name,
+                    sent_share,
+                    share_datashare_name,
+                    blob_datashare,
+                    invitation_name,
+                    invitation,
+                )
+            share_response = self.create_invitation_response(
+                provider_node_id,
+                consumer_node_id,
+                invitation,
+                datashare_storage_resource_group_name,
+                datashare_storage_account_name,
+                datashare_storage_container_name,
+                datashare_storage_folder_path,
+                datashare_storage_file_name,
+            )
+        except HTTPException as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"HTTP Exception in method 'share' of datashare service: {e.detail}",
+            )
+        except Exception as ex:
+            raise_if_throttled(ex)
+            raise_if_identity_error(ex)
+            raise HTTPException(
+                status_code=500,
+                detail=f"Exception in method 'share' of datashare service: {ex}",
+            )
+        return share_response
+
+    async def share_status_async(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        tenant_id: str,
+        identity: str,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+    ) -> ShareResponse:
+        """
+        Returns the share status, see DatashareService.share_status
+        """
+        share_id = self.get_share_id(
+            provider_node_id,
+            consumer_node_id,
+            datashare_storage_resource_group_name,
+            datashare_storage_account_name,
+            datashare_storage_container_name,
+            datashare_storage_folder_path,
+            datashare_storage_file_name,
+        )
+        share_name, _, invitation_name = self.get_share_names(
+            share_id, tenant_id, identity
+        )
+
+        try:
+            invitation = await self.get_invitation_async(share_name, invitation_name)
+            if invitation is None:
+                get_provisioning_cache().invalidate(share_id)
+                raise HTTPException(
+                    status_code=404, detail=f"Invitation {invitation_name} not found"
+                )
+            share_response = self.create_invitation_response(
+                provider_node_id,
+                consumer_node_id,
+                invitation,
+                datashare_storage_resource_group_name,
+                datashare_storage_account_name,
+                datashare_storage_container_name,
+                datashare_storage_folder_path,
+                datashare_storage_file_name,
+            )
+        except HTTPException as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"HTTP Exception in method 'share_status' while receiving datashare {e.detail}",
+            )
+        except Exception as ex:
+            raise_if_throttled(ex)
+            raise_if_identity_error(ex)
+            raise HTTPException(
+                status_code=500,
+                detail=f"Exception in method 'share_status' of datashare service: {ex}",
+            )
+        return share_response
+
+    async def consume_async(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        invitation_id: str,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+        create_subscription: bool = True,
+    ) -> ConsumeResponse:
+        """
+        Launch or monitor the reception of the shared dataset, see
+        DatashareService.consume
+        """
+        share_id = self.get_share_id(
+            provider_node_id,
+            consumer_node_id,
+            datashare_storage_resource_group_name,
+            datashare_storage_account_name,
+            datashare_storage_container_name,
+            datashare_storage_folder_path,
+            datashare_storage_file_name,
+        )
+        share_name, share_datashare_name = self.get_consume_names(
+            share_id, invitation_id
+        )
+
+        def create_response(
+            synchronization: ShareSubscriptionSynchronization,
+        ) -> ConsumeResponse:
+            return self.create_synchronization_response(
+                provider_node_id,
+                consumer_node_id,
+                invitation_id,
+                datashare_storage_resource_group_name,
+                datashare_storage_account_name,
+                datashare_storage_container_name,
+                datashare_storage_folder_path,
+                datashare_storage_file_name,
+                synchronization,
+            )
+
+        try:
+            share_subscription_synchronization = await self.get_synchronize_async(
+                share_name
+            )
+            if share_subscription_synchronization is not None:
+                # the invitation_id has already been consumed
+                # monitoring the progress of the synchronization
+                return create_response(share_subscription_synchronization)
+            if not create_subscription:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Subscription {share_name} not found",
+                )
+            if await self.is_invitations_list_empty_async() is True:
+                raise HTTPException(
+                    status_code=500,
+                    detail="The invitation list is empty or\
+ the current identity can't read invitation check with your Azure AD\
+ administrator",
+                )
+            if await self.is_invitation_received_async(invitation_id) is not True:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Invitation {invitation_id} not received",
+                )
+            share_subscription = await self.create_share_subscription_async(
+                share_name, invitation_id
+            )
+            if share_subscription is None:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Share subscription {share_name} not created",
+                )
+            consumer_source_datashare = await self.get_consumer_source_datashare_async(
+                share_name
+            )
+            if consumer_source_datashare is None:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Dataset of the share subscription {share_name} not found",
+                )
+            await self.create_datashare_mapping_async(
+                share_name=share_name,
+                name=share_datashare_name,
+                datashare_id=consumer_source_datashare.data_set_id,
+                resource_group_name=datashare_storage_resource_group_name,
+                storage_account_name=datashare_storage_account_name,
+                container_name=datashare_storage_container_name,
+                prefix=self.get_dataset_path(
+                    datashare_storage_folder_path, datashare_storage_file_name
+                ),
+            )
+            share_subscription_synchronization = await self.launch_synchronize_async(
+                share_name
+            )
+            consume_response = create_response(share_subscription_synchronization)
+        except HTTPException as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"Exception while receiving datashare {e.detail}",
+            )
+        except Exception as ex:
+            raise_if_throttled(ex)
+            raise HTTPException(
+                status_code=500,
+                detail=f"Exception while receiving datashare {ex}",
+            )
+        return consume_response
+
+    async def get_provisioned_invitation_async(
+        self, share_id: str, share_name: str
+    ) -> Union[Invitation, None]:
+        """
+        Return the invitation recorded in the provisioning cache for the
+        share_id, see DatashareService.get_provisioned_invitation
+        """
+        provisioning_cache = get_provisioning_cache()
+        entry = provisioning_cache.get(share_id, self.get_account_scope(), share_name)
+        if entry is None:
+            return None
+        if provisioning_cache.is_verified(entry):
+            return entry.get_invitation()
+        try:
+            invitation = await self.async_client.invitations.get(
+                self.resource_group_name,
+                self.account_name,
+                share_name,
+                entry.invitation_name,
+            )
+        except HttpResponseError as ex:
+            if ex.status_code == 404:
+                provisioning_cache.invalidate(share_id)
+                return None
+            raise
+        entry.invitation = invitation.as_dict()
+        entry.verified = time.time()
+        provisioning_cache.put(share_id, entry)
+        return invitation
+
+    async def get_share_async(self, name: str, description: str) -> Union[Share, None]:
+        """
+        Returns the object Share using the share name
+        """
+        try:
+            share = await self.async_client.shares.get(
+                self.resource_group_name, self.account_name, name
+            )
+        except HttpResponseError as ex:
+            if ex.status_code == 404:
+                sharePayload = Share(
+                    name=name,
+                    terms="Terms",
+                    description=description,
+                    share_kind="CopyBased",
+                )
+                share = await self.async_client.shares.create(
+                    self.resource_group_name, self.account_name, name, sharePayload
+                )
+            else:
+                raise_if_throttled(ex)
+                return None
+        return share
+
+    async def create_blob_datashare_async(
+        self,
+        share_name: str,
+        name: str,
+        resource_group_name: str,
+        storage_account_name: str,
+        container_name: str,
+        file_path: str,
+    ) -> BlobDataSet:
+        """
+        Create a BlobDataSet to receive the shared dataset
+        """
+        try:
+            blob_datashare = await self.async_client.data_sets.get(
+                self.resource_group_name, self.account_name, share_name, name
+            )
+        except HttpResponseError as ex:
+            raise_if_throttled(ex)
+            blob_datashare = None
+            if ex.status_code == 404:
+                blob_datashare_playload = BlobDataSet(
+                    kind="Blob",
+                    container_name=container_name,
+                    file_path=file_path,
+                    resource_group=resource_group_name,
+                    storage_account_name=storage_account_name,
+                    subscription_id=self.subscription_id,
+                )
+                blob_datashare = await self.async_client.data_sets.create(
+                    self.resource_group_name,
+                    self.account_name,
+                    share_name,
+                    name,
+                    blob_datashare_playload,
+                )
+        return blob_datashare
+
+    async def create_invitation_async(
+        self,
+        share_name: str,
+        invitation_name: str,
+        tenant_id: str,
+        object_id: str,
+    ) -> Invitation:
+        """
+        Create an invitation
+        """
+        try:
+            invitation = await self.async_client.invitations.get(
+                self.resource_group_name, self.account_name, share_name, invitation_name
+            )
+        except HttpResponseError as ex:
+            raise_if_throttled(ex)
+            invitation = None
+            if ex.status_code == 404:
+                try:
+                    invitation_playload = Invitation(
+                        target_active_directory_id=tenant_id, target_object_id=object_id
+                    )
+                    invitation = await self.async_client.invitations.create(
+                        self.resource_group_name,
+                        self.account_name,
+                        share_name,
+                        invitation_name,
+                        invitation_playload,
+                    )
+                except Exception as ex:
+                    raise_if_throttled(ex)
+                    raise_if_identity_error(ex)
+                    invitation = None
+        return invitation
+
+    async def get_invitation_async(
+        self, share_name: str, invitation_name: str
+    ) -> Invitation:
+        """
+        Get an invitation using the share name and the invitation name
+        """
+        try:
+            invitation = await self.async_client.invitations.get(
+                self.resource_group_name, self.account_name, share_name, invitation_name
+            )
+        except Exception as ex:
+            raise_if_throttled(ex)
+            invitation = None
+        return invitation
+
+    async def is_invitation_received_async(self, invitation_id: str) -> bool:
+        """
+        Check if an invitation has been received using the invitation_id,
+        the invitation index is read first
+        """
+        if self.invitation_index.refresh_thread is None:
+            # The first load of the index lists all the invitations
+            await run_in_threadpool(self.invitation_index.start)
+        if invitation_id in self.invitation_index.invitations:
+            return True
+        try:
+            invitation = await self.async_client.consumer_invitations.get(
+                self.datashare_location, invitation_id
+            )
+        except Exception:
+            return False
+        if invitation is None:
+            return False
+        self.invitation_index.add(invitation_id, invitation)
+        return True
+
+    async def is_invitations_list_empty_async(self) -> bool:
+        """
+        Check if invitation are available
+        """
+        if self.invitation_index.invitations:
+            return False
+        # The index is refreshed with the sync client
+        return await run_in_threadpool(self.invitation_index.is_empty)
+
+    async def create_share_subscription_async(
+        self, share_name: str, invitation_id: str
+    ) -> ShareSubscription:
+        """
+        Create a ShareSubscription to receive the dataset. A subscription
+        of another invitation is deleted first, the LroManager creates the
+        new subscription when the deletion is completed.
+        """
+        key = (self.get_account_scope(), "delete_share_subscription", share_name)
+        replacement = get_lro_manager().get(key)
+        if replacement is not None and not replacement.done.is_set():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Share subscription {share_name} is being replaced",
+            )
+        try:
+            share_subscription = await self.async_client.share_subscriptions.get(
+                self.resource_group_name, self.account_name, share_name
+            )
+        except HttpResponseError as ex:
+            raise_if_throttled(ex)
+            if ex.status_code == 404:
+                return await self.create_subscription_async(share_name, invitation_id)
+            return None
+        if share_subscription.invitation_id != invitation_id:
+            await get_lro_manager().start_async(
+                key,
+                f"delete_share_subscription {share_name}",
+                lambda: self.async_client.share_subscriptions.begin_delete(
+                    self.resource_group_name, self.account_name, share_name
+                ),
+                lambda _: self.create_subscription_async(share_name, invitation_id),
+            )
+            raise HTTPException(
+                status_code=503,
+                detail=f"Share subscription {share_name} is being replaced",
+            )
+        return share_subscription
+
+    async def create_subscription_async(
+        self, share_name: str, invitation_id: str
+    ) -> Union[ShareSubscription, None]:
+        """
+        Create the ShareSubscription of the invitation
+        """
+        try:
+            consumer_invitation = await self.async_client.consumer_invitations.get(
+                self.datashare_location, invitation_id
+            )
+            if consumer_invitation is not None:
+                share_subscription_payload = ShareSubscription(
+                    invitation_id=invitation_id,
+                    source_share_location=self.datashare_location,
+                )
+                share_subscription = await self.async_client.share_subscriptions.create(
+                    self.resource_group_name,
+                    self.account_name,
+                    share_name,
+                    share_subscription_payload,
+                )
+            else:
+                share_subscription = None
+        except Exception as ex:
+            raise_if_throttled(ex)
+            share_subscription = None
+        return share_subscription
+
+    async def get_consumer_source_datashare_async(
+        self, share_name: str
+    ) -> ConsumerSourceDataSet:
+        """
+        Get the ConsumerSourceDataset from the Share name
+        """
+        consumer_source_datashare = None
+        try:
+            async for (
+                item
+            ) in self.async_client.consumer_source_data_sets.list_by_share_subscription(
+                self.resource_group_name, self.account_name, share_name
+            ):
+                consumer_source_datashare = item
+                break
+        except Exception as ex:
+            raise_if_throttled(ex)
+            consumer_source_datashare = None
+        return consumer_source_datashare
+
+    async def create_datashare_mapping_async(
+        self,
+        share_name: str,
+        name: str,
+        datashare_id: str,
+        resource_group_name: str,
+        storage_account_name: str,
+        container_name: str,
+        prefix: str,
+    ) -> DataSetMapping:
+        """
+        Create a datashare mapping
+        """
+        try:
+            datashare_mapping = await self.async_client.data_set_mappings.get(
+                self.resource_group_name, self.account_name, share_name, name
+            )
+        except HttpResponseError as ex:
+            raise_if_throttled(ex)
+            datashare_mapping = None
+            if ex.status_code == 404:
+                datashare_mapping_payload = BlobDataSetMapping(
+                    data_set_id=datashare_id,
+                    container_name=container_name,
+                    file_path=prefix,
+                    resource_group=resource_group_name,
+                    storage_account_name=storage_account_name,
+                    subscription_id=self.subscription_id,
+                )
+                datashare_mapping = await self.async_client.data_set_mappings.create(
+                    self.resource_group_name,
+                    self.account_name,
+                    share_name,
+                    name,
+                    datashare_mapping_payload,
+                )
+        return datashare_mapping
+
+    async def launch_synchronize_async(
+        self, share_name: str
+    ) -> ShareSubscriptionSynchronization:
+        """
+        Launch the synchronization to received the shared dataset
+        using the share name, the LroManager tracks its poller
+        """
+        try:
+            await get_lro_manager().start_async(
+                (self.get_account_scope(), "synchronize", share_name),
+                f"synchronize {share_name}",
+                lambda: self.async_client.share_subscriptions.begin_synchronize(
+                    self.resource_group_name,
+                    self.account_name,
+                    share_name,
+                    Synchronize(synchronization_mode="FullSync"),
+                ),
+                # The cached status is refreshed when the synchronization ends
+                lambda _: self.refresh_synchronization_async(share_name),
+            )
+        except HttpResponseError as ex:
+            if ex.status_code != 409:
+                raise_if_throttled(ex)
+                return None
+        return await self.refresh_synchronization_async(share_name)
+
+    async def get_synchronize_async(
+        self, share_name: str
+    ) -> ShareSubscriptionSynchronization:
+        """
+        Get the current synchronization for the share name from the
+        synchronization poller cache
+        """
+        synchronization = self.synchronization_poller.get_cached(share_name)
+        if synchronization is not None:
+            return synchronization
+        return await self.refresh_synchronization_async(share_name)
+
+    async def refresh_synchronization_async(self, share_name: str) -> Any:
+        """
+        Get the synchronization from Azure and publish it in the
+        synchronization poller cache
+        """
+        synchronization = None
+        try:
+            async for item in self.async_client.share_subscriptions.list_synchronizations(
+                self.resource_group_name, self.account_name, share_name
+            ):
+                synchronization = item
+                break
+        except Exception:
+            return None
+        if synchronization is not None:
+            self.synchronization_poller.update(share_name, synchronization)
+            self.synchronization_poller.start()
+        return synchronization
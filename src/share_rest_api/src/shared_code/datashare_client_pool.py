@@ -0,0 +1,199 @@
+import threading
+import time
+from typing import Any, Dict, Tuple, Union
+
+from azure.mgmt.datashare import DataShareManagementClient
+from azure.mgmt.datashare.aio import (
+    DataShareManagementClient as AsyncDataShareManagementClient,
+)
+
+from shared_code.arm_throttling import get_arm_policies, get_async_arm_policies
+from shared_code.configuration_service import ConfigurationService
+from shared_code.credential_service import create_async_credential, create_credential
+from shared_code.invitation_index import InvitationIndex
+from shared_code.log_service import LogService
+from shared_code.synchronization_poller import SynchronizationPoller
+from shared_code.token_cache import (
+    AsyncCachedTokenCredential,
+    CachedTokenCredential,
+    get_token_cache,
+)
+
+
+class DatashareClient:
+    """
+    Class used to share one credential and one DataShareManagementClient
+    for a datashare account between the requests.
+    The credential and the client are created at the first use, the
+    datashare account metadata (location) is cached during metadata_ttl
+    seconds. The tokens are kept in the persistent token cache shared by
+    the workers. The consumer invitations are indexed by invitation_id and
+    the synchronizations are polled in the background. The requests of the
+    client share the ARM budget of the subscription (ArmThrottle).
+    The aio client of the AsyncDatashareService is created at its first use
+    with an azure.identity.aio credential.
+    """
+
+    def __init__(
+        self,
+        subscription_id: str,
+        resource_group_name: str,
+        account_name: str,
+        metadata_ttl: float,
+    ) -> None:
+        self.subscription_id = subscription_id
+        self.resource_group_name = resource_group_name
+        self.account_name = account_name
+        self.metadata_ttl = metadata_ttl
+        self.lock = threading.Lock()
+        self.credentials = None
+        self.client = None
+        self.async_credentials = None
+        self.async_client = None
+        self.account = None
+        self.account_expiry = 0.0
+        self.invitation_index = None
+        self.synchronization_poller = None
+
+    def get_client(self) -> DataShareManagementClient:
+        """Return the DataShareManagementClient, create it if required"""
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.credentials = CachedTokenCredential(
+                        create_credential(),
+                        get_token_cache(),
+                        ConfigurationService().get_token_refresh_margin(),
+                    )
+                    retry_policy, rate_limit_policy = get_arm_policies(
+                        self.subscription_id
+                    )
+                    self.client = DataShareManagementClient(
+                        self.credentials,
+                        self.subscription_id,
+                        retry_policy=retry_policy,
+                        per_retry_policies=[rate_limit_policy],
+                    )
+        return self.client
+
+    def get_async_client(self) -> AsyncDataShareManagementClient:
+        """Return the aio DataShareManagementClient, create it if required"""
+        if self.async_client is None:
+            with self.lock:
+                if self.async_client is None:
+                    self.async_credentials = AsyncCachedTokenCredential(
+                        create_async_credential(),
+                        get_token_cache(),
+                        ConfigurationService().get_token_refresh_margin(),
+                    )
+                    retry_policy, rate_limit_policy = get_async_arm_policies(
+                        self.subscription_id
+                    )
+                    self.async_client = AsyncDataShareManagementClient(
+                        self.async_credentials,
+                        self.subscription_id,
+                        retry_policy=retry_policy,
+                        per_retry_policies=[rate_limit_policy],
+                    )
+        return self.async_client
+
+    def get_account(self) -> Any:
+        """Return the datashare account, get it again when it expired"""
+        account = self.account
+        if account is not None and time.monotonic() < self.account_expiry:
+            return account
+        client = self.get_client()
+        with self.lock:
+            if self.account is None or time.monotonic() >= self.account_expiry:
+                start = time.perf_counter()
+                self.account = client.accounts.get(
+                    self.resource_group_name, self.account_name
+                )
+                self.account_expiry = time.monotonic() + self.metadata_ttl
+                LogService().log_information(
+                    f"Datashare account {self.account_name} read in\
+ {(time.perf_counter() - start) * 1000:.0f} ms"
+                )
+            return self.account
+
+    def get_invitation_index(self) -> InvitationIndex:
+        """Return the index of the consumer invitations, create it if required"""
+        if self.invitation_index is None:
+            client = self.get_client()
+            location = self.get_account().location
+            with self.lock:
+                if self.invitation_index is None:
+                    self.invitation_index = InvitationIndex(
+                        client,
+                        location,
+                        ConfigurationService().get_invitation_index_refresh_period(),
+                    )
+        return self.invitation_index
+
+    def get_synchronization_poller(self) -> SynchronizationPoller:
+        """Return the poller of the share subscription synchronizations"""
+        if self.synchronization_poller is None:
+            client = self.get_client()
+            with self.lock:
+                if self.synchronization_poller is None:
+                    configuration_service = ConfigurationService()
+                    self.synchronization_poller = SynchronizationPoller(
+                        client,
+                        self.resource_group_name,
+                        self.account_name,
+                        configuration_service.get_synchronization_poll_min_interval(),
+                        configuration_service.get_synchronization_poll_max_interval(),
+                    )
+        return self.synchronization_poller
+
+
+class DatashareClientPool:
+    """
+    Class used to keep a single DatashareClient per
+    (subscription, resource group, datashare account) in the process
+    """
+
+    def __init__(self, metadata_ttl: float) -> None:
+        self.metadata_ttl = metadata_ttl
+        self.lock = threading.Lock()
+        self.clients: Dict[Tuple[str, str, str], DatashareClient] = {}
+
+    def get(
+        self, subscription_id: str, resource_group_name: str, account_name: str
+    ) -> DatashareClient:
+        """Return the DatashareClient associated with the datashare account"""
+        key = (subscription_id, resource_group_name, account_name)
+        client = self.clients.get(key)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+                if client is None:
+                    client = DatashareClient(
+                        subscription_id,
+                        resource_group_name,
+                        account_name,
+                        self.metadata_ttl,
+                    )
+                    self.clients[key] = client
+        return client
+
+    def clear(self) -> None:
+        """Remove all the clients from the pool"""
+        with self.lock:
+            self.clients = {}
+
+
+datashare_client_pool: Union[DatashareClientPool, None] = None
+datashare_client_pool_lock = threading.Lock()
+
+
+def get_datashare_client_pool() -> DatashareClientPool:
+    """Getting a single instance of the DatashareClientPool"""
+    global datashare_client_pool
+    if datashare_client_pool is None:
+        with datashare_client_pool_lock:
+            if datashare_client_pool is None:
+                datashare_client_pool = DatashareClientPool(
+                    ConfigurationService().get_datashare_metadata_ttl()
+                )
+    return datashare_client_pool
@@ -1,13 +1,12 @@
 from __future__ import annotations
 
 import hashlib
+import time
 from datetime import datetime
 from enum import Enum
-from typing import Union
+from typing import Tuple, Union
 
 from azure.core.exceptions import HttpResponseError
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.datashare import DataShareManagementClient
 from azure.mgmt.datashare.models import (
     BlobDataSet,
     BlobDataSetMapping,
@@ -21,6 +20,9 @@ from azure.mgmt.datashare.models import (
 )
 from fastapi import HTTPException
 
+from shared_code.arm_throttling import raise_if_throttled
+from shared_code.datashare_client_pool import get_datashare_client_pool
+from shared_code.lro_manager import get_lro_manager
 from shared_code.models import (
     ConsumeResponse,
     Dataset,
@@ -29,6 +31,43 @@ from shared_code.models import (
     Status,
     StatusDetails,
 )
+from shared_code.provisioning_cache import ProvisionedShare, get_provisioning_cache
+from shared_code.single_flight import coalesced
+
+
+# Status of the sent invitations which are not in Status
+INVITATION_STATUSES = {
+    "Accepted": Status.SUCCEEDED,
+    "Rejected": Status.FAILED,
+    "Withdrawn": Status.FAILED,
+}
+
+# Azure error codes returned when the tenant or the identity of the consumer
+# is not the one Azure knows
+IDENTITY_ERROR_CODES = [
+    "AuthorizationFailed",
+    "InvalidIdentity",
+    "InvalidTargetActiveDirectoryId",
+    "InvalidTargetObjectId",
+    "TenantMismatch",
+]
+
+
+def is_identity_error(ex: Exception) -> bool:
+    """Return True if Azure rejected the authorization or the identity"""
+    if getattr(ex, "status_code", None) == 403:
+        return True
+    message = f"{getattr(ex, 'detail', '')} {ex}"
+    return any(code in message for code in IDENTITY_ERROR_CODES)
+
+
+def raise_if_identity_error(ex: Exception) -> None:
+    """Raise a 403 HTTPException when Azure rejected the identity"""
+    if is_identity_error(ex):
+        raise HTTPException(
+            status_code=403,
+            detail=f"Azure Data Share identity error: {ex}",
+        )
 
 
 class DatashareServiceError(int, Enum):
@@ -64,6 +103,8 @@ class DatashareService:
         self.datashare_client = None
         self.datashare_account = None
         self.datashare_location = None
+        self.invitation_index = None
+        self.synchronization_poller = None
         if not self.initialize_azure_clients():
             raise HTTPException(
                 status_code=500,
@@ -71,16 +112,12 @@ class DatashareService:
             )
 
     def initialize_azure_clients(self) -> bool:
-        """Initialize the connection with Datashare client"""
+        """
+        Initialize the connection with Datashare client, the client and the
+        datashare account are shared by all the requests of the process
+        """
         try:
-            self.credentials = DefaultAzureCredential()
-            self.datashare_client = DataShareManagementClient(
-                self.credentials, self.subscription_id
-            )
-            self.datashare_account = self.datashare_client.accounts.get(
-                self.resource_group_name, self.account_name
-            )
-            self.datashare_location = self.datashare_account.location
+            self.initialize()
         except Exception as ex:
             raise HTTPException(
                 status_code=500,
@@ -91,16 +128,16 @@ class DatashareService:
 
     def initialize(self):
         """Initialize the Datashare client"""
-        if self.datashare_client is None:
-            self.credentials = DefaultAzureCredential()
-            self.datashare_client = DataShareManagementClient(
-                self.credentials, self.subscription_id
-            )
-        if self.datashare_account is None:
-            self.datashare_account = self.datashare_client.accounts.get(
-                self.resource_group_name, self.account_name
+        if self.datashare_client is None or self.datashare_account is None:
+            pooled_client = get_datashare_client_pool().get(
+                self.subscription_id, self.resource_group_name, self.account_name
             )
+            self.datashare_client = pooled_client.get_client()
+            self.credentials = pooled_client.credentials
+            self.datashare_account = pooled_client.get_account()
             self.datashare_location = self.datashare_account.location
+            self.invitation_index = pooled_client.get_invitation_index()
+            self.synchronization_poller = pooled_client.get_synchronization_poller()
 
     def share(
         self,
@@ -136,61 +173,69 @@ class DatashareService:
         invitation_id which will be shared with the recipient share_rest_api
         to consume this datashare.
         """
-        hash = self.get_hash(
+        share_id = self.get_share_id(
+            provider_node_id,
+            consumer_node_id,
             datashare_storage_resource_group_name,
             datashare_storage_account_name,
             datashare_storage_container_name,
             datashare_storage_folder_path,
             datashare_storage_file_name,
         )
-        share_id = f"{provider_node_id}-{consumer_node_id}-{hash}"
-        text = f"share-{share_id}-{tenant_id}-{identity}"
-        share_name = text[0:90]
-        text = f"datashare-{share_id}-{tenant_id}-{identity}"
-        share_datashare_name = text[0:90]
-        text = f"invitation-{share_id}-{tenant_id}-{identity}"
-        invitation_name = text[0:90]
-        folder_path = f"{datashare_storage_folder_path}"
+        share_name, share_datashare_name, invitation_name = self.get_share_names(
+            share_id, tenant_id, identity
+        )
 
         try:
-            sent_share = self.get_share(share_name, "Provider share")
-            if sent_share is None:
-                return None
-            if folder_path[-1] != "/":
-                path = f"{folder_path}/{datashare_storage_file_name}"
-            else:
-                path = f"{folder_path}{datashare_storage_file_name}"
-            self.create_blob_datashare(
-                share_name,
-                share_datashare_name,
+            invitation = self.get_provisioned_invitation(share_id, share_name)
+            if invitation is None:
+                sent_share = self.get_share(share_name, "Provider share")
+                if sent_share is None:
+                    return None
+                blob_datashare = self.create_blob_datashare(
+                    share_name,
+                    share_datashare_name,
+                    datashare_storage_resource_group_name,
+                    datashare_storage_account_name,
+                    datashare_storage_container_name,
+                    self.get_dataset_path(
+                        datashare_storage_folder_path, datashare_storage_file_name
+                    ),
+                )
+
+                invitation = self.create_invitation(
+                    share_name,
+                    invitation_name,
+                    tenant_id,
+                    identity,
+                )
+                self.put_provisioned_share(
+                    share_id,
+                    share_name,
+                    sent_share,
+                    share_datashare_name,
+                    blob_datashare,
+                    invitation_name,
+                    invitation,
+                )
+            share_response = self.create_invitation_response(
+                provider_node_id,
+                consumer_node_id,
+                invitation,
                 datashare_storage_resource_group_name,
                 datashare_storage_account_name,
                 datashare_storage_container_name,
-                path,
+                datashare_storage_folder_path,
+                datashare_storage_file_name,
             )
-
-            invitation = self.create_invitation(
-                share_name,
-                invitation_name,
-                tenant_id,
-                identity,
-            )
-            share_response = self.create_share_response(
-                provider_node_id=provider_node_id,
-                consumer_node_id=consumer_node_id,
-                invitation_id=invitation.invitation_id,
-                invitation_name=invitation.name,
-                datashare_storage_resource_group_name=datashare_storage_resource_group_name,
-                datashare_storage_account_name=datashare_storage_account_name,
-                datashare_storage_container_name=datashare_storage_container_name,
-                datashare_storage_folder_path=datashare_storage_folder_path,
-                datashare_storage_file_name=datashare_storage_file_name,
-                invitation_status=invitation.invitation_status,
-                invitation_date=invitation.sent_at,
-                error_code=DatashareServiceError.NO_ERROR,
-                error_message="",
+        except HTTPException as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"HTTP Exception in method 'share' of datashare service: {e.detail}",
             )
         except Exception as ex:
+            raise_if_throttled(ex)
+            raise_if_identity_error(ex)
             raise HTTPException(
                 status_code=500,
                 detail=f"Exception in method 'share' of datashare service: {ex}",
@@ -236,38 +281,34 @@ class DatashareService:
         sent to the recipient, if the invitation failed, further information
         about the error will be available in error.message.
         """
-        hash = self.get_hash(
+        share_id = self.get_share_id(
+            provider_node_id,
+            consumer_node_id,
             datashare_storage_resource_group_name,
             datashare_storage_account_name,
             datashare_storage_container_name,
             datashare_storage_folder_path,
             datashare_storage_file_name,
         )
-        share_id = f"{provider_node_id}-{consumer_node_id}-{hash}"
-        text = f"share-{share_id}-{tenant_id}-{identity}"
-        share_name = text[0:90]
-        text = f"invitation-{share_id}-{tenant_id}-{identity}"
-        invitation_name = text[0:90]
+        share_name, _, invitation_name = self.get_share_names(
+            share_id, tenant_id, identity
+        )
 
         try:
             invitation = self.get_invitation(share_name, invitation_name)
             if invitation is not None:
-                share_response = self.create_share_response(
-                    provider_node_id=provider_node_id,
-                    consumer_node_id=consumer_node_id,
-                    invitation_id=invitation.invitation_id,
-                    invitation_name=invitation.name,
-                    datashare_storage_resource_group_name=datashare_storage_resource_group_name,
-                    datashare_storage_account_name=datashare_storage_account_name,
-                    datashare_storage_container_name=datashare_storage_container_name,
-                    datashare_storage_folder_path=datashare_storage_folder_path,
-                    datashare_storage_file_name=datashare_storage_file_name,
-                    invitation_status=invitation.invitation_status,
-                    invitation_date=invitation.sent_at,
-                    error_code=DatashareServiceError.NO_ERROR,
-                    error_message="",
+                share_response = self.create_invitation_response(
+                    provider_node_id,
+                    consumer_node_id,
+                    invitation,
+                    datashare_storage_resource_group_name,
+                    datashare_storage_account_name,
+                    datashare_storage_container_name,
+                    datashare_storage_folder_path,
+                    datashare_storage_file_name,
                 )
             else:
+                get_provisioning_cache().invalidate(share_id)
                 raise HTTPException(
                     status_code=404, detail=f"Invitation {invitation_name} not found"
                 )
@@ -277,6 +318,8 @@ class DatashareService:
                 detail=f"HTTP Exception in method 'share_status' while receiving datashare {e.detail}",
             )
         except Exception as ex:
+            raise_if_throttled(ex)
+            raise_if_identity_error(ex)
             raise HTTPException(
                 status_code=500,
                 detail=f"Exception in method 'share_status' of datashare service: {ex}",
@@ -293,6 +336,7 @@ class DatashareService:
         datashare_storage_container_name: str,
         datashare_storage_folder_path: str,
         datashare_storage_file_name: str,
+        create_subscription: bool = True,
     ) -> ConsumeResponse:
         """
         Launch the reception of the shared dataset associated
@@ -313,6 +357,9 @@ class DatashareService:
             received dataset will be stored,
         datashare_storage_file_name: the file name where the
             received dataset will be stored,
+        create_subscription: if False, the share subscription is not
+            created and only the status of an existing subscription is
+            returned,
         This API returns the object ConsumeResponse which contains the
         the status of the sharing process. If the value of
         status.status is Status.SUCCEEDED, the dataset has been
@@ -320,22 +367,27 @@ class DatashareService:
         occured, further information
         about the error will be available in error.message.
         """
-        hash = self.get_hash(
+        share_id = self.get_share_id(
+            provider_node_id,
+            consumer_node_id,
             datashare_storage_resource_group_name,
             datashare_storage_account_name,
             datashare_storage_container_name,
             datashare_storage_folder_path,
             datashare_storage_file_name,
         )
-        share_id = f"{provider_node_id}-{consumer_node_id}-{hash}"
-        text = f"consume-{share_id}-{invitation_id}"
-        share_name = text[0:90]
-        text = f"datashare-{share_id}-{invitation_id}"
-        share_datashare_name = text[0:90]
+        share_name, share_datashare_name = self.get_consume_names(
+            share_id, invitation_id
+        )
 
         try:
             share_subscription_synchronization = self.get_synchronize(share_name)
             if share_subscription_synchronization is None:
+                if not create_subscription:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Subscription {share_name} not found",
+                    )
                 # if there is no synchronization for share_name
                 # create a share subscription with invitation id
                 if self.is_invitations_list_empty() is True:
@@ -358,12 +410,6 @@ class DatashareService:
                         share_name
                     )
                     if consumer_source_datashare is not None:
-                        folder_path = f"{datashare_storage_folder_path}"
-
-                        if folder_path[-1] != "/":
-                            path = f"{folder_path}/{datashare_storage_file_name}"
-                        else:
-                            path = f"{folder_path}{datashare_storage_file_name}"
                         self.create_datashare_mapping(
                             share_name=share_name,
                             name=share_datashare_name,
@@ -371,63 +417,40 @@ class DatashareService:
                             resource_group_name=datashare_storage_resource_group_name,
                             storage_account_name=datashare_storage_account_name,
                             container_name=datashare_storage_container_name,
-                            prefix=path,
+                            prefix=self.get_dataset_path(
+                                datashare_storage_folder_path,
+                                datashare_storage_file_name,
+                            ),
                         )
 
                         share_subscription_synchronization = self.launch_synchronize(
                             share_name
                         )
-                        consume_response = self.create_consume_response(
-                            provider_node_id=provider_node_id,
-                            consumer_node_id=consumer_node_id,
-                            invitation_id=invitation_id,
-                            datashare_storage_resource_group_name=datashare_storage_resource_group_name,
-                            datashare_storage_account_name=datashare_storage_account_name,
-                            datashare_storage_container_name=datashare_storage_container_name,
-                            datashare_storage_folder_path=datashare_storage_folder_path,
-                            datashare_storage_file_name=datashare_storage_file_name,
-                            status=share_subscription_synchronization.status,
-                            status_start_date=datetime.min
-                            if share_subscription_synchronization.start_time is None
-                            else share_subscription_synchronization.start_time,
-                            status_end_date=datetime.min
-                            if share_subscription_synchronization.end_time is None
-                            else share_subscription_synchronization.end_time,
-                            status_duration_in_ms=0
-                            if share_subscription_synchronization.duration_ms is None
-                            else share_subscription_synchronization.duration_ms,
-                            error_code=DatashareServiceError.NO_ERROR,
-                            error_message="",
+                        consume_response = self.create_synchronization_response(
+                            provider_node_id,
+                            consumer_node_id,
+                            invitation_id,
+                            datashare_storage_resource_group_name,
+                            datashare_storage_account_name,
+                            datashare_storage_container_name,
+                            datashare_storage_folder_path,
+                            datashare_storage_file_name,
+                            share_subscription_synchronization,
                         )
             else:
                 # if a synchronization already exists for share_name
                 # the invitation_id has already been consumed
                 # monitoring the progress of the synchronization
-                consume_response = self.create_consume_response(
-                    provider_node_id=provider_node_id,
-                    consumer_node_id=consumer_node_id,
-                    invitation_id=invitation_id,
-                    datashare_storage_resource_group_name=datashare_storage_resource_group_name,
-                    datashare_storage_account_name=datashare_storage_account_name,
-                    datashare_storage_container_name=datashare_storage_container_name,
-                    datashare_storage_folder_path=datashare_storage_folder_path,
-                    datashare_storage_file_name=datashare_storage_file_name,
-                    status=share_subscription_synchronization.status,
-                    status_start_date=datetime.min
-                    if share_subscription_synchronization.start_time is None
-                    else share_subscription_synchronization.start_time,
-                    status_end_date=datetime.min
-                    if share_subscription_synchronization.end_time is None
-                    else share_subscription_synchronization.end_time,
-                    status_duration_in_ms=0
-                    if share_subscription_synchronization.duration_ms is None
-                    else share_subscription_synchronization.duration_ms,
-                    error_code=DatashareServiceError.NO_ERROR
-                    if share_subscription_synchronization.message is None
-                    else DatashareServiceError.SYNCHRONIZATION_ERROR,
-                    error_message=""
-                    if share_subscription_synchronization.message is None
-                    else share_subscription_synchronization.message,
+                consume_response = self.create_synchronization_response(
+                    provider_node_id,
+                    consumer_node_id,
+                    invitation_id,
+                    datashare_storage_resource_group_name,
+                    datashare_storage_account_name,
+                    datashare_storage_container_name,
+                    datashare_storage_folder_path,
+                    datashare_storage_file_name,
+                    share_subscription_synchronization,
                 )
 
         except HTTPException as e:
@@ -436,6 +459,7 @@ class DatashareService:
                 detail=f"Exception while receiving datashare {e.detail}",
             )
         except Exception as ex:
+            raise_if_throttled(ex)
             raise HTTPException(
                 status_code=500,
                 detail=f"Exception while receiving datashare {ex}",
@@ -460,6 +484,123 @@ class DatashareService:
         hash_object = hashlib.md5(text.encode())
         return hash_object.hexdigest()
 
+    def get_account_scope(self) -> str:
+        """Return the datashare account of the provisioning cache entries"""
+        return f"{self.subscription_id}/{self.resource_group_name}/{self.account_name}"
+
+    def get_share_id(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+    ) -> str:
+        """Return the id of the share of the dataset between the two nodes"""
+        hash = self.get_hash(
+            datashare_storage_resource_group_name,
+            datashare_storage_account_name,
+            datashare_storage_container_name,
+            datashare_storage_folder_path,
+            datashare_storage_file_name,
+        )
+        return f"{provider_node_id}-{consumer_node_id}-{hash}"
+
+    def get_share_names(
+        self, share_id: str, tenant_id: str, identity: str
+    ) -> Tuple[str, str, str]:
+        """
+        Return the names of the Share, of its BlobDataSet and of its
+        Invitation for the consumer identity
+        """
+        return tuple(
+            f"{kind}-{share_id}-{tenant_id}-{identity}"[0:90]
+            for kind in ["share", "datashare", "invitation"]
+        )
+
+    def get_consume_names(self, share_id: str, invitation_id: str) -> Tuple[str, str]:
+        """
+        Return the names of the ShareSubscription and of its DataSetMapping
+        for the invitation
+        """
+        return tuple(
+            f"{kind}-{share_id}-{invitation_id}"[0:90]
+            for kind in ["consume", "datashare"]
+        )
+
+    def get_dataset_path(
+        self, datashare_storage_folder_path: str, datashare_storage_file_name: str
+    ) -> str:
+        """Return the path of the dataset in its storage container"""
+        if datashare_storage_folder_path[-1] != "/":
+            return f"{datashare_storage_folder_path}/{datashare_storage_file_name}"
+        return f"{datashare_storage_folder_path}{datashare_storage_file_name}"
+
+    def put_provisioned_share(
+        self,
+        share_id: str,
+        share_name: str,
+        sent_share: Share,
+        share_datashare_name: str,
+        blob_datashare: Union[BlobDataSet, None],
+        invitation_name: str,
+        invitation: Union[Invitation, None],
+    ) -> None:
+        """Record the provisioned share in the provisioning cache"""
+        if blob_datashare is None or invitation is None:
+            return
+        get_provisioning_cache().put(
+            share_id,
+            ProvisionedShare(
+                account=self.get_account_scope(),
+                share_name=share_name,
+                share_arm_id=sent_share.id,
+                data_set_name=share_datashare_name,
+                data_set_arm_id=blob_datashare.id,
+                invitation_name=invitation_name,
+                invitation_arm_id=invitation.id,
+                invitation=invitation.as_dict(),
+                verified=time.time(),
+            ),
+        )
+
+    def get_provisioned_invitation(
+        self, share_id: str, share_name: str
+    ) -> Union[Invitation, None]:
+        """
+        Return the invitation recorded in the provisioning cache for the
+        share_id, None if the share must be provisioned.
+        The Invitation is a child of the Share: an entry older than the
+        verify period is verified with invitations.get, and removed from the
+        cache when the invitation (or the share) is not found.
+        """
+        provisioning_cache = get_provisioning_cache()
+        entry = provisioning_cache.get(share_id, self.get_account_scope(), share_name)
+        if entry is None:
+            return None
+        if provisioning_cache.is_verified(entry):
+            return entry.get_invitation()
+        self.initialize()
+        try:
+            invitation = self.datashare_client.invitations.get(
+                self.resource_group_name,
+                self.account_name,
+                share_name,
+                entry.invitation_name,
+            )
+        except HttpResponseError as ex:
+            if ex.status_code == 404:
+                provisioning_cache.invalidate(share_id)
+                return None
+            raise
+        entry.invitation = invitation.as_dict()
+        entry.verified = time.time()
+        provisioning_cache.put(share_id, entry)
+        return invitation
+
+    @coalesced("get_share")
     def get_share(self, name: str, description: str) -> Union[Share, None]:
         """
         Returns the object Share using the share name
@@ -481,9 +622,11 @@ class DatashareService:
                     self.resource_group_name, self.account_name, name, sharePayload
                 )
             else:
+                raise_if_throttled(ex)
                 return None
         return share
 
+    @coalesced("create_blob_datashare")
     def create_blob_datashare(
         self,
         share_name: str,
@@ -503,6 +646,7 @@ class DatashareService:
                 self.resource_group_name, self.account_name, share_name, name
             )
         except Exception as ex:
+            raise_if_throttled(ex)
             blob_datashare = None
             if ex.status_code == 404:
                 blob_datashare_playload = BlobDataSet(
@@ -522,6 +666,7 @@ class DatashareService:
                 )
         return blob_datashare
 
+    @coalesced("create_invitation")
     def create_invitation(
         self,
         share_name: str,
@@ -539,6 +684,7 @@ class DatashareService:
                 self.resource_group_name, self.account_name, share_name, invitation_name
             )
         except Exception as ex:
+            raise_if_throttled(ex)
             invitation = None
             if ex.status_code == 404:
                 try:
@@ -552,10 +698,13 @@ class DatashareService:
                         invitation_name,
                         invitation_playload,
                     )
-                except Exception:
+                except Exception as ex:
+                    raise_if_throttled(ex)
+                    raise_if_identity_error(ex)
                     invitation = None
         return invitation
 
+    @coalesced("get_invitation", status_read=True)
     def get_invitation(self, share_name: str, invitation_name: str) -> Invitation:
         """
         Get an invitation using the share name and the invitation name
@@ -566,7 +715,8 @@ class DatashareService:
             invitation = self.datashare_client.invitations.get(
                 self.resource_group_name, self.account_name, share_name, invitation_name
             )
-        except Exception:
+        except Exception as ex:
+            raise_if_throttled(ex)
             invitation = None
         return invitation
 
@@ -574,75 +724,93 @@ class DatashareService:
         """
         Check if an invitation has been received using the invitation_id
         """
-        try:
-            for (
-                consumer_invitation
-            ) in self.datashare_client.consumer_invitations.list_invitations():
-                if consumer_invitation.invitation_id == invitation_id:
-                    return True
-        except Exception:
-            return False
-        return False
+        self.initialize()
+        return self.invitation_index.contains(invitation_id)
 
     def is_invitations_list_empty(self) -> bool:
         """
         Check if invitation are available
         """
-        try:
-            self.datashare_client.consumer_invitations.list_invitations().next()
-        except StopIteration:
-            return True
-        else:
-            return False
+        self.initialize()
+        return self.invitation_index.is_empty()
 
+    @coalesced("create_share_subscription")
     def create_share_subscription(
         self, share_name: str, invitation_id: str
     ) -> ShareSubscription:
         """
-        Create a ShareSubscription to receive the dataset
+        Create a ShareSubscription to receive the dataset. A subscription
+        of another invitation is deleted first, the LroManager creates the
+        new subscription when the deletion is completed.
         """
         self.initialize()
+        key = (self.get_account_scope(), "delete_share_subscription", share_name)
+        replacement = get_lro_manager().get(key)
+        if replacement is not None and not replacement.done.is_set():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Share subscription {share_name} is being replaced",
+            )
         bcreate = False
         try:
             share_subscription = self.datashare_client.share_subscriptions.get(
                 self.resource_group_name, self.account_name, share_name
             )
             if share_subscription.invitation_id != invitation_id:
-                self.datashare_client.share_subscriptions.begin_delete(
-                    self.resource_group_name, self.account_name, share_name
+                get_lro_manager().start(
+                    key,
+                    f"delete_share_subscription {share_name}",
+                    lambda: self.datashare_client.share_subscriptions.begin_delete(
+                        self.resource_group_name, self.account_name, share_name
+                    ),
+                    lambda _: self.create_subscription(share_name, invitation_id),
                 )
-                bcreate = True
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Share subscription {share_name} is being replaced",
+                )
+        except HTTPException:
+            raise
         except Exception as ex:
+            raise_if_throttled(ex)
             share_subscription = None
             if ex.status_code == 404:
                 bcreate = True
 
         if bcreate is True:
-            try:
-                consumer_invitation = self.datashare_client.consumer_invitations.get(
-                    self.datashare_location, invitation_id
+            share_subscription = self.create_subscription(share_name, invitation_id)
+        return share_subscription
+
+    def create_subscription(
+        self, share_name: str, invitation_id: str
+    ) -> Union[ShareSubscription, None]:
+        """
+        Create the ShareSubscription of the invitation
+        """
+        try:
+            consumer_invitation = self.datashare_client.consumer_invitations.get(
+                self.datashare_location, invitation_id
+            )
+            if consumer_invitation is not None:
+                share_subscription_payload = ShareSubscription(
+                    invitation_id=invitation_id,
+                    source_share_location=self.datashare_location,
                 )
-                if consumer_invitation is not None:
-                    share_subscription_payload = ShareSubscription(
-                        invitation_id=invitation_id,
-                        source_share_location=self.datashare_location,
-                    )
 
-                    share_subscription = (
-                        self.datashare_client.share_subscriptions.create(
-                            self.resource_group_name,
-                            self.account_name,
-                            share_name,
-                            share_subscription_payload,
-                        )
-                    )
-                else:
-                    share_subscription = None
-            except Exception:
+                share_subscription = self.datashare_client.share_subscriptions.create(
+                    self.resource_group_name,
+                    self.account_name,
+                    share_name,
+                    share_subscription_payload,
+                )
+            else:
                 share_subscription = None
-
+        except Exception as ex:
+            raise_if_throttled(ex)
+            share_subscription = None
         return share_subscription
 
+    @coalesced("get_consumer_source_datashare")
     def get_consumer_source_datashare(self, share_name: str) -> ConsumerSourceDataSet:
         """
         Get the ConsumerSourceDataset from the Share name
@@ -657,10 +825,12 @@ class DatashareService:
             for item in consumer_source_datashare_list:
                 consumer_source_datashare = item
                 return consumer_source_datashare
-        except Exception:
+        except Exception as ex:
+            raise_if_throttled(ex)
             consumer_source_datashare = None
         return consumer_source_datashare
 
+    @coalesced("create_datashare_mapping")
     def create_datashare_mapping(
         self,
         share_name: str,
@@ -682,6 +852,7 @@ class DatashareService:
                 self.resource_group_name, self.account_name, share_name, name
             )
         except Exception as ex:
+            raise_if_throttled(ex)
             datashare_mapping = None
             if ex.status_code == 404:
 
@@ -702,45 +873,120 @@ class DatashareService:
                 )
         return datashare_mapping
 
+    @coalesced("launch_synchronize")
     def launch_synchronize(self, share_name: str) -> ShareSubscriptionSynchronization:
         """
         Launch the synchronization to received the shared dataset
-        using the share name
+        using the share name, the LroManager tracks its poller
         """
         self.initialize()
 
         try:
-            self.datashare_client.share_subscriptions.begin_synchronize(
-                self.resource_group_name,
-                self.account_name,
-                share_name,
-                Synchronize(synchronization_mode="FullSync"),
+            get_lro_manager().start(
+                (self.get_account_scope(), "synchronize", share_name),
+                f"synchronize {share_name}",
+                lambda: self.datashare_client.share_subscriptions.begin_synchronize(
+                    self.resource_group_name,
+                    self.account_name,
+                    share_name,
+                    Synchronize(synchronization_mode="FullSync"),
+                ),
+                # The cached status is refreshed when the synchronization ends
+                lambda _: self.synchronization_poller.refresh(share_name),
+            )
+            share_subscription_synchronization = self.synchronization_poller.refresh(
+                share_name
             )
-            share_subscription_synchronization = self.get_synchronize(share_name)
         except Exception as ex:
             if ex.status_code == 409:
-                share_subscription_synchronization = self.get_synchronize(share_name)
+                share_subscription_synchronization = (
+                    self.synchronization_poller.refresh(share_name)
+                )
             else:
+                raise_if_throttled(ex)
                 share_subscription_synchronization = None
         return share_subscription_synchronization
 
     def get_synchronize(self, share_name: str) -> ShareSubscriptionSynchronization:
         """
-        Get the current synchronization for the share name
+        Get the current synchronization for the share name from the
+        synchronization poller cache
         """
         self.initialize()
 
-        try:
-            list_synchronization = (
-                self.datashare_client.share_subscriptions.list_synchronizations(
-                    self.resource_group_name, self.account_name, share_name
-                )
-            )
-            synchronization = next(list_synchronization)
+        return self.synchronization_poller.get_synchronization(share_name)
 
-        except Exception:
-            synchronization = None
-        return synchronization
+    def create_invitation_response(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        invitation: Invitation,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+    ) -> ShareResponse:
+        """
+        Create the ShareResponse of the invitation
+        """
+        return self.create_share_response(
+            provider_node_id=provider_node_id,
+            consumer_node_id=consumer_node_id,
+            invitation_id=invitation.invitation_id,
+            invitation_name=invitation.name,
+            datashare_storage_resource_group_name=datashare_storage_resource_group_name,
+            datashare_storage_account_name=datashare_storage_account_name,
+            datashare_storage_container_name=datashare_storage_container_name,
+            datashare_storage_folder_path=datashare_storage_folder_path,
+            datashare_storage_file_name=datashare_storage_file_name,
+            invitation_status=invitation.invitation_status,
+            invitation_date=invitation.sent_at,
+            error_code=DatashareServiceError.NO_ERROR,
+            error_message="",
+        )
+
+    def create_synchronization_response(
+        self,
+        provider_node_id: str,
+        consumer_node_id: str,
+        invitation_id: str,
+        datashare_storage_resource_group_name: str,
+        datashare_storage_account_name: str,
+        datashare_storage_container_name: str,
+        datashare_storage_folder_path: str,
+        datashare_storage_file_name: str,
+        synchronization: ShareSubscriptionSynchronization,
+    ) -> ConsumeResponse:
+        """
+        Create the ConsumeResponse of the synchronization
+        """
+        return self.create_consume_response(
+            provider_node_id=provider_node_id,
+            consumer_node_id=consumer_node_id,
+            invitation_id=invitation_id,
+            datashare_storage_resource_group_name=datashare_storage_resource_group_name,
+            datashare_storage_account_name=datashare_storage_account_name,
+            datashare_storage_container_name=datashare_storage_container_name,
+            datashare_storage_folder_path=datashare_storage_folder_path,
+            datashare_storage_file_name=datashare_storage_file_name,
+            status=synchronization.status,
+            status_start_date=datetime.min
+            if synchronization.start_time is None
+            else synchronization.start_time,
+            status_end_date=datetime.min
+            if synchronization.end_time is None
+            else synchronization.end_time,
+            status_duration_in_ms=0
+            if synchronization.duration_ms is None
+            else synchronization.duration_ms,
+            error_code=DatashareServiceError.NO_ERROR
+            if synchronization.message is None
+            else DatashareServiceError.SYNCHRONIZATION_ERROR,
+            error_message=""
+            if synchronization.message is None
+            else synchronization.message,
+        )
 
     def create_share_response(
         self,
@@ -769,6 +1015,9 @@ class DatashareService:
             date=datetime.utcnow(),
         )
 
+        invitation_status = INVITATION_STATUSES.get(
+            invitation_status, invitation_status
+        )
         if invitation_status == Status.FAILED or invitation_status == Status.SUCCEEDED:
             status = StatusDetails(
                 status=invitation_status,
@@ -0,0 +1,59 @@
+import random
+from typing import Union
+
+
+class HeartbeatScheduler:
+    """
+    Class used to compute the delay before the next registration of the
+    share node in the registry:
+    - the first registration is delayed by a random part of the period so
+      that the nodes restarted together do not register together,
+    - after a successful registration, the node waits the interval
+      suggested by the registry, or the refresh period reduced by a random
+      jitter if the registry did not suggest any interval,
+    - while the registration fails, the delay grows exponentially, with a
+      random jitter, up to max_backoff.
+    """
+
+    def __init__(
+        self,
+        refresh_period: float,
+        jitter: float = 0.2,
+        min_backoff: Union[float, None] = None,
+        max_backoff: Union[float, None] = None,
+        seed: Union[int, None] = None,
+    ) -> None:
+        """Initialize the scheduler with the refresh period in seconds"""
+        self.refresh_period = refresh_period
+        self.jitter = jitter
+        self.min_backoff = (
+            min_backoff if min_backoff is not None else max(1.0, refresh_period / 8)
+        )
+        self.max_backoff = (
+            max_backoff if max_backoff is not None else 2.0 * refresh_period
+        )
+        self.random = random.Random(seed)
+        self.failures = 0
+
+    def get_initial_delay(self) -> float:
+        """Return the delay before the first registration"""
+        return self.random.uniform(0, self.refresh_period * self.jitter)
+
+    def get_next_delay(
+        self, success: bool, suggested_delay: Union[float, None] = None
+    ) -> float:
+        """
+        Return the delay before the next registration according to the
+        result of the latest registration and the delay suggested by
+        the registry
+        """
+        if not success:
+            self.failures += 1
+            backoff = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+            # Equal jitter: keep half of the backoff, randomize the rest
+            return backoff / 2 + self.random.uniform(0, backoff / 2)
+        self.failures = 0
+        if suggested_delay is not None and suggested_delay > 0:
+            # The registry already spreads the nodes, spread within the second
+            return suggested_delay + self.random.uniform(0, 1)
+        return self.refresh_period * (1 - self.random.uniform(0, self.jitter))
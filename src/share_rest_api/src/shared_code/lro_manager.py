@@ -0,0 +1,233 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple, Union
+
+from azure.core.polling import LROPoller
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+from shared_code.models import OperationResponse, Status
+
+
+class LongRunningOperation:
+    """Class used to track an Azure long running operation and its next step"""
+
+    def __init__(
+        self,
+        name: str,
+        poller: Union[LROPoller, None],
+        then: Union[Callable[[Any], Any], None] = None,
+    ) -> None:
+        self.name = name
+        self.poller = poller
+        self.then = then
+        self.status = Status.IN_PROGRESS
+        self.started = datetime.utcnow()
+        self.finished: Union[datetime, None] = None
+        self.result: Any = None
+        self.exception: Union[Exception, None] = None
+        self.completing = False
+        self.task: Union["asyncio.Future[None]", None] = None
+        self.done = threading.Event()
+
+    def complete(self) -> None:
+        """Read the result of the poller and run the next step"""
+        try:
+            result = self.poller.result()
+            if self.then is not None:
+                result = self.then(result)
+            self.finish(result)
+        except Exception as ex:
+            self.fail(ex)
+
+    async def complete_async(self) -> None:
+        """Await the result of the aio poller and run the async next step"""
+        try:
+            result = await self.poller.result()
+            if self.then is not None:
+                result = await self.then(result)
+            self.finish(result)
+        except Exception as ex:
+            self.fail(ex)
+
+    def finish(self, result: Any) -> None:
+        self.result = result
+        self.status = Status.SUCCEEDED
+        self.finished = datetime.utcnow()
+        self.done.set()
+
+    def fail(self, ex: Exception) -> None:
+        self.exception = ex
+        self.status = Status.FAILED
+        LogService().log_error(f"Long running operation {self.name} failed: {ex}")
+        self.finished = datetime.utcnow()
+        self.done.set()
+
+    def wait(self, timeout: Union[float, None] = None) -> Any:
+        """Wait for the operation and its next step, return the result"""
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Long running operation {self.name} in progress")
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+    def get_response(self) -> OperationResponse:
+        return OperationResponse(
+            name=self.name,
+            status=self.status,
+            started=self.started,
+            finished=self.finished,
+            error=None if self.exception is None else str(self.exception),
+        )
+
+
+class LroManager:
+    """
+    Class used to track the pollers of the Azure long running operations
+    (begin_synchronize, begin_delete) instead of dropping them.
+    A background thread checks the pollers every poll_interval seconds,
+    when an operation is done its next step (for instance the creation of
+    the share subscription after its deletion) runs in a pool of workers.
+    An operation is identified by a key: the requests starting the same
+    operation share it, and the later requests can query or wait for it.
+    The finished operations are kept retention seconds. The aio pollers
+    of the AsyncDatashareService are completed by a task of the event loop.
+    """
+
+    def __init__(
+        self, poll_interval: float = 1, retention: float = 3600, workers: int = 4
+    ) -> None:
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.condition = threading.Condition()
+        self.operations: Dict[Hashable, LongRunningOperation] = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="lro"
+        )
+        self.thread: Union[threading.Thread, None] = None
+
+    def register(
+        self, key: Hashable, name: str, then: Union[Callable[[Any], Any], None]
+    ) -> Tuple[LongRunningOperation, bool]:
+        """
+        Return the operation in progress for key and False, otherwise
+        register a new operation without poller and return it with True:
+        the caller starts it and sets its poller, the concurrent requests
+        share it meanwhile
+        """
+        with self.condition:
+            operation = self.operations.get(key)
+            if operation is not None and not operation.done.is_set():
+                return operation, False
+            operation = LongRunningOperation(name, None, then)
+            operation.completing = True
+            self.operations[key] = operation
+            return operation, True
+
+    def start(
+        self,
+        key: Hashable,
+        name: str,
+        begin: Callable[[], LROPoller],
+        then: Union[Callable[[Any], Any], None] = None,
+    ) -> LongRunningOperation:
+        """
+        Return the operation in progress for key, otherwise start the
+        operation with begin and track its poller
+        """
+        operation, registered = self.register(key, name, then)
+        if not registered:
+            return operation
+        # begin is an ARM call which may be throttled, it runs without the lock
+        try:
+            poller = begin()
+        except Exception as ex:
+            operation.fail(ex)
+            raise
+        with self.condition:
+            operation.poller = poller
+            operation.completing = False
+            self.condition.notify()
+        self.start_monitor()
+        return operation
+
+    async def start_async(
+        self,
+        key: Hashable,
+        name: str,
+        begin: Callable[[], Awaitable[Any]],
+        then: Union[Callable[[Any], Awaitable[Any]], None] = None,
+    ) -> LongRunningOperation:
+        """
+        Return the operation in progress for key, otherwise start the
+        operation with the coroutine function begin returning an aio poller
+        """
+        operation, registered = self.register(key, name, then)
+        if not registered:
+            return operation
+        try:
+            operation.poller = await begin()
+        except Exception as ex:
+            operation.fail(ex)
+            raise
+        operation.task = asyncio.ensure_future(operation.complete_async())
+        self.start_monitor()
+        return operation
+
+    def get(self, key: Hashable) -> Union[LongRunningOperation, None]:
+        with self.condition:
+            return self.operations.get(key)
+
+    def check_operations(self) -> None:
+        """Complete the operations whose poller is done"""
+        now = datetime.utcnow()
+        with self.condition:
+            for key, operation in list(self.operations.items()):
+                if operation.finished is not None:
+                    if (now - operation.finished).total_seconds() > self.retention:
+                        del self.operations[key]
+                elif not operation.completing and operation.poller.done():
+                    operation.completing = True
+                    self.executor.submit(operation.complete)
+
+    def get_responses(self) -> List[OperationResponse]:
+        with self.condition:
+            operations = list(self.operations.values())
+        return [operation.get_response() for operation in operations]
+
+    def monitor_loop(self) -> None:
+        while True:
+            try:
+                self.check_operations()
+            except Exception as ex:
+                LogService().log_error(f"EXCEPTION in lro monitor_loop: {ex}")
+            with self.condition:
+                self.condition.wait(self.poll_interval)
+
+    def start_monitor(self) -> None:
+        """Start the background thread"""
+        if self.thread is None:
+            with self.condition:
+                if self.thread is None:
+                    self.thread = threading.Thread(
+                        target=self.monitor_loop, daemon=True
+                    )
+                    self.thread.start()
+
+
+lro_manager: Union[LroManager, None] = None
+lro_manager_lock = threading.Lock()
+
+
+def get_lro_manager() -> LroManager:
+    """Getting a single instance of the LroManager"""
+    global lro_manager
+    if lro_manager is None:
+        with lro_manager_lock:
+            if lro_manager is None:
+                lro_manager = LroManager(
+                    retention=ConfigurationService().get_lro_retention()
+                )
+    return lro_manager
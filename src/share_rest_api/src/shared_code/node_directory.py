@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Union
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+from shared_code.models import Node
+
+
+class NodeEntry:
+    """Class used to store a node read from the registry, None if not found"""
+
+    def __init__(self, node: Union[Node, None], expiry: float) -> None:
+        self.node = node
+        self.expiry = expiry
+
+
+class NodeDirectory:
+    """
+    Class used to keep the nodes read from the registry with
+    GET /nodes/{node_id}: a node is returned from memory during ttl seconds,
+    then during max_stale seconds the stale node is returned while it is read
+    again from the registry in the background. A node unknown to the
+    registry (404) is remembered negative_ttl seconds.
+    """
+
+    def __init__(
+        self, ttl: float = 60, negative_ttl: float = 5, max_stale: float = 60
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_stale = max_stale
+        self.lock = threading.Lock()
+        self.entries: Dict[str, NodeEntry] = {}
+        self.revalidating: Dict[str, float] = {}
+
+    def lookup(self, node_id: str) -> Union[NodeEntry, None]:
+        """
+        Return the entry of the node if it can be used, None if the node
+        must be read from the registry. When the entry is stale, the caller
+        must revalidate it if start_revalidation returns True.
+        """
+        with self.lock:
+            entry = self.entries.get(node_id)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if now < entry.expiry:
+                return entry
+            if entry.node is not None and now < entry.expiry + self.max_stale:
+                return entry
+            del self.entries[node_id]
+            return None
+
+    def is_stale(self, entry: NodeEntry) -> bool:
+        return time.monotonic() >= entry.expiry
+
+    def start_revalidation(self, node_id: str) -> bool:
+        """Return True if no revalidation of the node is in progress"""
+        with self.lock:
+            now = time.monotonic()
+            if self.revalidating.get(node_id, 0) > now:
+                return False
+            # A revalidation which never ended does not block the next one
+            self.revalidating[node_id] = now + self.ttl
+            return True
+
+    def put(self, node_id: str, node: Union[Node, None]) -> None:
+        """Store the node read from the registry, None if it was not found"""
+        ttl = self.ttl if node is not None else self.negative_ttl
+        with self.lock:
+            self.entries[node_id] = NodeEntry(node, time.monotonic() + ttl)
+            self.revalidating.pop(node_id, None)
+
+    def end_revalidation(self, node_id: str) -> None:
+        with self.lock:
+            self.revalidating.pop(node_id, None)
+
+    def invalidate(self, node_id: str) -> None:
+        """Remove the node, the next request reads it from the registry"""
+        with self.lock:
+            self.entries.pop(node_id, None)
+
+    def get(
+        self, node_id: str, fetch: Callable[[str], Union[Node, None]]
+    ) -> Union[Node, None]:
+        """
+        Return the node, read it with fetch when it is not in the directory,
+        revalidate it with fetch in a thread when it is stale
+        """
+        entry = self.lookup(node_id)
+        if entry is None:
+            node = fetch(node_id)
+            self.put(node_id, node)
+            return node
+        if self.is_stale(entry) and self.start_revalidation(node_id):
+            threading.Thread(
+                target=self.revalidate, args=(node_id, fetch), daemon=True
+            ).start()
+        return entry.node
+
+    def revalidate(
+        self, node_id: str, fetch: Callable[[str], Union[Node, None]]
+    ) -> None:
+        try:
+            self.put(node_id, fetch(node_id))
+        except Exception as ex:
+            self.end_revalidation(node_id)
+            LogService().log_warning(f"Revalidation of node {node_id} failed: {ex}")
+
+    async def get_async(
+        self, node_id: str, fetch: Callable[[str], Awaitable[Union[Node, None]]]
+    ) -> Union[Node, None]:
+        """See get, the node is read and revalidated with the coroutine fetch"""
+        entry = self.lookup(node_id)
+        if entry is None:
+            node = await fetch(node_id)
+            self.put(node_id, node)
+            return node
+        if self.is_stale(entry) and self.start_revalidation(node_id):
+            asyncio.ensure_future(self.revalidate_async(node_id, fetch))
+        return entry.node
+
+    async def revalidate_async(
+        self, node_id: str, fetch: Callable[[str], Awaitable[Union[Node, None]]]
+    ) -> None:
+        try:
+            self.put(node_id, await fetch(node_id))
+        except Exception as ex:
+            self.end_revalidation(node_id)
+            LogService().log_warning(f"Revalidation of node {node_id} failed: {ex}")
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.revalidating.clear()
+
+
+node_directory: Union[NodeDirectory, None] = None
+node_directory_lock = threading.Lock()
+
+
+def get_node_directory() -> NodeDirectory:
+    """Getting a single instance of the NodeDirectory"""
+    global node_directory
+    if node_directory is None:
+        with node_directory_lock:
+            if node_directory is None:
+                configuration_service = ConfigurationService()
+                refresh_period = configuration_service.get_refresh_period()
+                node_directory = NodeDirectory(
+                    ttl=refresh_period,
+                    negative_ttl=configuration_service.get_node_cache_negative_ttl(),
+                    max_stale=refresh_period,
+                )
+    return node_directory
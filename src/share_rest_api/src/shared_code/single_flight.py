@@ -0,0 +1,106 @@
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+
+from shared_code.configuration_service import ConfigurationService
+
+
+class Flight:
+    """Class used to store the result of an in-flight call"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.exception: Union[Exception, None] = None
+
+
+class SingleFlight:
+    """
+    Class used to coalesce the concurrent identical calls: the first thread
+    runs the call, the threads calling it with the same key meanwhile wait
+    for its result (or its exception) instead of calling Azure again.
+    The result of a status read is also kept status_ttl seconds.
+    """
+
+    def __init__(self, status_ttl: float = 1) -> None:
+        self.status_ttl = status_ttl
+        self.lock = threading.Lock()
+        self.flights: Dict[Hashable, Flight] = {}
+        self.results: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def do(
+        self, key: Hashable, function: Callable[[], Any], status_read: bool = False
+    ) -> Any:
+        """Return the result of function, shared by the concurrent calls"""
+        with self.lock:
+            if status_read and key in self.results:
+                expiry, result = self.results[key]
+                if time.monotonic() < expiry:
+                    return result
+                del self.results[key]
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+        if not leader:
+            flight.done.wait()
+            if flight.exception is not None:
+                raise flight.exception
+            return flight.result
+        try:
+            flight.result = function()
+        except Exception as ex:
+            flight.exception = ex
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                if status_read and flight.exception is None and self.status_ttl > 0:
+                    now = time.monotonic()
+                    self.results = {
+                        result_key: value
+                        for result_key, value in self.results.items()
+                        if value[0] > now
+                    }
+                    self.results[key] = (now + self.status_ttl, flight.result)
+            flight.done.set()
+        return flight.result
+
+
+single_flight: Union[SingleFlight, None] = None
+single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Getting a single instance of the SingleFlight"""
+    global single_flight
+    if single_flight is None:
+        with single_flight_lock:
+            if single_flight is None:
+                single_flight = SingleFlight(
+                    ConfigurationService().get_status_micro_cache_ttl()
+                )
+    return single_flight
+
+
+def coalesced(operation: str, status_read: bool = False) -> Callable:
+    """
+    Decorator coalescing the concurrent calls of a DatashareService method
+    with the same arguments (the names derived from the share_id) for the
+    same datashare account
+    """
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            key = (self.get_account_scope(), operation) + args
+            key += tuple(sorted(kwargs.items()))
+            return get_single_flight().do(
+                key, lambda: method(self, *args, **kwargs), status_read
+            )
+
+        return wrapper
+
+    return decorator
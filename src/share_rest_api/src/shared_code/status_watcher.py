@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Tuple, Union
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.models import Lane, Status
+from shared_code.work_scheduler import work_lane
+
+TERMINAL_STATUSES = [Status.SUCCEEDED, Status.FAILED]
+
+
+class StatusWatcher:
+    """
+    Class used to poll the status of a share or a subscription and to push
+    each status transition to all the subscribed clients.
+    The watcher stops when the status is terminal, when the poll fails or
+    when the last client unsubscribes.
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        poll: Callable[[], BaseModel],
+        interval: float,
+        on_close: Callable[[Hashable, "StatusWatcher"], None],
+    ) -> None:
+        self.key = key
+        self.poll = poll
+        self.interval = interval
+        self.on_close = on_close
+        self.subscribers: List[asyncio.Queue] = []
+        self.latest: Union[BaseModel, None] = None
+        self.task: Union[asyncio.Future, None] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return the queue receiving the events of the watcher"""
+        queue: asyncio.Queue = asyncio.Queue()
+        if self.latest is not None:
+            queue.put_nowait(("status", self.latest.json()))
+        self.subscribers.append(queue)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            # The next subscriber starts a new watcher
+            self.on_close(self.key, self)
+
+    def poll_status(self) -> BaseModel:
+        """Poll the status in the maintenance lane of the WorkScheduler"""
+        with work_lane(Lane.MAINTENANCE):
+            return self.poll()
+
+    def publish(self, event: Union[Tuple[str, str], None]) -> None:
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                try:
+                    response = await run_in_threadpool(self.poll_status)
+                except HTTPException as e:
+                    self.publish(
+                        (
+                            "error",
+                            json.dumps(
+                                {"status_code": e.status_code, "detail": e.detail}
+                            ),
+                        )
+                    )
+                    break
+                except Exception as ex:
+                    self.publish(
+                        ("error", json.dumps({"status_code": 500, "detail": str(ex)}))
+                    )
+                    break
+                status = response.status.status
+                if self.latest is None or status != self.latest.status.status:
+                    self.latest = response
+                    self.publish(("status", response.json()))
+                if status in TERMINAL_STATUSES:
+                    break
+                await asyncio.sleep(self.interval)
+        finally:
+            # None closes the event streams
+            self.publish(None)
+            self.on_close(self.key, self)
+
+
+class StatusWatcherService:
+    """
+    Class used to stream the status transitions of the shares and of the
+    subscriptions as Server-Sent Events, with a single StatusWatcher per
+    share or subscription in the worker.
+    """
+
+    def __init__(self, interval: float, keepalive: float = 15) -> None:
+        self.interval = interval
+        self.keepalive = keepalive
+        self.watchers: Dict[Hashable, StatusWatcher] = {}
+
+    def remove_watcher(self, key: Hashable, watcher: StatusWatcher) -> None:
+        if self.watchers.get(key) is watcher:
+            del self.watchers[key]
+
+    def get_watcher(
+        self, key: Hashable, poll: Callable[[], BaseModel]
+    ) -> StatusWatcher:
+        """Return the watcher associated with the key, create it if required"""
+        watcher = self.watchers.get(key)
+        if watcher is None:
+            watcher = StatusWatcher(key, poll, self.interval, self.remove_watcher)
+            self.watchers[key] = watcher
+        return watcher
+
+    def format_event(self, event: str, data: Any) -> str:
+        return f"event: {event}\ndata: {data}\n\n"
+
+    async def events(
+        self, key: Hashable, poll: Callable[[], BaseModel]
+    ) -> AsyncIterator[str]:
+        """Return the Server-Sent Events stream of the status transitions"""
+        watcher = self.get_watcher(key, poll)
+        queue = watcher.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    # Comment line keeping the connection open
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield self.format_event(*event)
+        finally:
+            watcher.unsubscribe(queue)
+
+
+status_watcher_service: Union[StatusWatcherService, None] = None
+status_watcher_service_lock = threading.Lock()
+
+
+def get_status_watcher_service() -> StatusWatcherService:
+    """Getting a single instance of the StatusWatcherService"""
+    global status_watcher_service
+    if status_watcher_service is None:
+        with status_watcher_service_lock:
+            if status_watcher_service is None:
+                status_watcher_service = StatusWatcherService(
+                    ConfigurationService().get_status_watcher_interval()
+                )
+    return status_watcher_service
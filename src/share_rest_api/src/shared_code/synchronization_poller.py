@@ -0,0 +1,200 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Union
+
+from shared_code.log_service import LogService
+
+TERMINAL_STATUSES = ["Succeeded", "Failed", "Canceled"]
+
+
+class TrackedSynchronization:
+    """Class used to store the latest status of a share subscription"""
+
+    def __init__(self, share_name: str, synchronization: Any) -> None:
+        self.share_name = share_name
+        self.synchronization = synchronization
+        self.next_poll = 0.0
+        self.expiry = 0.0
+
+
+class SynchronizationPoller:
+    """
+    Class used to poll the synchronization of the share subscriptions in
+    the background and to publish their status in a cache.
+    A single thread polls each in-flight synchronization with
+    list_synchronizations. The poll interval depends on the age of the
+    synchronization and on the expected duration (average duration of the
+    completed synchronizations): the interval shrinks when the expected end
+    approaches and grows with the age of the synchronizations running
+    longer than expected, between min_interval and max_interval.
+    The status of a completed synchronization is kept retention seconds.
+    """
+
+    def __init__(
+        self,
+        datashare_client: Any,
+        resource_group_name: str,
+        account_name: str,
+        min_interval: float = 2,
+        max_interval: float = 60,
+        retention: float = 300,
+    ) -> None:
+        self.datashare_client = datashare_client
+        self.resource_group_name = resource_group_name
+        self.account_name = account_name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retention = retention
+        self.condition = threading.Condition()
+        self.entries: Dict[str, TrackedSynchronization] = {}
+        self.expected_duration: Union[float, None] = None
+        self.poll_thread: Union[threading.Thread, None] = None
+        self.stopped = False
+
+    def is_terminal(self, synchronization: Any) -> bool:
+        return synchronization.status in TERMINAL_STATUSES
+
+    def fetch(self, share_name: str) -> Any:
+        """Get the current synchronization of the share subscription"""
+        try:
+            return next(
+                self.datashare_client.share_subscriptions.list_synchronizations(
+                    self.resource_group_name, self.account_name, share_name
+                )
+            )
+        except Exception:
+            return None
+
+    def get_age(self, synchronization: Any) -> float:
+        """Return the number of seconds since the start of the synchronization"""
+        start_time = synchronization.start_time
+        if start_time is None:
+            return 0.0
+        if start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=timezone.utc)
+        return max(0.0, (datetime.now(timezone.utc) - start_time).total_seconds())
+
+    def get_interval(self, synchronization: Any) -> float:
+        """Return the delay before the next poll of the synchronization"""
+        age = self.get_age(synchronization)
+        if self.expected_duration is not None and age < self.expected_duration:
+            interval = (self.expected_duration - age) / 2
+        else:
+            interval = age / 10
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def update(self, share_name: str, synchronization: Any) -> None:
+        """Publish the synchronization status in the cache"""
+        now = time.monotonic()
+        with self.condition:
+            entry = self.entries.get(share_name)
+            if entry is None:
+                entry = TrackedSynchronization(share_name, synchronization)
+                self.entries[share_name] = entry
+            elif (
+                entry.synchronization.status != synchronization.status
+                or entry.synchronization.synchronization_id
+                != synchronization.synchronization_id
+            ):
+                if self.is_terminal(synchronization) and synchronization.duration_ms:
+                    self.record_duration(synchronization.duration_ms / 1000)
+            entry.synchronization = synchronization
+            if self.is_terminal(synchronization):
+                entry.expiry = now + self.retention
+            else:
+                entry.next_poll = now + self.get_interval(synchronization)
+                entry.expiry = 0.0
+            self.condition.notify()
+
+    def record_duration(self, duration: float) -> None:
+        """Update the expected duration of the synchronizations"""
+        if self.expected_duration is None:
+            self.expected_duration = duration
+        else:
+            self.expected_duration = 0.8 * self.expected_duration + 0.2 * duration
+
+    def refresh(self, share_name: str) -> Any:
+        """Get the synchronization from Azure and publish it in the cache"""
+        synchronization = self.fetch(share_name)
+        if synchronization is not None:
+            self.update(share_name, synchronization)
+            self.start()
+        return synchronization
+
+    def get_cached(self, share_name: str) -> Any:
+        """Return the synchronization from the cache, None if it expired"""
+        entry = self.entries.get(share_name)
+        if entry is not None and (
+            not self.is_terminal(entry.synchronization)
+            or time.monotonic() < entry.expiry
+        ):
+            return entry.synchronization
+        return None
+
+    def get_synchronization(self, share_name: str) -> Any:
+        """Return the synchronization from the cache, get it if required"""
+        synchronization = self.get_cached(share_name)
+        if synchronization is not None:
+            return synchronization
+        return self.refresh(share_name)
+
+    def poll(self) -> float:
+        """Poll the synchronizations due, return the delay before the next poll"""
+        now = time.monotonic()
+        with self.condition:
+            for share_name, entry in list(self.entries.items()):
+                if self.is_terminal(entry.synchronization) and now >= entry.expiry:
+                    del self.entries[share_name]
+            due = [
+                entry.share_name
+                for entry in self.entries.values()
+                if not self.is_terminal(entry.synchronization)
+                and entry.next_poll <= now
+            ]
+        for share_name in due:
+            synchronization = self.fetch(share_name)
+            if synchronization is not None:
+                self.update(share_name, synchronization)
+            else:
+                with self.condition:
+                    entry = self.entries.get(share_name)
+                    if entry is not None:
+                        entry.next_poll = time.monotonic() + self.max_interval
+        with self.condition:
+            next_polls = [
+                entry.next_poll
+                for entry in self.entries.values()
+                if not self.is_terminal(entry.synchronization)
+            ]
+        if not next_polls:
+            return self.max_interval
+        return max(0.0, min(next_polls) - time.monotonic())
+
+    def poll_loop(self) -> None:
+        while not self.stopped:
+            try:
+                delay = self.poll()
+            except Exception as ex:
+                LogService().log_error(
+                    f"EXCEPTION while polling synchronizations: {ex}"
+                )
+                delay = self.max_interval
+            with self.condition:
+                if not self.stopped:
+                    self.condition.wait(delay)
+
+    def start(self) -> None:
+        """Start the background poll"""
+        if self.poll_thread is None:
+            with self.condition:
+                if self.poll_thread is None:
+                    self.poll_thread = threading.Thread(
+                        target=self.poll_loop, daemon=True
+                    )
+                    self.poll_thread.start()
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Union
+
+from pydantic import BaseModel
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.models import Status
+
+TERMINAL_STATUSES = [Status.SUCCEEDED, Status.FAILED]
+
+
+def get_status(response: Any) -> Union[str, None]:
+    """Return the status of a ShareResponse or a ConsumeResponse"""
+    if isinstance(response, dict):
+        # ShareResponse or ConsumeResponse read from json
+        status = response.get("status")
+    else:
+        status = getattr(response, "status", None)
+    if isinstance(status, dict):
+        return status.get("status")
+    if isinstance(status, BaseModel):
+        return getattr(status, "status", None)
+    return None
+
+
+class TerminalStateCache:
+    """
+    Class used to keep the responses of the finished share and consume
+    processes: once the status is Succeeded or Failed the response no longer
+    changes, and it is returned without calling the registry or Azure.
+    The cache keeps the max_size most recently used responses.
+    """
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.responses: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the final response associated with the key, None otherwise"""
+        with self.lock:
+            response = self.responses.get(key)
+            if response is not None:
+                self.responses.move_to_end(key)
+            return response
+
+    def put(self, key: Hashable, response: Any) -> None:
+        """Keep the response if its status is terminal"""
+        if get_status(response) not in TERMINAL_STATUSES:
+            return
+        with self.lock:
+            self.responses[key] = response
+            self.responses.move_to_end(key)
+            while len(self.responses) > self.max_size:
+                self.responses.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.responses.clear()
+
+
+terminal_state_cache: Union[TerminalStateCache, None] = None
+terminal_state_cache_lock = threading.Lock()
+
+
+def get_terminal_state_cache() -> TerminalStateCache:
+    """Getting a single instance of the TerminalStateCache"""
+    global terminal_state_cache
+    if terminal_state_cache is None:
+        with terminal_state_cache_lock:
+            if terminal_state_cache is None:
+                terminal_state_cache = TerminalStateCache(
+                    ConfigurationService().get_terminal_state_cache_size()
+                )
+    return terminal_state_cache
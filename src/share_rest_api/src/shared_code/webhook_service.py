@@ -0,0 +1,305 @@
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Hashable, List, Union
+from urllib.parse import urlparse
+
+import requests
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from shared_code.configuration_service import ConfigurationService
+from shared_code.log_service import LogService
+from shared_code.models import Lane, Status
+from shared_code.work_scheduler import work_lane
+
+ACTIVE_STATUSES = [Status.PENDING, Status.QUEUED, Status.IN_PROGRESS]
+
+
+class WebhookDelivery:
+    """Class used to store a webhook delivery in the outbox"""
+
+    def __init__(self, callback_url: str, event: str, body: str) -> None:
+        self.delivery_id = str(uuid.uuid4())
+        self.callback_url = callback_url
+        self.event = event
+        self.body = body
+        self.created = time.monotonic()
+        self.next_attempt = self.created
+        self.attempts = 0
+
+    def __lt__(self, other: "WebhookDelivery") -> bool:
+        return self.next_attempt < other.next_attempt
+
+
+class WatchedJob:
+    """Class used to store a share or a consume job waiting for its final status"""
+
+    def __init__(
+        self, event: str, poll: Callable[[], BaseModel], expiry: float
+    ) -> None:
+        self.event = event
+        self.poll = poll
+        self.expiry = expiry
+        self.callback_urls: List[str] = []
+
+
+class WebhookService:
+    """
+    Class used to POST the final ShareResponse or ConsumeResponse of a job
+    to its callback urls.
+    A background thread polls the watched jobs every poll_interval seconds,
+    when the status of a job is no longer Pending, Queued or InProgress
+    the response is added to a bounded outbox. Another thread delivers the
+    outbox, the body is signed with HMAC-SHA256 and the failed deliveries
+    are retried with an exponential backoff up to max_attempts times.
+    When the outbox is full, the oldest delivery is dropped.
+    The callback urls are https urls of a host of allowed_hosts, or of a
+    public host when allowed_hosts is empty. No webhook is accepted nor
+    sent without secret.
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        poll_interval: float = 10,
+        outbox_size: int = 1000,
+        max_attempts: int = 6,
+        min_backoff: float = 2,
+        max_backoff: float = 300,
+        watch_timeout: float = 86400,
+        timeout: float = 10,
+        allowed_hosts: List[str] = None,
+    ) -> None:
+        self.secret = secret
+        self.allowed_hosts = [host.lower() for host in allowed_hosts or []]
+        self.poll_interval = poll_interval
+        self.outbox_size = outbox_size
+        self.max_attempts = max_attempts
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.watch_timeout = watch_timeout
+        self.timeout = timeout
+        self.log_service = LogService()
+        self.random = random.Random()
+        self.condition = threading.Condition()
+        self.jobs: Dict[Hashable, WatchedJob] = {}
+        self.outbox: List[WebhookDelivery] = []
+        self.threads: List[threading.Thread] = []
+
+    def get_callback_url_error(self, callback_url: str) -> Union[str, None]:
+        """Return the reason why callback_url is rejected, None if it is valid"""
+        url = urlparse(callback_url)
+        if url.scheme != "https" or not url.hostname:
+            return f"Invalid callback_url '{callback_url}': https url expected"
+        if self.allowed_hosts:
+            if url.hostname.lower() not in self.allowed_hosts:
+                return f"Invalid callback_url '{callback_url}': host not allowed"
+            return None
+        try:
+            addresses = {
+                info[4][0] for info in socket.getaddrinfo(url.hostname, url.port or 443)
+            }
+        except (socket.gaierror, UnicodeError, ValueError):
+            return f"Invalid callback_url '{callback_url}': unknown host"
+        for address in addresses:
+            if not ipaddress.ip_address(address.split("%")[0]).is_global:
+                return f"Invalid callback_url '{callback_url}': private host"
+        return None
+
+    def check_callback_url(self, callback_url: str) -> None:
+        """Raise an HTTPException 400 if no webhook can be sent to callback_url"""
+        if not self.secret:
+            raise HTTPException(
+                status_code=400,
+                detail="callback_url not supported: WEBHOOK_SECRET is not set",
+            )
+        error = self.get_callback_url_error(callback_url)
+        if error is not None:
+            raise HTTPException(status_code=400, detail=error)
+
+    def watch(
+        self,
+        key: Hashable,
+        event: str,
+        poll: Callable[[], BaseModel],
+        callback_url: str,
+    ) -> None:
+        """Send the final response of the job to callback_url"""
+        with self.condition:
+            job = self.jobs.get(key)
+            if job is None:
+                job = WatchedJob(event, poll, time.monotonic() + self.watch_timeout)
+                self.jobs[key] = job
+            if callback_url not in job.callback_urls:
+                job.callback_urls.append(callback_url)
+        self.start()
+
+    def check_jobs(self) -> None:
+        """Add the final response of the completed jobs to the outbox"""
+        with self.condition:
+            jobs = list(self.jobs.items())
+        for key, job in jobs:
+            try:
+                with work_lane(Lane.MAINTENANCE):
+                    response = job.poll()
+            except Exception as ex:
+                if time.monotonic() < job.expiry:
+                    continue
+                self.log_service.log_error(f"Webhook {job.event} abandoned: {ex}")
+                response = None
+            if response is not None and response.status.status in ACTIVE_STATUSES:
+                if time.monotonic() < job.expiry:
+                    continue
+                self.log_service.log_error(f"Webhook {job.event} expired")
+                response = None
+            with self.condition:
+                self.jobs.pop(key, None)
+            if response is not None:
+                for callback_url in job.callback_urls:
+                    self.enqueue(
+                        WebhookDelivery(callback_url, job.event, response.json())
+                    )
+
+    def enqueue(self, delivery: WebhookDelivery) -> None:
+        """Add the delivery to the outbox, drop the oldest one if it is full"""
+        with self.condition:
+            if len(self.outbox) >= self.outbox_size:
+                oldest = min(self.outbox, key=lambda item: item.created)
+                self.outbox.remove(oldest)
+                heapq.heapify(self.outbox)
+                self.log_service.log_error(
+                    f"Webhook outbox full, delivery {oldest.delivery_id} to\
+ {oldest.callback_url} dropped"
+                )
+            heapq.heappush(self.outbox, delivery)
+            self.condition.notify()
+
+    def sign(self, timestamp: str, body: str) -> str:
+        """Return the HMAC-SHA256 signature of the timestamp and the body"""
+        return hmac.new(
+            self.secret.encode(), f"{timestamp}.{body}".encode(), hashlib.sha256
+        ).hexdigest()
+
+    def deliver(self, delivery: WebhookDelivery) -> Union[bool, None]:
+        """
+        POST the delivery, return True if it is delivered, False if it must
+        be retried and None if the callback url rejected it
+        """
+        # The host may resolve to another address since the request
+        error = self.get_callback_url_error(delivery.callback_url)
+        if not self.secret or error is not None:
+            self.log_service.log_error(
+                f"Webhook delivery {delivery.delivery_id} rejected:\
+ {error or 'WEBHOOK_SECRET is not set'}"
+            )
+            return None
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Id": delivery.delivery_id,
+            "X-Webhook-Event": delivery.event,
+            "X-Webhook-Timestamp": timestamp,
+            "X-Webhook-Signature": f"sha256={self.sign(timestamp, delivery.body)}",
+        }
+        try:
+            response = requests.post(
+                url=delivery.callback_url,
+                data=delivery.body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=False,
+            )
+        except Exception as ex:
+            self.log_service.log_warning(
+                f"Webhook delivery {delivery.delivery_id} failed: {ex}"
+            )
+            return False
+        if 200 <= response.status_code < 300:
+            return True
+        if response.status_code in [408, 429] or response.status_code >= 500:
+            return False
+        return None
+
+    def get_backoff(self, attempts: int) -> float:
+        """Exponential backoff with equal jitter"""
+        backoff = min(self.max_backoff, self.min_backoff * 2 ** (attempts - 1))
+        return backoff / 2 + self.random.uniform(0, backoff / 2)
+
+    def deliver_next(self) -> float:
+        """Deliver the next due delivery, return the delay before the next one"""
+        with self.condition:
+            if not self.outbox:
+                return self.poll_interval
+            delay = self.outbox[0].next_attempt - time.monotonic()
+            if delay > 0:
+                return delay
+            delivery = heapq.heappop(self.outbox)
+        result = self.deliver(delivery)
+        delivery.attempts += 1
+        if result is False and delivery.attempts < self.max_attempts:
+            delivery.next_attempt = time.monotonic() + self.get_backoff(
+                delivery.attempts
+            )
+            with self.condition:
+                heapq.heappush(self.outbox, delivery)
+        elif result is not True:
+            self.log_service.log_error(
+                f"Webhook delivery {delivery.delivery_id} to\
+ {delivery.callback_url} abandoned after {delivery.attempts} attempts"
+            )
+        return 0
+
+    def watch_loop(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_jobs()
+            except Exception as ex:
+                self.log_service.log_error(f"EXCEPTION in webhook watch_loop: {ex}")
+
+    def delivery_loop(self) -> None:
+        while True:
+            delay = self.deliver_next()
+            if delay > 0:
+                with self.condition:
+                    self.condition.wait(delay)
+
+    def start(self) -> None:
+        """Start the background threads"""
+        if not self.threads:
+            with self.condition:
+                if not self.threads:
+                    self.threads = [
+                        threading.Thread(target=self.watch_loop, daemon=True),
+                        threading.Thread(target=self.delivery_loop, daemon=True),
+                    ]
+                    for thread in self.threads:
+                        thread.start()
+
+
+webhook_service: Union[WebhookService, None] = None
+webhook_service_lock = threading.Lock()
+
+
+def get_webhook_service() -> WebhookService:
+    """Getting a single instance of the WebhookService"""
+    global webhook_service
+    if webhook_service is None:
+        with webhook_service_lock:
+            if webhook_service is None:
+                configuration_service = ConfigurationService()
+                webhook_service = WebhookService(
+                    configuration_service.get_webhook_secret(),
+                    configuration_service.get_webhook_poll_interval(),
+                    configuration_service.get_webhook_outbox_size(),
+                    configuration_service.get_webhook_max_attempts(),
+                    allowed_hosts=configuration_service.get_webhook_allowed_hosts(),
+                )
+    return webhook_service
@@ -8,7 +8,9 @@ from fastapi.testclient import TestClient
 from shared_code.app import app as application
 from shared_code.configuration_service import ConfigurationService
 from shared_code.datashare_service import DatashareService
+from shared_code.node_directory import get_node_directory
 from shared_code.share_service import ShareService
+from shared_code.terminal_state_cache import get_terminal_state_cache
 
 os.environ["AZURE_TENANT_ID"] = "02020202-0000-0000-0000-020202020202"
 os.environ["AZURE_SUBSCRIPTION_ID"] = "03030303-0000-0000-0000-030303030303"
@@ -40,6 +42,8 @@ os.environ["DATASHARE_STORAGE_SHARE_FOLDER_FORMAT"] = "share/{node_id}/dataset-{
 @pytest.fixture
 def app() -> FastAPI:
     application.dependency_overrides = {}
+    get_terminal_state_cache().clear()
+    get_node_directory().clear()
     return application
 
 
@@ -69,9 +73,10 @@ def datashare_service():
 
 
 class MinimalResponse(object):  # Not for production use
-    def __init__(self, requests_resp=None, status_code=None, text=None):
+    def __init__(self, requests_resp=None, status_code=None, text=None, headers=None):
         self.status_code = status_code or requests_resp.status_code
         self.text = text or requests_resp.text
+        self.headers = headers or {}
         self._raw_resp = requests_resp
 
     def raise_for_status(self):
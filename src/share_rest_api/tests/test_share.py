@@ -1,19 +1,69 @@
-from datetime import datetime
-from unittest.mock import patch
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import HttpResponseError
+from azure.core.pipeline import Pipeline
+from azure.core.pipeline.transport import HttpRequest, HttpResponse, HttpTransport
+from azure.identity import EnvironmentCredential
+from azure.mgmt.datashare.models import Invitation
+from cryptography.fernet import Fernet
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+from shared_code.arm_throttling import (
+    ArmRateLimitPolicy,
+    ArmRetryPolicy,
+    ArmThrottle,
+)
+from shared_code.app import get_async_share_service
+from shared_code.async_datashare_service import AsyncDatashareService
+from shared_code.async_share_service import (
+    AsyncShareService,
+    get_async_datashare_service,
+)
+from shared_code.credential_service import CredentialType, FastPathCredential
+from shared_code.datashare_client_pool import DatashareClientPool
+from shared_code.datashare_service import DatashareService
+from shared_code.heartbeat_scheduler import HeartbeatScheduler
+from shared_code.http_client import AsyncHttpClient, HttpClient
+from shared_code.invitation_index import InvitationIndex
+from shared_code.job_service import JobService, JobStore, get_job_service
+from shared_code.leader_election import LeaderElection, PeriodicJobService
+from shared_code.lro_manager import LroManager
 from shared_code.models import (
     ConsumeResponse,
     Dataset,
     Error,
+    Lane,
     Node,
     ShareNode,
     ShareRequest,
     ShareResponse,
+    Status,
     StatusDetails,
 )
+from shared_code.node_directory import NodeDirectory, get_node_directory
+from shared_code.provisioning_cache import ProvisioningCache
+from shared_code.share_service import ShareService
+from shared_code.single_flight import SingleFlight
+from shared_code.status_watcher import StatusWatcherService, get_status_watcher_service
+from shared_code.synchronization_poller import SynchronizationPoller
+from shared_code.terminal_state_cache import TerminalStateCache
+from shared_code.token_cache import (
+    AsyncCachedTokenCredential,
+    CachedTokenCredential,
+    PersistentTokenCache,
+)
+from shared_code.webhook_service import WebhookDelivery, WebhookService
+from shared_code.work_scheduler import WorkScheduler, get_work_scheduler
 
 from .conftest import MinimalResponse
 
@@ -41,7 +91,7 @@ def test_time(client: TestClient):
 def test_create_share(
     client: TestClient, initialize_return, initialize_azure_clients_return, status_code
 ):
-    with patch("requests.get") as mock_requests_get, patch(
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
         "shared_code.datashare_service.DatashareService.initialize_azure_clients"
     ) as mock_initialize_azure_clients, patch(
         "shared_code.datashare_service.DatashareService.initialize"
@@ -102,7 +152,7 @@ def test_create_share(
 def test_get_share(
     client: TestClient, initialize_return, initialize_azure_clients_return, status_code
 ):
-    with patch("requests.get") as mock_requests_get, patch(
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
         "shared_code.datashare_service.DatashareService.initialize_azure_clients"
     ) as mock_initialize_azure_clients, patch(
         "shared_code.datashare_service.DatashareService.initialize"
@@ -169,7 +219,7 @@ def test_get_share(
 def test_get_consume(
     client: TestClient, initialize_return, initialize_azure_clients_return, status_code
 ):
-    with patch("requests.get") as mock_requests_get, patch(
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
         "shared_code.datashare_service.DatashareService.initialize_azure_clients"
     ) as mock_initialize_azure_clients, patch(
         "shared_code.datashare_service.DatashareService.initialize"
@@ -231,7 +281,7 @@ def test_get_consume(
 def test_shareconsume(
     client: TestClient, initialize_return, initialize_azure_clients_return, status_code
 ):
-    with patch("requests.get") as mock_requests_get, patch(
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
         "shared_code.datashare_service.DatashareService.initialize_azure_clients"
     ) as mock_initialize_azure_clients, patch(
         "shared_code.datashare_service.DatashareService.initialize"
@@ -290,7 +340,7 @@ def test_shareconsume(
     [(False, 200), (True, 500)],
 )
 def test_get_shareconsume(client: TestClient, create_error, status_code):
-    with patch("requests.get") as mock_requests_get:
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get:
         dataset = Dataset(
             resource_group_name="testrg",
             storage_account_name="testsa",
@@ -344,7 +394,7 @@ def test_get_shareconsume(client: TestClient, create_error, status_code):
 def test_consumeshare(
     client: TestClient, initialize_return, initialize_azure_clients_return, status_code
 ):
-    with patch("requests.get") as mock_requests_get, patch(
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
         "shared_code.datashare_service.DatashareService.initialize_azure_clients"
     ) as mock_initialize_azure_clients, patch(
         "shared_code.datashare_service.DatashareService.initialize"
@@ -401,7 +451,7 @@ def test_consumeshare(
 
 
 def test_register_node(share_service):
-    with patch("requests.post") as mock_requests_post, patch(
+    with patch("shared_code.http_client.HttpClient.post") as mock_requests_post, patch(
         "shared_code.datashare_service.DatashareService.initialize_azure_clients"
     ) as mock_initialize_azure_clients, patch(
         "shared_code.datashare_service.DatashareService.initialize"
@@ -420,3 +470,1339 @@ def test_register_node(share_service):
         mock_initialize_azure_clients.return_value = True
         result = share_service.register_share_node()
         assert result is True
+
+
+def test_register_node_heartbeat(share_service):
+    with patch("shared_code.http_client.HttpClient.post") as mock_requests_post, patch(
+        "shared_code.http_client.HttpClient.put"
+    ) as mock_requests_put:
+        node = ShareNode(
+            node_id="testa",
+            tenant_id="00000000-0000-0000-000000000000",
+            identity="00000000-0000-0000-000000000000",
+            url="http://127.0.0.1/",
+            name="testa",
+        )
+        mock_requests_post.return_value = MinimalResponse(
+            status_code=200,
+            text=node.json(),
+            headers={"ETag": '"etag"', "X-Next-Heartbeat": "40"},
+        )
+        mock_requests_put.return_value = MinimalResponse(status_code=200, text="{}")
+        assert share_service.register_share_node() is True
+        assert mock_requests_post.call_count == 1
+        assert mock_requests_put.call_count == 0
+        assert share_service.next_heartbeat == 40
+
+        # Metadata did not change: heartbeat only
+        assert share_service.register_share_node() is True
+        assert mock_requests_post.call_count == 1
+        assert mock_requests_put.call_count == 1
+        assert mock_requests_put.call_args.kwargs["headers"]["If-Match"] == '"etag"'
+
+        # The registry lost the node metadata: full registration
+        mock_requests_put.return_value = MinimalResponse(status_code=412, text="{}")
+        assert share_service.register_share_node() is True
+        assert mock_requests_post.call_count == 2
+
+
+def test_heartbeat_scheduler():
+    scheduler = HeartbeatScheduler(60, seed=0)
+    assert 0 <= scheduler.get_initial_delay() <= 12
+    for _ in range(10):
+        assert 48 <= scheduler.get_next_delay(True) <= 60
+        assert 40 <= scheduler.get_next_delay(True, 40) <= 41
+
+    # Exponential backoff with jitter while the registration fails
+    backoffs = [7.5, 15, 30, 60, 120, 120]
+    for backoff in backoffs:
+        assert backoff / 2 <= scheduler.get_next_delay(False) <= backoff
+    assert 48 <= scheduler.get_next_delay(True) <= 60
+    assert 3.75 <= scheduler.get_next_delay(False) <= 7.5
+
+
+def test_periodic_job_service_delay(tmp_path):
+    delays = []
+
+    def heartbeat_task():
+        delays.append(0.05 if len(delays) % 2 else 0.01)
+        return delays[-1]
+
+    async def run_workers():
+        service_a = PeriodicJobService(LeaderElection(str(tmp_path)), 0.01)
+        service_b = PeriodicJobService(LeaderElection(str(tmp_path)), 0.01)
+        service_a.add_job("register_share_node", heartbeat_task, 60)
+        service_b.add_job("register_share_node", heartbeat_task, 60)
+        service_a.start()
+        service_b.start()
+        await asyncio.sleep(0.2)
+        service_a.stop()
+        service_b.stop()
+
+    asyncio.run(run_workers())
+    # The delay returned by the job is used instead of the 60 seconds interval
+    assert 4 <= len(delays) <= 8
+
+
+def test_datashare_client_pool():
+    with patch(
+        "shared_code.datashare_client_pool.create_credential"
+    ) as mock_credential, patch(
+        "shared_code.datashare_client_pool.DataShareManagementClient"
+    ) as mock_client:
+        mock_client.return_value.accounts.get.return_value.location = "westus"
+        pool = DatashareClientPool(metadata_ttl=3600)
+        client = pool.get("sub", "testrg", "testds")
+        assert pool.get("sub", "testrg", "testds") is client
+        assert pool.get("sub", "testrg", "otherds") is not client
+
+        # Lazy initialization, then reuse of the client and of the account
+        assert mock_client.call_count == 0
+        for _ in range(3):
+            assert client.get_client() is mock_client.return_value
+            assert client.get_account().location == "westus"
+        assert mock_credential.call_count == 1
+        assert mock_client.call_count == 1
+        assert mock_client.return_value.accounts.get.call_count == 1
+
+        # The account metadata is read again when it expired
+        client.account_expiry = 0
+        assert client.get_account().location == "westus"
+        assert mock_client.return_value.accounts.get.call_count == 2
+        assert mock_client.call_count == 1
+
+
+class CountingCredential:
+    def __init__(self, lifetime=3600):
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        return AccessToken(f"token{self.calls}", int(time.time()) + self.lifetime)
+
+
+def test_cached_token_credential(tmp_path):
+    scope = "https://management.azure.com/.default"
+    path = str(tmp_path / "token_cache.bin")
+    credential = CountingCredential()
+    worker_a = CachedTokenCredential(credential, PersistentTokenCache(path))
+    worker_b = CachedTokenCredential(credential, PersistentTokenCache(path))
+    assert worker_a.get_token(scope).token == "token1"
+    assert worker_a.get_token(scope).token == "token1"
+    # Another worker or a restarted worker reads the token from the cache
+    assert worker_b.get_token(scope).token == "token1"
+    assert credential.calls == 1
+    with open(path, "rb") as file:
+        assert b"token1" not in file.read()
+
+    # A token expiring within the refresh margin is renewed
+    short_credential = CountingCredential(lifetime=60)
+    worker_c = CachedTokenCredential(
+        short_credential, PersistentTokenCache(str(tmp_path / "short.bin"))
+    )
+    assert worker_c.get_token(scope).token == "token1"
+    assert worker_c.refresh((scope,)).token == "token2"
+
+    # A cache encrypted with another key is ignored
+    other_key = Fernet.generate_key().decode()
+    worker_d = CachedTokenCredential(credential, PersistentTokenCache(path, other_key))
+    assert worker_d.get_token(scope).token == "token2"
+    for worker in [worker_a, worker_b, worker_c, worker_d]:
+        worker.close()
+
+
+def test_fast_path_credential(tmp_path):
+    path = str(tmp_path / "credential_type")
+    with patch("shared_code.credential_service.DefaultAzureCredential") as mock_default:
+        mock_default.return_value.get_token.return_value = AccessToken("token", 0)
+        mock_default.return_value._successful_credential = EnvironmentCredential()
+        credential = FastPathCredential(path)
+        assert credential.credential_type == CredentialType.DEFAULT
+        assert credential.get_token("scope").token == "token"
+
+        # The next start creates the recorded credential directly
+        credential = FastPathCredential(path)
+        assert credential.credential_type == CredentialType.ENVIRONMENT
+        assert isinstance(credential.credential, EnvironmentCredential)
+        assert mock_default.call_count == 1
+
+        # The recorded credential is unavailable: back to the default chain
+        assert credential.get_token("scope").token == "token"
+        assert credential.credential_type == CredentialType.DEFAULT
+        assert mock_default.call_count == 2
+
+        # AZURE_CREDENTIAL_TYPE overrides the record
+        credential = FastPathCredential(path, CredentialType.AZURE_CLI)
+        assert credential.credential_type == CredentialType.AZURE_CLI
+
+
+def test_invitation_index():
+    def create_invitation(invitation_id):
+        invitation = MagicMock()
+        invitation.invitation_id = invitation_id
+        return invitation
+
+    pages = [[create_invitation("inv3")], [create_invitation("inv2")]]
+    client = MagicMock()
+    client.consumer_invitations.list_invitations.return_value.by_page.side_effect = (
+        lambda: iter(pages)
+    )
+    client.consumer_invitations.get.side_effect = Exception("NotFound")
+    index = InvitationIndex(client, "westus", refresh_period=3600)
+    assert index.is_empty() is False
+    for _ in range(3):
+        assert index.contains("inv2") is True
+        assert index.contains("inv3") is True
+    assert client.consumer_invitations.list_invitations.call_count == 1
+    assert client.consumer_invitations.get.call_count == 0
+
+    # Miss: direct read of the invitation
+    assert index.contains("inv4") is False
+    assert client.consumer_invitations.get.call_count == 1
+    client.consumer_invitations.get.side_effect = None
+    client.consumer_invitations.get.return_value = create_invitation("inv4")
+    assert index.contains("inv4") is True
+    assert index.contains("inv4") is True
+    assert client.consumer_invitations.get.call_count == 2
+
+    # Incremental refresh: stop at the first page already indexed
+    pages.insert(0, [create_invitation("inv5")])
+    consumed = []
+    pages_iterator = iter(pages)
+
+    def by_page():
+        for page in pages_iterator:
+            consumed.append(page)
+            yield page
+
+    client.consumer_invitations.list_invitations.return_value.by_page.side_effect = (
+        by_page
+    )
+    index.refresh()
+    assert "inv5" in index.invitations
+    assert len(consumed) == 2
+    index.stop()
+
+
+def test_synchronization_poller():
+    def create_synchronization(status, age=10, duration_ms=None):
+        synchronization = MagicMock()
+        synchronization.status = status
+        synchronization.synchronization_id = "sync1"
+        synchronization.start_time = datetime.now(timezone.utc) - timedelta(seconds=age)
+        synchronization.duration_ms = duration_ms
+        return synchronization
+
+    client = MagicMock()
+    in_progress = create_synchronization("InProgress")
+    client.share_subscriptions.list_synchronizations.side_effect = lambda *args: iter(
+        [in_progress]
+    )
+    poller = SynchronizationPoller(client, "testrg", "testds", 2, 60)
+    poller.start = MagicMock()
+    for _ in range(3):
+        synchronization = poller.get_synchronization("consume-share")
+        assert synchronization.status == "InProgress"
+    assert client.share_subscriptions.list_synchronizations.call_count == 1
+
+    # The background poll publishes the new status
+    succeeded = create_synchronization("Succeeded", duration_ms=100000)
+    client.share_subscriptions.list_synchronizations.side_effect = lambda *args: iter(
+        [succeeded]
+    )
+    poller.entries["consume-share"].next_poll = 0
+    assert poller.poll() == 60
+    assert poller.get_synchronization("consume-share").status == "Succeeded"
+    assert poller.expected_duration == 100
+
+    # Adaptive poll interval
+    interval = poller.get_interval(create_synchronization("InProgress", age=10))
+    assert interval == pytest.approx(45, abs=0.1)
+    interval = poller.get_interval(create_synchronization("InProgress", age=200))
+    assert interval == pytest.approx(20, abs=0.1)
+    poller.expected_duration = None
+    assert poller.get_interval(create_synchronization("InProgress", age=5)) == 2
+    assert poller.get_interval(create_synchronization("InProgress", age=9000)) == 60
+
+
+def create_consume_response(status):
+    return ConsumeResponse(
+        invitation_id="00000000-0000-0000-000000000000",
+        provider_node_id="testa",
+        consumer_node_id="testb",
+        dataset=Dataset(
+            resource_group_name="testrg",
+            storage_account_name="testsa",
+            container_name="testc",
+            folder_path="testfolder",
+            file_name="testfile",
+        ),
+        status=StatusDetails(
+            status=status, start=datetime.utcnow(), end=datetime.utcnow(), duration=0
+        ),
+        error=Error(
+            code=0, message="", source="share_rest_api", date=datetime.utcnow()
+        ),
+    )
+
+
+def test_consume_events(app, client: TestClient):
+    app.dependency_overrides[get_status_watcher_service] = lambda: (
+        StatusWatcherService(interval=0)
+    )
+    with patch("shared_code.share_service.ShareService.consume") as mock_consume:
+        mock_consume.side_effect = [
+            create_consume_response(status)
+            for status in ["Queued", "InProgress", "InProgress", "Succeeded"]
+        ]
+        response = client.get(
+            url="/consume/events",
+            params={
+                "provider_node_id": "testa",
+                "consumer_node_id": "testb",
+                "invitation_id": "00000000-0000-0000-000000000000",
+            },
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line[len("data: ") :])["status"]["status"]
+            for line in response.text.splitlines()
+            if line.startswith("data: ")
+        ]
+        assert events == ["Queued", "InProgress", "Succeeded"]
+        assert mock_consume.call_count == 4
+
+
+def test_consume_events_read_only(app, client: TestClient):
+    app.dependency_overrides[get_status_watcher_service] = lambda: (
+        StatusWatcherService(interval=0)
+    )
+    with patch.object(DatashareService, "initialize"), patch.object(
+        DatashareService, "get_synchronize", return_value=None
+    ), patch.object(
+        DatashareService, "is_invitations_list_empty", return_value=False
+    ), patch.object(
+        DatashareService, "is_invitation_received", return_value=True
+    ), patch.object(
+        DatashareService, "create_share_subscription"
+    ) as mock_create_share_subscription, patch.object(
+        DatashareService, "launch_synchronize"
+    ) as mock_launch_synchronize:
+        response = client.get(
+            url="/consume/events",
+            params={
+                "provider_node_id": "testa",
+                "consumer_node_id": "testb",
+                "invitation_id": "11111111-1111-1111-111111111111",
+            },
+        )
+        assert response.status_code == 200
+        # No subscription: the stream ends with an error event
+        assert "event: error" in response.text
+        assert mock_create_share_subscription.call_count == 0
+        assert mock_launch_synchronize.call_count == 0
+
+
+def test_status_watcher_shared_by_clients():
+    polls = []
+
+    def poll():
+        polls.append(1)
+        return create_consume_response("Succeeded" if len(polls) >= 3 else "Queued")
+
+    async def read_events(status_watcher_service):
+        return [
+            event
+            async for event in status_watcher_service.events(("consume", "a"), poll)
+        ]
+
+    async def run_clients():
+        status_watcher_service = StatusWatcherService(interval=0.01)
+        results = await asyncio.gather(
+            *[read_events(status_watcher_service) for _ in range(5)]
+        )
+        assert status_watcher_service.watchers == {}
+        return results
+
+    results = asyncio.run(run_clients())
+    assert len(polls) == 3
+    for events in results:
+        assert len(events) == 2
+        assert events[-1].startswith("event: status")
+
+
+def test_webhook_delivery():
+    webhook_service = WebhookService(
+        "secret", min_backoff=0, max_attempts=3, allowed_hosts=["callback"]
+    )
+    polls = []
+
+    def poll():
+        polls.append(1)
+        return create_consume_response("Succeeded" if len(polls) >= 2 else "Queued")
+
+    with patch.object(webhook_service, "start"):
+        webhook_service.watch(("consume", "a"), "consume", poll, "https://callback")
+        webhook_service.watch(("consume", "a"), "consume", poll, "https://callback")
+    webhook_service.check_jobs()
+    assert webhook_service.outbox == []
+    webhook_service.check_jobs()
+    assert webhook_service.jobs == {}
+    assert len(webhook_service.outbox) == 1
+
+    with patch("shared_code.webhook_service.requests.post") as mock_post:
+        # Retried on 503, delivered on 200
+        mock_post.side_effect = [
+            MinimalResponse(status_code=503, text="{}"),
+            MinimalResponse(status_code=200, text="{}"),
+        ]
+        assert webhook_service.deliver_next() == 0
+        assert len(webhook_service.outbox) == 1
+        assert webhook_service.deliver_next() == 0
+        assert webhook_service.outbox == []
+        headers = mock_post.call_args.kwargs["headers"]
+        body = mock_post.call_args.kwargs["data"]
+        assert json.loads(body)["status"]["status"] == "Succeeded"
+        assert headers["X-Webhook-Event"] == "consume"
+        signature = hmac.new(
+            b"secret",
+            f"{headers['X-Webhook-Timestamp']}.{body}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        assert headers["X-Webhook-Signature"] == f"sha256={signature}"
+
+        # Abandoned when rejected or after max_attempts
+        mock_post.side_effect = None
+        mock_post.return_value = MinimalResponse(status_code=400, text="{}")
+        webhook_service.enqueue(WebhookDelivery("https://callback", "share", "{}"))
+        webhook_service.deliver_next()
+        assert webhook_service.outbox == []
+        mock_post.return_value = MinimalResponse(status_code=500, text="{}")
+        webhook_service.enqueue(WebhookDelivery("https://callback", "share", "{}"))
+        for _ in range(3):
+            webhook_service.deliver_next()
+        assert webhook_service.outbox == []
+        assert mock_post.call_count == 6
+
+
+def test_webhook_outbox_bounded():
+    webhook_service = WebhookService(
+        "secret", outbox_size=2, allowed_hosts=["callback"]
+    )
+    deliveries = [
+        WebhookDelivery(f"https://callback/{index}", "share", "{}")
+        for index in range(3)
+    ]
+    for delivery in deliveries:
+        webhook_service.enqueue(delivery)
+    assert {delivery.delivery_id for delivery in webhook_service.outbox} == {
+        delivery.delivery_id for delivery in deliveries[1:]
+    }
+    with patch("shared_code.webhook_service.requests.post") as mock_post:
+        mock_post.return_value = MinimalResponse(status_code=204, text="{}")
+        assert webhook_service.deliver(deliveries[1]) is True
+        assert mock_post.call_args.kwargs["allow_redirects"] is False
+    assert 1 <= webhook_service.get_backoff(1) <= 2
+    assert webhook_service.get_backoff(20) <= 300
+
+
+def test_webhook_callback_url(client: TestClient):
+    webhook_service = WebhookService("secret")
+    for callback_url in [
+        "http://example.com/callback",
+        "https:///callback",
+        "https://127.0.0.1/callback",
+        "https://10.0.0.4/callback",
+        "https://[::1]/callback",
+        "https://169.254.169.254/metadata",
+    ]:
+        with pytest.raises(HTTPException) as error:
+            webhook_service.check_callback_url(callback_url)
+        assert error.value.status_code == 400
+    webhook_service.check_callback_url("https://8.8.8.8/callback")
+    # The allow list replaces the public host check
+    webhook_service = WebhookService("secret", allowed_hosts=["Callback.local"])
+    webhook_service.check_callback_url("https://callback.local/done")
+    with pytest.raises(HTTPException):
+        webhook_service.check_callback_url("https://other.local/done")
+    # No webhook without secret, neither accepted nor sent
+    webhook_service = WebhookService("", allowed_hosts=["callback"])
+    with pytest.raises(HTTPException):
+        webhook_service.check_callback_url("https://callback/done")
+    with patch("shared_code.webhook_service.requests.post") as mock_post:
+        delivery = WebhookDelivery("https://callback/done", "share", "{}")
+        assert webhook_service.deliver(delivery) is None
+        assert mock_post.call_count == 0
+
+    with patch("shared_code.webhook_service.webhook_service", webhook_service):
+        share = ShareRequest(
+            provider_node_id="testa",
+            consumer_node_id="testb",
+            dataset=Dataset(
+                resource_group_name="testrg",
+                storage_account_name="testsa",
+                container_name="testc",
+                folder_path="testfolder",
+                file_name="testfile",
+            ),
+            callback_url="https://callback/done",
+        )
+        response = client.post(url="/share", json=share.dict())
+        assert response.status_code == 400
+
+
+def create_share_response(consumer_node_id):
+    return ShareResponse(
+        invitation_id="00000000-0000-0000-000000000000",
+        invitation_name="invitationName",
+        provider_node_id="testa",
+        consumer_node_id=consumer_node_id,
+        dataset=Dataset(
+            resource_group_name="testrg",
+            storage_account_name="testsa",
+            container_name="testc",
+            folder_path="testfolder",
+            file_name="testfile",
+        ),
+        status=StatusDetails(
+            status="Pending", start=datetime.utcnow(), end=datetime.utcnow(), duration=0
+        ),
+        error=Error(
+            code=0, message="", source="share_rest_api", date=datetime.utcnow()
+        ),
+    )
+
+
+def test_share_batch(client: TestClient):
+    dataset = Dataset(
+        resource_group_name="testrg",
+        storage_account_name="testsa",
+        container_name="testc",
+        folder_path="testfolder",
+        file_name="testfile",
+    )
+    nodes = [
+        Node(node_id=node_id, tenant_id="tenant", identity="identity")
+        for node_id in ["testb", "testc"]
+    ]
+
+    def get(url, headers, **kwargs):
+        if url.endswith("/nodes"):
+            return MinimalResponse(status_code=200, text=f"[{nodes[0].json()}]")
+        if url.endswith("/nodes/testc"):
+            return MinimalResponse(status_code=200, text=nodes[1].json())
+        return MinimalResponse(status_code=404, text="{}")
+
+    def share(**kwargs):
+        if kwargs["consumer_node_id"] == "testc":
+            raise HTTPException(status_code=500, detail="Exception in method 'share'")
+        return create_share_response(kwargs["consumer_node_id"])
+
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
+        "shared_code.datashare_service.DatashareService.initialize"
+    ), patch("shared_code.datashare_service.DatashareService.share") as mock_share:
+        mock_requests_get.side_effect = get
+        mock_share.side_effect = share
+        response = client.post(
+            url="/share/batch",
+            json=[
+                json.loads(
+                    ShareRequest(
+                        provider_node_id="testa",
+                        consumer_node_id=node_id,
+                        dataset=dataset,
+                    ).json()
+                )
+                for node_id in ["testb", "testc", "testd", "testb"]
+            ],
+        )
+        assert response.status_code == 200
+        results = response.json()
+        assert [result["error"] is None for result in results] == [
+            True,
+            False,
+            False,
+            True,
+        ]
+        assert results[0]["response"]["consumer_node_id"] == "testb"
+        assert results[1]["error"]["code"] == 500
+        assert results[2]["error"]["code"] == 404
+        # A single GET /nodes, the offline nodes are read one by one
+        assert mock_requests_get.call_count == 3
+        assert mock_share.call_count == 3
+
+
+def test_consume_batch(client: TestClient):
+    def consume(**kwargs):
+        if kwargs["invitation_id"] == "unknown":
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        return create_consume_response(
+            "Queued" if kwargs["create_subscription"] else "InProgress"
+        )
+
+    with patch("shared_code.datashare_service.DatashareService.initialize"), patch(
+        "shared_code.datashare_service.DatashareService.consume"
+    ) as mock_consume, patch(
+        "shared_code.configuration_service.ConfigurationService.get_node_id"
+    ) as mock_get_node_id:
+        mock_consume.side_effect = consume
+        mock_get_node_id.return_value = "testb"
+        body = [
+            {"provider_node_id": "testa", "invitation_id": invitation_id}
+            for invitation_id in ["invitation", "unknown"]
+        ]
+        response = client.post(url="/consume/batch", json=body)
+        assert response.status_code == 200
+        results = response.json()
+        assert results[0]["response"]["status"]["status"] == "Queued"
+        assert results[0]["error"] is None
+        assert results[1]["error"]["code"] == 404
+        assert mock_consume.call_args_list[0].kwargs["consumer_node_id"] == "testb"
+
+        response = client.post(url="/consume/status", json=body)
+        assert response.status_code == 200
+        assert response.json()[0]["response"]["status"]["status"] == "InProgress"
+
+
+def test_share_status_batch(client: TestClient):
+    dataset = Dataset(
+        resource_group_name="testrg",
+        storage_account_name="testsa",
+        container_name="testc",
+        folder_path="testfolder",
+        file_name="testfile",
+    )
+    node = Node(node_id="testb", tenant_id="tenant", identity="identity")
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
+        "shared_code.datashare_service.DatashareService.initialize"
+    ), patch(
+        "shared_code.datashare_service.DatashareService.share_status"
+    ) as mock_share_status:
+        mock_requests_get.return_value = MinimalResponse(
+            status_code=200, text=f"[{node.json()}]"
+        )
+        mock_share_status.side_effect = lambda **kwargs: create_share_response(
+            kwargs["consumer_node_id"]
+        )
+        share = json.loads(
+            ShareRequest(
+                provider_node_id="testa", consumer_node_id="testb", dataset=dataset
+            ).json()
+        )
+        response = client.post(url="/share/status", json=[share] * 5)
+        assert response.status_code == 200
+        assert [
+            result["response"]["consumer_node_id"] for result in response.json()
+        ] == ["testb"] * 5
+        assert mock_requests_get.call_count == 1
+        assert mock_share_status.call_args.kwargs["tenant_id"] == "tenant"
+
+
+def test_provisioning_cache(tmp_path):
+    path = str(tmp_path / "provisioning_cache.db")
+    client = MagicMock()
+    client.shares.get.return_value = MagicMock(id="/shares/share")
+    client.data_sets.get.return_value = MagicMock(id="/dataSets/dataset")
+    client.invitations.get.return_value = Invitation.deserialize(
+        {
+            "id": "/invitations/invitation",
+            "name": "invitation",
+            "properties": {
+                "invitationId": "00000000-0000-0000-000000000000",
+                "invitationStatus": "Pending",
+                "sentAt": "2022-01-01T00:00:00Z",
+            },
+        }
+    )
+    parameters = dict(
+        provider_node_id="testa",
+        consumer_node_id="testb",
+        tenant_id="tenant",
+        identity="identity",
+        datashare_storage_resource_group_name="testrg",
+        datashare_storage_account_name="testsa",
+        datashare_storage_container_name="testc",
+        datashare_storage_folder_path="testfolder",
+        datashare_storage_file_name="testfile",
+    )
+
+    def share(provisioning_cache):
+        with patch.object(DatashareService, "initialize"), patch(
+            "shared_code.datashare_service.get_provisioning_cache"
+        ) as mock_get_provisioning_cache:
+            mock_get_provisioning_cache.return_value = provisioning_cache
+            datashare_service = DatashareService("sub", "tenant", "rg", "account")
+            datashare_service.datashare_client = client
+            return datashare_service.share(**parameters)
+
+    assert share(ProvisioningCache(path)).invitation_id == (
+        "00000000-0000-0000-000000000000"
+    )
+    assert client.shares.get.call_count == 1
+    assert client.invitations.get.call_count == 1
+
+    # Answered from the database after a restart
+    share_response = share(ProvisioningCache(path))
+    assert share_response.invitation_id == "00000000-0000-0000-000000000000"
+    assert share_response.invitation_name == "invitation"
+    assert client.shares.get.call_count == 1
+    assert client.invitations.get.call_count == 1
+
+    # Verified when the entry is too old, invalidated on 404
+    not_found = HttpResponseError("Not found")
+    not_found.status_code = 404
+    client.invitations.get.side_effect = [not_found, not_found]
+    client.invitations.create.return_value = client.invitations.get.return_value
+    share(ProvisioningCache(path, verify_period=0))
+    assert client.invitations.get.call_count == 3
+    assert client.shares.get.call_count == 2
+    assert client.invitations.create.call_count == 1
+    assert ProvisioningCache(path).count() == 1
+
+
+def test_terminal_state_cache(client: TestClient):
+    terminal_state_cache = TerminalStateCache(max_size=2)
+    terminal_state_cache.put("queued", create_consume_response("Queued"))
+    terminal_state_cache.put("a", create_consume_response("Succeeded"))
+    terminal_state_cache.put("b", json.loads(create_consume_response("Failed").json()))
+    assert terminal_state_cache.get("queued") is None
+    assert terminal_state_cache.get("a") is not None
+    terminal_state_cache.put("c", create_consume_response("Succeeded"))
+    assert list(terminal_state_cache.responses) == ["a", "c"]
+
+    node = Node(node_id="testb", tenant_id="tenant", identity="identity")
+    share_response = create_share_response("testb")
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get, patch(
+        "shared_code.datashare_service.DatashareService.initialize"
+    ), patch(
+        "shared_code.datashare_service.DatashareService.share_status"
+    ) as mock_share_status:
+        mock_requests_get.return_value = MinimalResponse(
+            status_code=200, text=node.json()
+        )
+        mock_share_status.side_effect = [
+            share_response,
+            share_response.copy(
+                update={"status": create_consume_response("Succeeded").status}
+            ),
+        ]
+        params = {
+            "provider_node_id": "testa",
+            "consumer_node_id": "testb",
+            "datashare_storage_resource_group_name": "testrg",
+            "datashare_storage_account_name": "testsa",
+            "datashare_storage_container_name": "testc",
+            "datashare_storage_folder_path": "testfolder",
+            "datashare_storage_file_name": "testfile",
+        }
+        statuses = [
+            client.get(url="/share", params=params).json()["status"]["status"]
+            for _ in range(4)
+        ]
+        assert statuses == ["Pending", "Succeeded", "Succeeded", "Succeeded"]
+        # Azure is not called once the invitation is accepted, the consumer
+        # node is read once from the registry and kept in the node directory
+        assert mock_requests_get.call_count == 1
+        assert mock_share_status.call_count == 2
+
+
+def test_single_flight():
+    client = MagicMock()
+
+    def get_share_subscription(*args):
+        time.sleep(0.1)
+        return MagicMock(invitation_id="invitation")
+
+    client.share_subscriptions.get.side_effect = get_share_subscription
+    client.invitations.get.return_value = MagicMock(invitation_id="invitation")
+    with patch.object(DatashareService, "initialize"), patch(
+        "shared_code.single_flight.get_single_flight"
+    ) as mock_get_single_flight:
+        mock_get_single_flight.return_value = SingleFlight(status_ttl=0.2)
+        datashare_service = DatashareService("sub", "tenant", "rg", "account")
+        datashare_service.datashare_client = client
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    datashare_service.create_share_subscription(
+                        "consume-share", "invitation"
+                    )
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # A single Azure call shared by the concurrent requests
+        assert client.share_subscriptions.get.call_count == 1
+        assert len(results) == 5 and all(result is results[0] for result in results)
+
+        # Status reads are kept status_ttl seconds
+        for _ in range(3):
+            datashare_service.get_invitation("share", "invitation")
+        assert client.invitations.get.call_count == 1
+        time.sleep(0.3)
+        datashare_service.get_invitation("share", "invitation")
+        assert client.invitations.get.call_count == 2
+
+
+def test_job_service(app, client: TestClient, tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_service = JobService(store, str(tmp_path / "locks"), max_attempts=2)
+    requests = []
+
+    def run_share(request):
+        requests.append(request)
+        if len(requests) == 1:
+            raise HTTPException(status_code=503, detail="Exception in method 'share'")
+        return create_share_response(request["consumer_node_id"])
+
+    job_service.register("share", run_share)
+    app.dependency_overrides[get_job_service] = lambda: job_service
+    share_request = ShareRequest(
+        provider_node_id="testa",
+        consumer_node_id="testb",
+        dataset=create_share_response("testb").dataset,
+    )
+    with patch("shared_code.app.get_job_service") as mock_get_job_service, patch.object(
+        job_service, "start"
+    ) as mock_start, patch.object(
+        job_service, "get_retry_delay"
+    ) as mock_get_retry_delay:
+        mock_get_job_service.return_value = job_service
+        mock_get_retry_delay.return_value = 0
+        response = client.post(
+            url="/share",
+            json=json.loads(share_request.json()),
+            headers={"Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.headers["Location"] == f"/jobs/{job_id}"
+        assert response.json()["status"] == "Queued"
+
+        # The 503 error is retried
+        assert job_service.run_next() is True
+        job = client.get(f"/jobs/{job_id}").json()
+        assert job["status"] == "Queued" and job["attempts"] == 1
+        assert job["error"]["code"] == 503
+        assert job_service.run_next() is True
+        job = client.get(f"/jobs/{job_id}").json()
+        assert job["status"] == "Succeeded" and job["attempts"] == 2
+        assert job["result"]["consumer_node_id"] == "testb"
+        assert job_service.run_next() is False
+        assert client.get("/jobs/unknown").status_code == 404
+        # Only the submission starts the workers, not the status reads
+        assert mock_start.call_count == 1
+
+    # The jobs in progress of a dead process are resumed
+    job_id = store.insert("share", share_request.json())
+    other_service = JobService(store, str(tmp_path / "locks"))
+    other_service.election.is_leader(f"job-owner-{other_service.owner}")
+    assert store.claim(other_service.owner)["job_id"] == job_id
+    job_service.recover()
+    assert store.get(job_id)["status"] == "InProgress"
+    other_service.election.release_all()
+    job_service.recover()
+    assert store.get(job_id)["status"] == "Queued"
+
+
+def test_work_scheduler(app, client: TestClient):
+    work_scheduler = WorkScheduler(workers=1)
+    gate = threading.Event()
+    order = []
+    threads = [threading.Thread(target=lambda: work_scheduler.run("gate", gate.wait))]
+
+    def queue(lane, consumer):
+        def function():
+            order.append((lane, consumer))
+
+        thread = threading.Thread(
+            target=lambda: work_scheduler.run(consumer, function, lane)
+        )
+        threads.append(thread)
+
+    for consumer in ["big", "big", "big", "big", "small"]:
+        queue(Lane.BATCH, consumer)
+    queue(Lane.MAINTENANCE, "testb")
+    queue(Lane.INTERACTIVE, "testb")
+    queue(Lane.INTERACTIVE, "testc")
+    for index, thread in enumerate(threads):
+        thread.start()
+        while sum(lane.submitted for lane in work_scheduler.lanes.values()) <= index:
+            time.sleep(0.01)
+
+    app.dependency_overrides[get_work_scheduler] = lambda: work_scheduler
+    metrics = {lane["lane"]: lane for lane in client.get("/scheduler/lanes").json()}
+    assert metrics["batch"]["depth"] == 5 and metrics["batch"]["consumers"] == 2
+    assert metrics["interactive"]["depth"] == 2
+    assert metrics["maintenance"]["running"] == 0
+
+    gate.set()
+    for thread in threads:
+        thread.join()
+    # The interactive lane goes first, without starving the other lanes
+    assert order[0][0] == Lane.INTERACTIVE
+    assert order.index((Lane.INTERACTIVE, "testc")) < 4
+    assert (Lane.MAINTENANCE, "testb") in order[:6]
+    # The consumer nodes of a lane are served in round robin
+    assert [consumer for lane, consumer in order if lane == Lane.BATCH] == [
+        "big",
+        "small",
+        "big",
+        "big",
+        "big",
+    ]
+    metrics = {lane.lane: lane for lane in work_scheduler.get_metrics()}
+    assert metrics[Lane.BATCH].completed == 5 and metrics[Lane.BATCH].depth == 0
+
+    # A nested call runs in the worker, the exceptions are raised in the caller
+    def nested():
+        work_scheduler.run("testb", lambda: order.append("nested"))
+        raise HTTPException(status_code=429, detail="Throttled")
+
+    with pytest.raises(HTTPException):
+        work_scheduler.run("testb", nested)
+    assert order[-1] == "nested"
+
+
+class ArmTransport(HttpTransport):
+    """Transport returning the statuses and headers in sequence"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.sleeps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+
+    def send(self, request, **kwargs):
+        status_code, headers = self.responses.pop(0)
+        response = HttpResponse(request, None)
+        response.status_code = status_code
+        response.headers = headers
+        return response
+
+
+def test_arm_throttling():
+    throttle = ArmThrottle(
+        "sub", read_rate=100, read_burst=2, write_rate=1, write_burst=1
+    )
+    transport = ArmTransport(
+        [
+            (429, {"Retry-After": "7"}),
+            (503, {}),
+            (200, {"x-ms-ratelimit-remaining-subscription-reads": "0"}),
+        ]
+    )
+    pipeline = Pipeline(
+        transport,
+        [
+            ArmRetryPolicy(throttle, min_backoff=0.5, max_backoff=4, retry_total=3),
+            ArmRateLimitPolicy(throttle),
+        ],
+    )
+    with patch("shared_code.arm_throttling.time.sleep") as mock_sleep:
+        response = pipeline.run(HttpRequest("GET", "https://management.azure.com/"))
+        assert response.http_response.status_code == 200
+        # Retry-After is honored, then a decorrelated jitter backoff is used
+        assert transport.sleeps[0] == 7
+        assert 0.5 <= transport.sleeps[1] <= 1.5
+        # The 429 paused the bucket shared by the requests of the subscription
+        assert mock_sleep.call_args_list[0][0][0] > 6
+    metrics = {metrics.kind: metrics for metrics in throttle.get_metrics()}
+    assert metrics["read"].requests == 3
+    assert metrics["read"].throttled == 1 and metrics["read"].retries == 2
+    assert metrics["read"].waited > 6000 and metrics["read"].available == 0
+    assert metrics["write"].requests == 0
+
+    # The writes wait for the refill of their bucket
+    with patch("shared_code.arm_throttling.time.sleep") as mock_sleep:
+        throttle.acquire("PUT")
+        throttle.acquire("PUT")
+        assert mock_sleep.call_count == 1 and mock_sleep.call_args[0][0] > 0.9
+
+    # A 429 left after the retries is reported as a 429
+    client = MagicMock()
+    error = HttpResponseError(message="Too many requests")
+    error.status_code = 429
+    client.shares.get.side_effect = error
+    with patch.object(DatashareService, "initialize"):
+        datashare_service = DatashareService("sub", "tenant", "rg", "account")
+        datashare_service.datashare_client = client
+        with pytest.raises(HTTPException) as ex:
+            datashare_service.get_share("throttled-share", "Provider share")
+        assert ex.value.status_code == 429
+
+
+class FakePoller:
+    """LROPoller done when the event is set"""
+
+    def __init__(self, result=None):
+        self.event = threading.Event()
+        self.value = result
+
+    def done(self):
+        return self.event.is_set()
+
+    def result(self, timeout=None):
+        self.event.wait(timeout)
+        return self.value
+
+
+def test_lro_manager():
+    lro_manager = LroManager(poll_interval=0.01)
+    client = MagicMock()
+    client.share_subscriptions.get.return_value = MagicMock(invitation_id="old")
+    poller = FakePoller()
+    client.share_subscriptions.begin_delete.return_value = poller
+    client.share_subscriptions.create.return_value = MagicMock(invitation_id="new")
+    with patch.object(DatashareService, "initialize"), patch(
+        "shared_code.datashare_service.get_lro_manager"
+    ) as mock_get_lro_manager:
+        mock_get_lro_manager.return_value = lro_manager
+        datashare_service = DatashareService("sub", "tenant", "rg", "account")
+        datashare_service.datashare_client = client
+        # The HTTP threads do not wait for the deletion
+        for _ in range(2):
+            with pytest.raises(HTTPException) as ex:
+                datashare_service.create_share_subscription("consume-share", "new")
+            assert ex.value.status_code == 503
+        assert client.share_subscriptions.begin_delete.call_count == 1
+        assert client.share_subscriptions.create.call_count == 0
+
+        # The subscription is created when the deletion is completed
+        operation = lro_manager.get(
+            ("sub/rg/account", "delete_share_subscription", "consume-share")
+        )
+        poller.event.set()
+        assert operation.wait(5).invitation_id == "new"
+        assert client.share_subscriptions.create.call_count == 1
+        client.share_subscriptions.get.return_value = MagicMock(invitation_id="new")
+        subscription = datashare_service.create_share_subscription(
+            "consume-share", "new"
+        )
+        assert subscription.invitation_id == "new"
+        responses = lro_manager.get_responses()
+        assert [response.status for response in responses] == ["Succeeded"]
+
+
+def test_lro_manager_begin_without_lock():
+    lro_manager = LroManager(poll_interval=0.01)
+    started = threading.Event()
+    throttled = threading.Event()
+    poller = FakePoller("deleted")
+
+    def begin():
+        started.set()
+        throttled.wait(5)
+        return poller
+
+    thread = threading.Thread(target=lro_manager.start, args=("a", "delete", begin))
+    thread.start()
+    assert started.wait(5)
+    # The other operations and the concurrent requests are not blocked
+    other = lro_manager.start("b", "delete", lambda: FakePoller())
+    assert other.poller is not None
+    shared = lro_manager.start("a", "delete", begin)
+    assert shared.poller is None
+    assert lro_manager.get("a") is shared
+    throttled.set()
+    thread.join(5)
+    poller.event.set()
+    assert shared.wait(5) == "deleted"
+
+    def fail():
+        raise HttpResponseError("Too many requests")
+
+    with pytest.raises(HttpResponseError):
+        lro_manager.start("c", "delete", fail)
+    assert lro_manager.get("c").status == Status.FAILED
+
+
+def test_async_share(app, client: TestClient):
+    node = Node(
+        node_id="testb",
+        tenant_id="00000000-0000-0000-000000000000",
+        identity="00000000-0000-0000-000000000000",
+    )
+    dataset = Dataset(
+        resource_group_name="testrg",
+        storage_account_name="testsa",
+        container_name="testc",
+        folder_path="testfolder",
+        file_name="testfile",
+    )
+    share_response = ShareResponse(
+        invitation_id="00000000-0000-0000-000000000000",
+        invitation_name="invitationName",
+        provider_node_id="testa",
+        consumer_node_id="testb",
+        dataset=dataset,
+        status=StatusDetails(
+            status="Pending", start=datetime.utcnow(), end=datetime.utcnow(), duration=0
+        ),
+        error=Error(
+            code=0, message="", source="share_rest_api", date=datetime.utcnow()
+        ),
+    )
+    app.dependency_overrides[get_async_share_service] = AsyncShareService
+    with patch.object(
+        AsyncHttpClient, "get", new_callable=AsyncMock
+    ) as mock_requests_get, patch.object(
+        AsyncDatashareService, "initialize"
+    ), patch.object(
+        AsyncDatashareService, "share_async", new_callable=AsyncMock
+    ) as mock_async_share, patch.object(
+        DatashareService, "share"
+    ) as mock_share:
+        mock_requests_get.return_value = MinimalResponse(
+            status_code=200, text=node.json()
+        )
+        mock_async_share.return_value = share_response
+        share = ShareRequest(
+            provider_node_id="testa", consumer_node_id="testb", dataset=dataset
+        )
+        response = client.post(url="/share", json=share.dict())
+        assert response.status_code == 200
+        assert response.json()["invitation_name"] == "invitationName"
+        assert mock_async_share.await_args.kwargs["tenant_id"] == node.tenant_id
+        assert mock_share.call_count == 0
+
+
+class AsyncFakePoller:
+    """AsyncLROPoller done when the event is set"""
+
+    def __init__(self, result=None):
+        self.event = asyncio.Event()
+        self.value = result
+
+    def done(self):
+        return self.event.is_set()
+
+    async def result(self):
+        await self.event.wait()
+        return self.value
+
+
+def test_async_datashare_service():
+    lro_manager = LroManager(poll_interval=0.01)
+    client = MagicMock()
+    client.share_subscriptions.get = AsyncMock(
+        return_value=MagicMock(invitation_id="old")
+    )
+    client.consumer_invitations.get = AsyncMock(return_value=MagicMock())
+    client.share_subscriptions.create = AsyncMock(
+        return_value=MagicMock(invitation_id="new")
+    )
+
+    async def replace_subscription():
+        poller = AsyncFakePoller()
+        client.share_subscriptions.begin_delete = AsyncMock(return_value=poller)
+        datashare_service = AsyncDatashareService("sub", "tenant", "rg", "account")
+        datashare_service.async_client = client
+        # The requests do not wait for the deletion
+        for _ in range(2):
+            with pytest.raises(HTTPException) as ex:
+                await datashare_service.create_share_subscription_async(
+                    "consume-share", "new"
+                )
+            assert ex.value.status_code == 503
+        assert client.share_subscriptions.begin_delete.await_count == 1
+        assert client.share_subscriptions.create.await_count == 0
+
+        # The subscription is created by the task of the operation
+        operation = lro_manager.get(
+            ("sub/rg/account", "delete_share_subscription", "consume-share")
+        )
+        poller.event.set()
+        await asyncio.wait_for(operation.task, 5)
+        assert operation.wait(0).invitation_id == "new"
+        assert client.share_subscriptions.create.await_count == 1
+
+    with patch.object(AsyncDatashareService, "initialize"), patch(
+        "shared_code.async_datashare_service.get_lro_manager"
+    ) as mock_get_lro_manager:
+        mock_get_lro_manager.return_value = lro_manager
+        asyncio.run(replace_subscription())
+    assert [response.status for response in lro_manager.get_responses()] == [
+        "Succeeded"
+    ]
+
+
+def test_async_datashare_service_outside_event_loop():
+    threads = []
+    invitation_index = MagicMock(refresh_thread=None, invitations={"new": "new"})
+    invitation_index.start.side_effect = lambda: threads.append(threading.get_ident())
+
+    def initialize(self):
+        threads.append(threading.get_ident())
+        self.invitation_index = invitation_index
+
+    async def receive_invitation():
+        datashare_service = await get_async_datashare_service()
+        assert await datashare_service.is_invitation_received_async("new")
+        return threading.get_ident()
+
+    # The sync initialization and the first load of the invitation index
+    # run in the threadpool
+    with patch.object(AsyncDatashareService, "initialize", initialize):
+        loop_thread = asyncio.run(receive_invitation())
+    assert len(threads) == 2
+    assert loop_thread not in threads
+
+
+class AsyncCountingCredential:
+    """azure.identity.aio credential returning token1, token2..."""
+
+    def __init__(self, lifetime=3600):
+        self.calls = 0
+        self.lifetime = lifetime
+
+    async def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return AccessToken(f"token{self.calls}", int(time.time()) + self.lifetime)
+
+    async def close(self):
+        pass
+
+
+def test_async_cached_token_credential(tmp_path):
+    scope = "https://management.azure.com/.default"
+    path = str(tmp_path / "token_cache.bin")
+    credential = AsyncCountingCredential()
+
+    async def get_tokens():
+        worker = AsyncCachedTokenCredential(credential, PersistentTokenCache(path))
+        # The concurrent requests share a single token request
+        tokens = await asyncio.gather(*[worker.get_token(scope) for _ in range(10)])
+        assert [token.token for token in tokens] == ["token1"] * 10
+        assert credential.calls == 1
+        await worker.close()
+
+    asyncio.run(get_tokens())
+    # The sync workers read the token stored by the async worker
+    worker = CachedTokenCredential(credential, PersistentTokenCache(path))
+    assert worker.get_token(scope).token == "token1"
+    assert credential.calls == 1
+
+
+def test_http_client():
+    http_client = HttpClient(pool_size=4, connect_timeout=1, read_timeout=2)
+    adapter = http_client.session.get_adapter("http://registry")
+    assert adapter is http_client.session.get_adapter("https://registry")
+    assert adapter._pool_maxsize == 4
+    with patch.object(http_client.session, "get") as mock_get:
+        http_client.get(url="http://registry/nodes")
+        http_client.get(url="http://registry/nodes", timeout=10)
+        assert mock_get.call_args_list[0].kwargs["timeout"] == (1, 2)
+        assert mock_get.call_args_list[1].kwargs["timeout"] == 10
+
+
+def test_node_directory():
+    node_directory = NodeDirectory(ttl=60, negative_ttl=5, max_stale=60)
+    node = {"node_id": "testb", "tenant_id": "tenant", "identity": "identity"}
+    fetch = MagicMock(side_effect=[node, None])
+    assert node_directory.get("testb", fetch) == node
+    assert node_directory.get("testb", fetch) == node
+    assert fetch.call_count == 1
+    # Stale: the node is returned while it is read again in the background
+    node_directory.entries["testb"].expiry = time.monotonic() - 1
+    revalidation = threading.Event()
+    fetch.side_effect = lambda node_id: revalidation.wait(5) and None
+    assert node_directory.get("testb", fetch) == node
+    assert node_directory.get("testb", fetch) == node
+    revalidation.set()
+    for _ in range(100):
+        if node_directory.entries["testb"].node is None:
+            break
+        time.sleep(0.01)
+    assert fetch.call_count == 2
+    # Not found in the registry: remembered negative_ttl seconds
+    assert node_directory.get("testb", fetch) is None
+    assert fetch.call_count == 2
+    # Invalidated after a failed Datashare call
+    node_directory.invalidate("testb")
+    fetch.side_effect = [node]
+    assert node_directory.get("testb", fetch) == node
+    assert fetch.call_count == 3
+
+
+def test_node_directory_invalidation(share_service: ShareService):
+    datashare_service = MagicMock()
+    node = Node(node_id="testb", tenant_id="tenant", identity="identity")
+    share = ShareRequest(
+        provider_node_id="testa",
+        consumer_node_id="testb",
+        dataset=Dataset(
+            resource_group_name="testrg",
+            storage_account_name="testsa",
+            container_name="testc",
+            folder_path="testfolder",
+            file_name="testfile",
+        ),
+    )
+
+    def share_status():
+        return share_service.call_with_node(
+            "testb",
+            share_service.get_node("testb"),
+            lambda node: share_service.share_status_with_node(
+                datashare_service, share, node
+            ),
+        )
+
+    get_node_directory().clear()
+    with patch("shared_code.http_client.HttpClient.get") as mock_requests_get:
+        mock_requests_get.return_value = MinimalResponse(
+            status_code=200, text=node.json()
+        )
+        # A throttled call keeps the node
+        datashare_service.share_status.side_effect = HTTPException(
+            status_code=429, detail=""
+        )
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                share_status()
+        assert mock_requests_get.call_count == 1
+        # A transient failure keeps the node
+        datashare_service.share_status.side_effect = HTTPException(
+            status_code=503, detail=""
+        )
+        with pytest.raises(HTTPException):
+            share_status()
+        assert mock_requests_get.call_count == 1
+        # Azure rejects the cached identity: the node is read again from the
+        # registry by the next call
+        datashare_service.share_status.side_effect = HTTPException(
+            status_code=403, detail=""
+        )
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                share_status()
+        assert mock_requests_get.call_count == 2
+        datashare_service.share_status.side_effect = HTTPException(
+            status_code=500, detail="(InvalidIdentity) Invalid target object id"
+        )
+        with pytest.raises(HTTPException):
+            share_status()
+        assert mock_requests_get.call_count == 3
+        assert get_node_directory().lookup("testb") is None